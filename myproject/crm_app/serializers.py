@@ -6,6 +6,9 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from .models import *
 from django.db.models import F, ExpressionWrapper, FloatField, Sum, Count, Q
 from decimal import Decimal
+from reception.reports import patient_totals
+from reception.dedupe import find_or_create_patient
+from django.db import transaction
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -141,6 +144,12 @@ class AppointmentPatientSerializer(serializers.ModelSerializer):
         model = CustomerRecord
         fields = ['id', 'patient','doctor', 'reception', 'department', 'service', 'status', 'start_at', 'end_at', 'price']
 
+    def create(self, validated_data):
+        patient_data = validated_data.pop('patient')
+        with transaction.atomic():
+            patient = find_or_create_patient(patient_data)
+            return CustomerRecord.objects.create(patient=patient, **validated_data)
+
 
 #ИНФО О ПАЦИЕНТЕ
 class InfoAppointmentSerializer(serializers.ModelSerializer):
@@ -154,8 +163,27 @@ class InfoAppointmentSerializer(serializers.ModelSerializer):
         fields = ['reception', 'doctor', 'start_at', 'end_at', 'status', 'department', 'service']
 
 
+#Итоги по пациенту: один запрос на весь ответ, результат хранится в context
+class PatientTotalsMixin:
+    EMPTY_PATIENT_TOTALS = {
+        'total_appointments': 0,
+        'status_counts': {'waiting': 0, 'reserved': 0, 'cancelled': 0},
+        'total_paid': 0,
+        'payment_method_sums': {},
+    }
+
+    def get_patient_totals(self, obj):
+        totals = self.context.setdefault('patient_totals', {})
+        if obj.patient_id not in totals:
+            records = self.root.instance if getattr(self.root, 'many', False) else [obj]
+            patient_ids = {record.patient_id for record in records} | {obj.patient_id}
+            totals.update(dict.fromkeys(patient_ids, self.EMPTY_PATIENT_TOTALS))
+            totals.update(patient_totals(patient_ids))
+        return totals[obj.patient_id]
+
+
 #История записей
-class AppointmentHistorySerializer(serializers.ModelSerializer):
+class AppointmentHistorySerializer(PatientTotalsMixin, serializers.ModelSerializer):
     reception = ReceptionSimpleSerializer()
     created_date = serializers.DateTimeField(format='%d-%m-%Y')
     time = serializers.TimeField(format='%H:%M')
@@ -176,24 +204,18 @@ class AppointmentHistorySerializer(serializers.ModelSerializer):
         return f"/appointment/admin/{obj.id}/history/{obj.id}/delete/"
 
     def get_total_appointments(self, obj):
-        if obj.patient:
-            return CustomerRecord.objects.filter(patient=obj.patient).count()
+        if obj.patient_id:
+            return self.get_patient_totals(obj)['total_appointments']
         return 0
 
     def get_status_counts(self, obj):
-        if not obj.patient:
+        if not obj.patient_id:
             return {}
-
-        qs = CustomerRecord.objects.filter(patient=obj.patient)
-        return qs.aggregate(
-            waiting=Count('id', filter=Q(status='в ожидании')),
-            reserved=Count('id', filter=Q(status='Предзапись')),
-            cancelled=Count('id', filter=Q(status='Отменено')),
-        )
+        return self.get_patient_totals(obj)['status_counts']
 
 
 #История приемов
-class AppointmentWaitingHistorySerializer(serializers.ModelSerializer):
+class AppointmentWaitingHistorySerializer(PatientTotalsMixin, serializers.ModelSerializer):
     reception = ReceptionSimpleSerializer()
     created_date = serializers.DateTimeField(format='%d-%m-%Y')
     time = serializers.TimeField(format='%H:%M')
@@ -210,24 +232,18 @@ class AppointmentWaitingHistorySerializer(serializers.ModelSerializer):
 
 
     def get_total_appointments(self, obj):
-        if obj.patient:
-            return CustomerRecord.objects.filter(patient=obj.patient).count()
+        if obj.patient_id:
+            return self.get_patient_totals(obj)['total_appointments']
         return 0
 
     def get_status_counts(self, obj):
-        if not obj.patient:
+        if not obj.patient_id:
             return {}
-
-        qs = CustomerRecord.objects.filter(patient=obj.patient)
-        return qs.aggregate(
-            waiting=Count('id', filter=Q(status='в ожидании')),
-            reserved=Count('id', filter=Q(status='Предзапись')),
-            cancelled=Count('id', filter=Q(status='Отменено')),
-        )
+        return self.get_patient_totals(obj)['status_counts']
 
 
 #Оплата
-class PatientPaymentReportSerializer(serializers.ModelSerializer):
+class PatientPaymentReportSerializer(PatientTotalsMixin, serializers.ModelSerializer):
     department = DepartmentSimpleSerializer()
     service = ServiceSimpleSerializer()
     created_date = serializers.DateTimeField(format='%d-%m-%Y')
@@ -240,19 +256,14 @@ class PatientPaymentReportSerializer(serializers.ModelSerializer):
         fields = ['department', 'doctor', 'service', 'created_date', 'time', 'payment_type', 'price', 'total_paid', 'payment_method_sums']
 
     def get_total_paid(self, obj):
-        if obj.patient:
-            return CustomerRecord.objects.filter(patient=obj.patient).aggregate(
-                total=Sum('price')
-            )['total'] or 0
+        if obj.patient_id:
+            return self.get_patient_totals(obj)['total_paid']
         return 0
 
     def get_payment_method_sums(self, obj):
-        if not obj.patient:
+        if not obj.patient_id:
             return {}
-
-        qs = CustomerRecord.objects.filter(patient=obj.patient)
-        data = qs.values('payment_type').annotate(total=Sum('price'))
-        return {item['payment_type']: item['total'] for item in data}
+        return self.get_patient_totals(obj)['payment_method_sums']
 
 
 #Данные пациента
@@ -310,7 +321,9 @@ class DoctorAppointmentSerializer(serializers.ModelSerializer):
 
 
 class DoctorReportSerializer(serializers.ModelSerializer):
-    doctor_customer = DoctorAppointmentSerializer(read_only=True, many=True)
+    # Итоги берутся из аннотаций Doctor.objects.with_report_totals(),
+    # записи — текущая страница, переданная view через context['records']
+    doctor_customer = serializers.SerializerMethodField()
 
     total_price = serializers.SerializerMethodField()
     total_discounted_price = serializers.SerializerMethodField()
@@ -322,20 +335,26 @@ class DoctorReportSerializer(serializers.ModelSerializer):
         model = Doctor
         fields = ['doctor_customer', 'total_price', 'total_discounted_price', 'total_bonus', 'total_appointments', 'payment_method_sums']
 
+    def get_doctor_customer(self, obj):
+        records = self.context.get('records', [])
+        return DoctorAppointmentSerializer(records, many=True, context=self.context).data
+
     def get_total_price(self, obj):
-        return obj.total_price()
+        return obj.sum_price or 0
 
     def get_total_discounted_price(self, obj):
-        return obj.total_discounted_price()
+        return obj.sum_discounted_price or 0
 
     def get_total_bonus(self, obj):
-        return obj.total_bonus()
+        return round(self.get_total_discounted_price(obj) * (obj.bonus or 0) / 100.0, 2)
 
     def get_total_appointments(self, obj):
-        return obj.total_appointments()
+        return obj.appointments_count
 
     def get_payment_method_sums(self, obj):
-        return obj.payment_method_sums()
+        # как и раньше: ключ на каждый встречающийся способ оплаты, включая незаданный (None)
+        sums = ((None, obj.unset_sum), ('card', obj.card_sum), ('cash', obj.cash_sum))
+        return {payment_type: total for payment_type, total in sums if total is not None}
 
 
 #по врачам (процент врачам)
@@ -384,4 +403,22 @@ class PriceListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Department
-        fields = ['id', 'name', 'services']
\ No newline at end of file
+        fields = ['id', 'name', 'services']
+
+#Зарплатная ведомость
+class PayrollRowSerializer(serializers.Serializer):
+    doctor = serializers.IntegerField()
+    first_name = serializers.CharField()
+    last_name = serializers.CharField()
+    bonus_percent = serializers.IntegerField()
+    appointments = serializers.IntegerField()
+    gross = serializers.IntegerField()
+    discounted = serializers.DecimalField(max_digits=14, decimal_places=2)
+    bonus = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class PayrollTotalsSerializer(serializers.Serializer):
+    appointments = serializers.IntegerField()
+    gross = serializers.IntegerField()
+    discounted = serializers.DecimalField(max_digits=14, decimal_places=2)
+    bonus = serializers.DecimalField(max_digits=14, decimal_places=2)
@@ -1,3 +1,175 @@
+from datetime import timedelta
+
+from django.db.models import Count, Q, Sum
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from reception.archive import archive_cutoff, archive_records
+from reception.models import CustomerRecord, Doctor, Patient
+from reception.tests import ClinicDataMixin
+
+from .serializers import AppointmentHistorySerializer, PatientPaymentReportSerializer
+
+
+class ReportQueryCountTests(ClinicDataMixin, TestCase):
+    def test_summary_clinic(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('summary_clinic'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_price'], 3500)
+        self.assertEqual(response.data['total_cash'], 1500)
+        self.assertEqual(response.data['total_card'], 2000)
+
+    def test_doctor_bonus(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('doctor_bonus', args=[self.doctor.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_doctor_income'], 350)
+        self.assertEqual(len(response.data['records']), 3)
+
+    def test_doctor_report(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('detailed_report', args=[self.doctor.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_price'], 3500)
+        self.assertEqual(response.data['total_discounted_price'], 3050)
+        self.assertEqual(response.data['total_bonus'], 305)
+        self.assertEqual(response.data['total_appointments'], 3)
+        self.assertEqual(response.data['payment_method_sums'], {'card': 2000, 'cash': 1500})
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['doctor_customer']), 3)
+
+    def test_doctor_report_is_paginated(self):
+        record = CustomerRecord.objects.first()
+        CustomerRecord.objects.bulk_create([
+            CustomerRecord(patient=record.patient, doctor=self.doctor, service=self.service, price=100)
+            for _ in range(60)
+        ])
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('detailed_report', args=[self.doctor.pk]), {'page_size': 20})
+        self.assertEqual(response.data['total_appointments'], 63)
+        self.assertEqual(len(response.data['doctor_customer']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_doctor_report_unset_payment_type(self):
+        CustomerRecord.objects.create(patient=self.patient, doctor=self.doctor, service=self.service, price=300,
+                                      payment_type=None)
+        response = self.client.get(reverse('detailed_report', args=[self.doctor.pk]))
+        self.assertEqual(response.data['payment_method_sums'], {None: 300, 'card': 2000, 'cash': 1500})
+
+    def test_doctor_report_period(self):
+        response = self.client.get(reverse('detailed_report', args=[self.doctor.pk]),
+                                   {'start_date': '2000-01-01', 'end_date': '2000-01-31'})
+        self.assertEqual(response.data['total_price'], 0)
+        self.assertEqual(response.data['doctor_customer'], [])
+        response = self.client.get(reverse('detailed_report', args=[self.doctor.pk]), {'start_date': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+
+class PayrollReportTests(ClinicDataMixin, TestCase):
+    def test_payroll_single_query(self):
+        other = Doctor.objects.create_user(email='other@example.com', password='pass', first_name='Бакыт',
+                                           last_name='Алиев', speciality='Хирург', bonus=15, image='')
+        CustomerRecord.objects.create(doctor=other, price=999, discount=33, payment_type='card')
+        CustomerRecord.objects.create(doctor=other, price=5000, records='отменен')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('payroll'))
+        self.assertEqual(response.status_code, 200)
+        doctors = {row['doctor']: row for row in response.data['doctors']}
+        self.assertEqual(doctors[self.doctor.pk]['appointments'], 3)
+        self.assertEqual(doctors[self.doctor.pk]['discounted'], '3050.00')
+        self.assertEqual(doctors[self.doctor.pk]['bonus'], '305.00')
+        # 999 * 0.67 = 669.33, бонус 15% = 100.3995 -> 100.40
+        self.assertEqual(doctors[other.pk]['appointments'], 1)
+        self.assertEqual(doctors[other.pk]['discounted'], '669.33')
+        self.assertEqual(doctors[other.pk]['bonus'], '100.40')
+        self.assertEqual(response.data['totals']['bonus'], '405.40')
+
+    def test_payroll_csv(self):
+        response = self.client.get(reverse('payroll'), {'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[-1].startswith('total,'))
+        self.assertTrue(lines[-1].endswith(',305.00'))
+
+
+class PatientTotalsTests(ClinicDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_patient = Patient.objects.create(full_name='Нурия Асанова', date_birth='1985-05-05',
+                                                   gender='female', phone_number='+996700654321')
+        CustomerRecord.objects.create(patient=cls.patient, doctor=cls.doctor, price=300, payment_type=None,
+                                      status='Предзапись')
+        CustomerRecord.objects.create(patient=cls.other_patient, doctor=cls.doctor, price=800, status='Отменено')
+
+    def legacy_totals(self, record):
+        qs = CustomerRecord.objects.filter(patient=record.patient)
+        return {
+            'total_appointments': qs.count(),
+            'status_counts': qs.aggregate(
+                waiting=Count('id', filter=Q(status='в ожидании')),
+                reserved=Count('id', filter=Q(status='Предзапись')),
+                cancelled=Count('id', filter=Q(status='Отменено')),
+            ),
+            'total_paid': qs.aggregate(total=Sum('price'))['total'] or 0,
+            'payment_method_sums': {item['payment_type']: item['total']
+                                    for item in qs.values('payment_type').annotate(total=Sum('price'))},
+        }
+
+    def test_output_matches_per_row_queries(self):
+        records = CustomerRecord.objects.select_related('reception', 'doctor', 'department', 'service')
+        with self.assertNumQueries(3):
+            history = AppointmentHistorySerializer(records, many=True).data
+        payments = PatientPaymentReportSerializer(records, many=True).data
+        for record, row, payment in zip(records, history, payments):
+            expected = self.legacy_totals(record)
+            self.assertEqual(row['total_appointments'], expected['total_appointments'])
+            self.assertEqual(row['status_counts'], expected['status_counts'])
+            self.assertEqual(payment['total_paid'], expected['total_paid'])
+            self.assertEqual(list(payment['payment_method_sums'].items()),
+                             list(expected['payment_method_sums'].items()))
+
+    def test_retrieve_views(self):
+        record = CustomerRecord.objects.filter(patient=self.patient).first()
+        for name in ['history_patient', 'status_waiting']:
+            response = self.client.get(reverse(name, args=[record.pk]))
+            self.assertEqual(response.data['total_appointments'], 4)
+            self.assertEqual(response.data['status_counts'], {'waiting': 0, 'reserved': 1, 'cancelled': 0})
+        response = self.client.get(f'/ru/records/{record.pk}/history/payment/')
+        self.assertEqual(response.data['total_paid'], 3800)
+        self.assertEqual(response.data['payment_method_sums'], {None: 300, 'card': 2000, 'cash': 1500})
+
+    def test_totals_skip_archived_records(self):
+        record = CustomerRecord.objects.filter(patient=self.patient).first()
+        CustomerRecord.objects.create(patient=self.patient, doctor=self.doctor, price=400, payment_type='card',
+                                      status='Предзапись', visit_at=timezone.now() - timedelta(days=800))
+        response = self.client.get(f'/ru/records/{record.pk}/history/payment/')
+        self.assertEqual(response.data['total_paid'], 4200)
+
+        archive_records(archive_cutoff())
+        for name in ['history_patient', 'status_waiting']:
+            response = self.client.get(reverse(name, args=[record.pk]))
+            self.assertEqual(response.data['total_appointments'], 4)
+            self.assertEqual(response.data['status_counts'], {'waiting': 0, 'reserved': 1, 'cancelled': 0})
+        response = self.client.get(f'/ru/records/{record.pk}/history/payment/')
+        self.assertEqual(response.data['total_paid'], 3800)
+        self.assertEqual(response.data['payment_method_sums'], {None: 300, 'card': 2000, 'cash': 1500})
+
 
-# Create your tests here.
+class PatientCreateTests(ClinicDataMixin, TestCase):
+    def test_returning_patient_is_reused(self):
+        data = {
+            'patient': {'full_name': 'Айбек Садыков', 'date_birth': '1990-01-01', 'gender': 'male',
+                        'phone_number': '+996 (700) 12-34-56'},
+            'doctor': self.doctor.pk, 'department': self.department.pk, 'service': self.service.pk,
+            'reception': self.reception.pk, 'status': 'Предзапись', 'start_at': '10:00', 'end_at': '10:30',
+            'price': 1000,
+        }
+        response = self.client.post(reverse('patient_create'), data, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['patient']['id'], self.patient.pk)
+        self.assertEqual(Patient.objects.count(), 1)
+        self.assertEqual(CustomerRecord.objects.filter(patient=self.patient).count(), 4)
@@ -29,6 +29,7 @@ urlpatterns = [
     path('doctors/<int:pk>/', DoctorAppointmentsApiView.as_view(), name = 'detailed_report'),
     path('doctors/<int:pk>/bonus/', DoctorReportListAPIView.as_view(), name='doctor_bonus'),
     path('summary_clinic/', SummaryReportClinicAPIView.as_view(), name='summary_clinic'),
+    path('payroll/', PayrollReportAPIView.as_view(), name='payroll'),
     path('doctors/schedule/', DoctorScheduleApiView.as_view(), name='doctor_schedule'),
     path('price_list/', PriceListApiView.as_view(), name='price_list')
 
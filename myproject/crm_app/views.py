@@ -3,8 +3,18 @@ from rest_framework import viewsets, generics, status
 from rest_framework.response import Response
 from rest_framework.views import  APIView
 from reception.serializers import SummaryReportSerializer, DoctorReportSerializers
+from reception.reports import summary_totals, doctor_income_total, report_period, period_filter, doctor_payroll, \
+    payroll_totals
+from reception.eager import EagerLoadingMixin
+from reception.projection import ValuesListMixin
+from reception.cache import cached_report
+from reception.exports import ReportExportMixin, doctor_report_rows, payroll_rows, export_format, \
+    EXPORT_RENDERER_CLASSES, EXPORT_RESPONSES
+from reception.pagination import DoctorRecordsPagination, RecordCursorPagination
+from reception.filters import CustomerRecordListFilter, PatientSearchFilter
 from .serializers import *
-from reception.models import UserProfile, Patient, Doctor, Department, Service, CustomerRecord, HistoryRecord
+from reception.models import UserProfile, Patient, Doctor, Department, Service, CustomerRecord, HistoryRecord, \
+    DailyRevenue
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import  SearchFilter
 from decimal import Decimal
@@ -80,12 +90,12 @@ class LogoutView(generics.GenericAPIView):
 
 
 #Записи на прием
-class RecordsListApiView(generics.ListAPIView):
+class RecordsListApiView(ValuesListMixin, EagerLoadingMixin, generics.ListAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = AppointmentAdminSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    filterset_fields = ['doctor', 'department', 'created_date']
-    search_fields = ['patient']
+    pagination_class = RecordCursorPagination
+    filter_backends = [DjangoFilterBackend, PatientSearchFilter]
+    filterset_class = CustomerRecordListFilter
 
 
 #Добавление пациента
@@ -94,13 +104,13 @@ class PatientCreateApView(generics.CreateAPIView):
 
 
 #ИНФО О ПАЦИЕНТЕ
-class RecordsDetailApiView(generics.RetrieveAPIView):
+class RecordsDetailApiView(EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = InfoAppointmentSerializer
 
 
 #История записей
-class PatientAppointmentReportView(generics.RetrieveAPIView):
+class PatientAppointmentReportView(EagerLoadingMixin, generics.RetrieveAPIView):
     serializer_class = AppointmentHistorySerializer
     queryset = CustomerRecord.objects.all()
 
@@ -122,25 +132,25 @@ class PatientAppointmentReportView(generics.RetrieveAPIView):
 
 
 #История приемов
-class PatientWaitingAppointmentsAPIView(generics.RetrieveUpdateDestroyAPIView):
+class PatientWaitingAppointmentsAPIView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = AppointmentWaitingHistorySerializer
 
 
 #Оплата
-class PatientPaymentReportView(generics.RetrieveAPIView):
+class PatientPaymentReportView(EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = PatientPaymentReportSerializer
 
 
 #Данные пациента
-class InfoPatientApiView(generics.RetrieveAPIView):
+class InfoPatientApiView(EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = Patient.objects.all()
     serializer_class = InformationPatientSerializer
 
 
 #Список врачей
-class DoctorsApiView(generics.ListAPIView):
+class DoctorsApiView(EagerLoadingMixin, generics.ListAPIView):
     queryset = Doctor.objects.all()
     serializer_class = DoctorsSerializer
 
@@ -152,7 +162,7 @@ class DoctorCreateApiView(generics.CreateAPIView):
 
 
 #Сохранение врача
-class DoctorSaveApiView(generics.RetrieveUpdateAPIView):
+class DoctorSaveApiView(EagerLoadingMixin, generics.RetrieveUpdateAPIView):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSaveSerializer
     parser_classes = [MultiPartParser, FormParser]
@@ -160,80 +170,108 @@ class DoctorSaveApiView(generics.RetrieveUpdateAPIView):
 
 #Подробный отчет
 class DoctorAppointmentsApiView(generics.RetrieveAPIView):
-    queryset = Doctor.objects.all()
     serializer_class = DoctorReportSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    filterset_fields = [ 'department']
-    search_fields = ['speciality']
+    pagination_class = DoctorRecordsPagination
+
+    def get_queryset(self):
+        start_date, end_date = report_period(self.request.query_params)
+        return Doctor.objects.with_report_totals(start_date, end_date)
+
+    def get_records(self, doctor):
+        start_date, end_date = report_period(self.request.query_params)
+        records = doctor.doctor_customer.select_related('patient', 'service', 'doctor').order_by('-visit_at', '-id')
+        return records.filter(period_filter(start_date, end_date))
+
+    def retrieve(self, request, *args, **kwargs):
+        doctor = self.get_object()
+        page = self.paginate_queryset(self.get_records(doctor))
+        context = self.get_serializer_context()
+        context['records'] = page
+        data = self.get_serializer(doctor, context=context).data
+        data['count'] = self.paginator.page.paginator.count
+        data['next'] = self.paginator.get_next_link()
+        data['previous'] = self.paginator.get_previous_link()
+        return Response(data)
 
 
 #Сводный отчет
 class SummaryReportClinicAPIView(APIView):
 
+    @cached_report('records')
     def get(self, request):
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-
-        records = CustomerRecord.objects.filter(records='был в приеме')
-
-        if start_date and end_date:
-            records = records.filter(date__date__range=[start_date, end_date])
-
-        total_cash = records.filter(payment_type='cash').aggregate(Sum('price'))['price__sum'] or 0
-        total_card = records.filter(payment_type='card').aggregate(Sum('price'))['price__sum'] or 0
-        total_price = records.aggregate(Sum('price'))['price__sum'] or 0
-        total_to_doctors = total_price  # или своя логика
+        start_date, end_date = report_period(request.query_params)
+        records = DailyRevenue.objects.filter(period_filter(start_date, end_date, field='day'),
+                                              records='был в приеме')
 
-        data = {
-            "total_cash": total_cash,
-            "total_card": total_card,
-            "total_price": total_price,
-            "total_to_doctors": total_to_doctors
-        }
+        data = summary_totals(records)
 
         serializer = SummaryReportSerializer(data)
         return Response(serializer.data)
 
 
 #по врачам (процент врачу)
-class DoctorReportListAPIView(generics.ListAPIView):
+class DoctorReportListAPIView(ReportExportMixin, generics.ListAPIView):
+    export_rows = staticmethod(doctor_report_rows)
+    export_filename = 'doctor_report'
     serializer_class = DoctorReportSerializers
-    filter_backends = [DjangoFilterBackend, SearchFilter]
-    filterset_fields =  ['doctor', 'created_date']
-    search_fields = ['patient']
+    filter_backends = [DjangoFilterBackend, PatientSearchFilter]
+    filterset_class = CustomerRecordListFilter
 
 
     def get_queryset(self):
         qs = CustomerRecord.objects.select_related('doctor', 'patient', 'service')
         return self.filter_queryset(qs)
 
+    @cached_report('records', 'doctors')
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
         response = super().list(request, *args, **kwargs)
 
         # Расчёт доли врача: (price * doctor.bonus / 100)
-        queryset_with_bonus = queryset.annotate(
-            doctor_income=ExpressionWrapper(
-                F('price') * F('doctor__bonus') / 100.0,
-                output_field=FloatField()
-            )
-        )
-
-        total_doctor_income = queryset_with_bonus.aggregate(
-            Sum('doctor_income')
-        )['doctor_income__sum'] or 0
+        total_doctor_income = doctor_income_total(queryset, request.query_params)
 
         # Ответ только с суммой врача и записями
         response.data = {
-            'total_doctor_income': round(total_doctor_income, 2),
+            'total_doctor_income': total_doctor_income,
             'records': response.data
         }
         return response
 
 
+#Зарплатная ведомость (все врачи за период)
+class PayrollReportAPIView(APIView):
+    renderer_classes = EXPORT_RENDERER_CLASSES
+
+    def get(self, request):
+        if export_format(request):
+            payroll = self.get_payroll(request)
+            return EXPORT_RESPONSES[export_format(request)](payroll_rows(payroll, payroll_totals(payroll)), 'payroll')
+        return self.get_report(request)
+
+    @cached_report('records', 'doctors')
+    def get_report(self, request):
+        payroll = self.get_payroll(request)
+        return Response({
+            'start_date': request.query_params.get('start_date'),
+            'end_date': request.query_params.get('end_date'),
+            'totals': PayrollTotalsSerializer(payroll_totals(payroll)).data,
+            'doctors': PayrollRowSerializer(payroll, many=True).data,
+        })
+
+    def get_payroll(self, request):
+        start_date, end_date = report_period(request.query_params)
+        records = CustomerRecord.objects.filter(period_filter(start_date, end_date), records='был в приеме')
+        department = request.query_params.get('department')
+        if department:
+            if not department.isdigit():
+                raise serializers.ValidationError({'department': 'Неверный id отделения.'})
+            records = records.filter(doctor__department_id=department)
+        return doctor_payroll(records)
+
+
 #Управление календарем
-class DoctorScheduleApiView(generics.ListAPIView):
+class DoctorScheduleApiView(EagerLoadingMixin, generics.ListAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = AppointmentScheduleSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter]
@@ -241,17 +279,17 @@ class DoctorScheduleApiView(generics.ListAPIView):
 
 
 #Прайс лист
-class PriceListApiView(generics.ListAPIView):
+class PriceListApiView(EagerLoadingMixin, generics.ListAPIView):
     queryset = Department.objects.all()
     serializer_class = PriceListSerializer
 
 
 ###
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Department.objects.all()
     serializer_class = DepartmentsSerializer
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = ServicesSerializer
\ No newline at end of file
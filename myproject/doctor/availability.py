@@ -0,0 +1,163 @@
+from collections import defaultdict
+from datetime import time
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_time
+
+from reception.models import CustomerRecord
+from .models import DoctorSchedule, Appointment, DoctorAvailability
+
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_BYTES = SLOTS_PER_DAY // 8
+
+# Отмененные приемы и записи время не занимают
+APPOINTMENT_BOOKED = ~Q(status='cancelled')
+RECORD_BOOKED = ~Q(status='Отменено') & ~Q(records='отменен')
+
+
+def to_bitmap(bits):
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def from_bitmap(value):
+    return int.from_bytes(bytes(value or b''), 'little')
+
+
+# Поля модели до перечитывания из базы могут быть строками (start_at по умолчанию — "10:00")
+def _minutes(value):
+    if isinstance(value, str):
+        value = parse_time(value)
+    return value.hour * 60 + value.minute
+
+
+def _date(value):
+    return parse_date(value) if isinstance(value, str) else value
+
+
+# Расписание дает только целые слоты внутри интервала, запись занимает каждый слот, который задевает
+def slot_bits(start, end, whole=False):
+    if start is None or end is None:
+        return 0
+    start, end = _minutes(start), _minutes(end)
+    if whole:
+        first, last = -(-start // SLOT_MINUTES), end // SLOT_MINUTES
+    else:
+        first, last = start // SLOT_MINUTES, -(-end // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def slot_times(bits):
+    slots = []
+    for slot in range(SLOTS_PER_DAY):
+        if bits >> slot & 1:
+            minutes = slot * SLOT_MINUTES
+            slots.append(time(minutes // 60, minutes % 60).strftime('%H:%M'))
+    return slots
+
+
+def appointment_booking(values):
+    if values['status'] == 'cancelled':
+        return None
+    bits = slot_bits(values['start_time'], values['end_time'])
+    return (values['doctor_id'], _date(values['date']), bits) if bits else None
+
+
+def record_booking(values):
+    if values['doctor_id'] is None or values['status'] == 'Отменено' or values['records'] == 'отменен':
+        return None
+    bits = slot_bits(values['start_at'], values['end_at'])
+    return (values['doctor_id'], _date(values['visit_date']), bits) if bits else None
+
+
+# Маски всех дней с расписанием: {(doctor_id, date): (scheduled, booked)}
+def collect_availability(start_date=None, end_date=None, doctor_ids=None):
+    def in_range(queryset, date_field):
+        if start_date:
+            queryset = queryset.filter(**{f'{date_field}__gte': start_date})
+        if end_date:
+            queryset = queryset.filter(**{f'{date_field}__lte': end_date})
+        if doctor_ids is not None:
+            queryset = queryset.filter(doctor_id__in=doctor_ids)
+        return queryset
+
+    scheduled = defaultdict(int)
+    schedules = in_range(DoctorSchedule.objects.filter(is_available=True), 'date')
+    for doctor_id, day, start, end in schedules.values_list('doctor_id', 'date', 'start_time', 'end_time'):
+        scheduled[doctor_id, day] |= slot_bits(start, end, whole=True)
+    scheduled = {key: bits for key, bits in scheduled.items() if bits}
+    if not scheduled:
+        return {}
+
+    # занятость читаем только за даты, где есть расписание
+    days = [day for _, day in scheduled]
+    start_date, end_date = min(days), max(days)
+    booked = defaultdict(int)
+    appointments = in_range(Appointment.objects.filter(APPOINTMENT_BOOKED), 'date')
+    for doctor_id, day, start, end in appointments.values_list('doctor_id', 'date', 'start_time', 'end_time'):
+        booked[doctor_id, day] |= slot_bits(start, end)
+    records = in_range(CustomerRecord.objects.filter(RECORD_BOOKED, doctor_id__isnull=False), 'visit_date')
+    for doctor_id, day, start, end in records.values_list('doctor_id', 'visit_date', 'start_at', 'end_at'):
+        booked[doctor_id, day] |= slot_bits(start, end)
+    return {key: (bits, booked.get(key, 0)) for key, bits in scheduled.items()}
+
+
+def rebuild_availability(start_date=None, end_date=None, doctor_ids=None, batch_size=1000):
+    objs = [
+        DoctorAvailability(doctor_id=doctor_id, date=day, scheduled=to_bitmap(scheduled),
+                           free=to_bitmap(scheduled & ~booked))
+        for (doctor_id, day), (scheduled, booked) in collect_availability(start_date, end_date, doctor_ids).items()
+    ]
+    rows = DoctorAvailability.objects.all()
+    if start_date:
+        rows = rows.filter(date__gte=start_date)
+    if end_date:
+        rows = rows.filter(date__lte=end_date)
+    if doctor_ids is not None:
+        rows = rows.filter(doctor_id__in=doctor_ids)
+    with transaction.atomic():
+        rows.delete()
+        DoctorAvailability.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
+
+
+# Полный пересчет одного дня врача: после отмены, переноса или изменения расписания.
+# Строка дня блокируется, чтобы параллельные изменения того же дня применялись по очереди.
+def rebuild_day(doctor_id, day):
+    day = _date(day)
+    with transaction.atomic():
+        row = DoctorAvailability.objects.select_for_update().filter(doctor_id=doctor_id, date=day).first()
+        masks = collect_availability(day, day, [doctor_id]).get((doctor_id, day))
+        if masks is None:
+            if row is not None:
+                row.delete()
+            return None
+        scheduled, booked = masks
+        values = {'scheduled': to_bitmap(scheduled), 'free': to_bitmap(scheduled & ~booked)}
+        if row is None:
+            # первый день врача: update_or_create переживет параллельную вставку той же строки
+            return DoctorAvailability.objects.update_or_create(doctor_id=doctor_id, date=day, defaults=values)[0]
+        row.scheduled, row.free = values['scheduled'], values['free']
+        row.save()
+        return row
+
+
+# Новая запись только занимает слоты — без пересчета дня, одним обновлением строки
+def block_slots(doctor_id, day, bits):
+    with transaction.atomic():
+        row = DoctorAvailability.objects.select_for_update().filter(doctor_id=doctor_id, date=day).first()
+        if row is None:
+            return None
+        row.free = to_bitmap(from_bitmap(row.free) & ~bits)
+        row.save(update_fields=['free', 'updated_at'])
+        return row
+
+
+def free_slots(doctor_id, start_date, end_date):
+    rows = (DoctorAvailability.objects.filter(doctor_id=doctor_id, date__range=(start_date, end_date))
+            .order_by('date').values_list('date', 'free'))
+    return [{'date': day, 'slots': slot_times(from_bitmap(free))} for day, free in rows]
@@ -0,0 +1,52 @@
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from reception.models import Doctor
+from .models import Appointment
+
+
+# Имя исключающего ограничения из миграции 0005 (только PostgreSQL)
+OVERLAP_CONSTRAINT = 'appointment_no_overlap'
+OVERLAP_ERROR = 'На это время уже есть запись к врачу.'
+BOOKING_FIELDS = ('doctor', 'date', 'start_time', 'end_time', 'status')
+
+
+# Интервалы [start, end) пересекаются, если каждый начинается раньше, чем кончается другой
+def overlapping_appointments(doctor_id, day, start_time, end_time, exclude_pk=None):
+    appointments = (Appointment.objects.filter(doctor_id=doctor_id, date=day, start_time__lt=end_time,
+                                               end_time__gt=start_time)
+                    .exclude(status='cancelled'))
+    if exclude_pk is not None:
+        appointments = appointments.exclude(pk=exclude_pk)
+    return appointments
+
+
+# Строка врача блокируется до конца транзакции: записи к одному врачу проверяются и сохраняются по очереди.
+# На PostgreSQL от пересечений мимо API защищает еще и исключающее ограничение (миграция 0005).
+# SQLite блокировок строк не знает: там транзакция начинается с BEGIN IMMEDIATE (transaction_mode в
+# settings.DATABASES) и сразу берет блокировку записи всей базы.
+def lock_doctor(doctor_id):
+    list(Doctor.objects.select_for_update(of=('self',)).filter(pk=doctor_id).values_list('pk', flat=True))
+
+
+def book_appointment(data, instance=None):
+    values = {field: getattr(instance, field) for field in BOOKING_FIELDS} if instance else {}
+    values.update({field: data[field] for field in BOOKING_FIELDS if field in data})
+    with transaction.atomic():
+        lock_doctor(values['doctor'].pk)
+        if values.get('status') != 'cancelled' and overlapping_appointments(
+                values['doctor'].pk, values['date'], values['start_time'], values['end_time'],
+                exclude_pk=instance.pk if instance else None).exists():
+            raise ValidationError({'start_time': OVERLAP_ERROR})
+        try:
+            with transaction.atomic():
+                if instance is None:
+                    return Appointment.objects.create(**data)
+                for field, value in data.items():
+                    setattr(instance, field, value)
+                instance.save()
+                return instance
+        except IntegrityError as exc:
+            if OVERLAP_CONSTRAINT in str(exc):
+                raise ValidationError({'start_time': OVERLAP_ERROR})
+            raise
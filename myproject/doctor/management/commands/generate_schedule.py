@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from doctor.scheduling import generate_schedule
+
+
+class Command(BaseCommand):
+    help = 'Создает DoctorSchedule по недельным шаблонам врачей за период (существующие слоты не трогает)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', required=True, help='YYYY-MM-DD')
+        parser.add_argument('--end-date', required=True, help='YYYY-MM-DD')
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors', help='id врача (можно несколько)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        start_date, end_date = parse_date(options['start_date']), parse_date(options['end_date'])
+        if start_date is None or end_date is None or start_date > end_date:
+            raise CommandError('Укажите период --start-date <= --end-date в формате YYYY-MM-DD')
+        created = generate_schedule(start_date, end_date, options['doctors'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Создано слотов расписания: {created}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from doctor.availability import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает маски свободного времени врачей из DoctorSchedule, Appointment и CustomerRecord '
+            '(нужно после queryset.update()/bulk_create, которые не вызывают сигналы)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', help='YYYY-MM-DD, по умолчанию — все дни')
+        parser.add_argument('--end-date', help='YYYY-MM-DD, по умолчанию — все дни')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        period = []
+        for name in ('start_date', 'end_date'):
+            value = options[name]
+            if value and parse_date(value) is None:
+                raise CommandError(f'Неверная дата {value}, используйте YYYY-MM-DD')
+            period.append(parse_date(value) if value else None)
+        count = rebuild_availability(*period, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'DoctorAvailability пересобрана: {count} дней'))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0002_initial'),
+        ('reception', '0010_report_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'start_time'], name='appointment_doctor_date'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorschedule',
+            index=models.Index(fields=['date', 'doctor'], name='doctorschedule_date_doctor'),
+        ),
+    ]
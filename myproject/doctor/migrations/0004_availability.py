@@ -0,0 +1,80 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:26
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Копия масок из doctor.availability на момент миграции: 15-минутные слоты, 96 бит в 12 байтах
+SLOT_MINUTES = 15
+BITMAP_BYTES = 12
+
+
+def slot_bits(start, end, whole=False):
+    if start is None or end is None:
+        return 0
+    start, end = start.hour * 60 + start.minute, end.hour * 60 + end.minute
+    if whole:
+        first, last = -(-start // SLOT_MINUTES), end // SLOT_MINUTES
+    else:
+        first, last = start // SLOT_MINUTES, -(-end // SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def fill_availability(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    DoctorAvailability = apps.get_model('doctor', 'DoctorAvailability')
+    DoctorSchedule = apps.get_model('doctor', 'DoctorSchedule')
+    Appointment = apps.get_model('doctor', 'Appointment')
+    CustomerRecord = apps.get_model('reception', 'CustomerRecord')
+
+    scheduled = defaultdict(int)
+    schedules = DoctorSchedule.objects.using(db_alias).filter(is_available=True)
+    for doctor_id, day, start, end in schedules.values_list('doctor_id', 'date', 'start_time', 'end_time'):
+        scheduled[doctor_id, day] |= slot_bits(start, end, whole=True)
+    scheduled = {key: bits for key, bits in scheduled.items() if bits}
+    if not scheduled:
+        return
+
+    booked = defaultdict(int)
+    appointments = Appointment.objects.using(db_alias).exclude(status='cancelled')
+    for doctor_id, day, start, end in appointments.values_list('doctor_id', 'date', 'start_time', 'end_time'):
+        booked[doctor_id, day] |= slot_bits(start, end)
+    records = (CustomerRecord.objects.using(db_alias).filter(doctor_id__isnull=False)
+               .exclude(status='Отменено').exclude(records='отменен'))
+    for doctor_id, day, start, end in records.values_list('doctor_id', 'visit_date', 'start_at', 'end_at'):
+        booked[doctor_id, day] |= slot_bits(start, end)
+
+    DoctorAvailability.objects.using(db_alias).bulk_create(
+        [DoctorAvailability(doctor_id=doctor_id, date=day, scheduled=bits.to_bytes(BITMAP_BYTES, 'little'),
+                            free=(bits & ~booked.get((doctor_id, day), 0)).to_bytes(BITMAP_BYTES, 'little'))
+         for (doctor_id, day), bits in scheduled.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0003_report_indexes'),
+        ('reception', '0015_patient_phone_birth_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('scheduled', models.BinaryField(max_length=12)),
+                ('free', models.BinaryField(max_length=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='reception.doctor')),
+            ],
+            options={
+                'unique_together': {('doctor', 'date')},
+            },
+        ),
+        migrations.RunPython(fill_availability, migrations.RunPython.noop),
+    ]
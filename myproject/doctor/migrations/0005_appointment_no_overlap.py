@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:41
+
+from django.db import migrations
+
+
+# PostgreSQL: исключающее ограничение — пересечения не пройдут даже мимо API (админка, скрипты).
+# Миграция упадет, если в таблице уже есть пересекающиеся записи: их нужно развести или отменить заранее.
+# На SQLite ограничения нет, пересечения отсекает doctor.booking.book_appointment.
+POSTGRES_CONSTRAINT_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS btree_gist',
+    """ALTER TABLE doctor_appointment ADD CONSTRAINT appointment_no_overlap EXCLUDE USING gist (
+        doctor_id WITH =, tsrange(date + start_time, date + end_time) WITH &&) WHERE (status <> 'cancelled')""",
+]
+POSTGRES_DROP_SQL = [
+    'ALTER TABLE doctor_appointment DROP CONSTRAINT IF EXISTS appointment_no_overlap',
+]
+
+
+def create_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_CONSTRAINT_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_overlap_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0004_availability'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_overlap_constraint, drop_overlap_constraint),
+    ]
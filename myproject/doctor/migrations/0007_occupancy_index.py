@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor', '0006_schedule_templates'),
+        ('reception', '0016_calendar_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['date', 'doctor'], name='appointment_date_doctor'),
+        ),
+    ]
@@ -12,11 +12,58 @@ class DoctorSchedule(models.Model):
 
     class Meta:
         unique_together = ('doctor', 'date', 'start_time')
+        indexes = [
+            # расписание всех врачей за период (календарь, загрузка)
+            models.Index(fields=['date', 'doctor'], name='doctorschedule_date_doctor'),
+        ]
 
     def __str__(self):
         return f"{self.doctor} - {self.date} ({self.start_time}-{self.end_time})"
 
 
+# --- Шаблон недельного расписания ---
+# Из шаблонов генерируются строки DoctorSchedule (по одной на слот), см. doctor/scheduling.py
+class ScheduleTemplate(models.Model):
+    WEEKDAY_CHOICES = (
+        (0, 'Понедельник'),
+        (1, 'Вторник'),
+        (2, 'Среда'),
+        (3, 'Четверг'),
+        (4, 'Пятница'),
+        (5, 'Суббота'),
+        (6, 'Воскресенье'),
+    )
+
+    doctor = models.ForeignKey(Doctor, related_name='schedule_templates', on_delete=models.CASCADE)
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        unique_together = ('doctor', 'weekday', 'start_time')
+
+    def __str__(self):
+        return f"{self.doctor} - {self.get_weekday_display()} ({self.start_time}-{self.end_time})"
+
+
+# Исключение из шаблона: выходной (без времени) или закрытый интервал дня
+class ScheduleException(models.Model):
+    doctor = models.ForeignKey(Doctor, related_name='schedule_exceptions', on_delete=models.CASCADE)
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='scheduleexception_doctor_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor} - {self.date} {self.reason}"
+
+
 # --- Запись на прием ---
 class Appointment(models.Model):
     STATUS_CHOICES = (
@@ -36,5 +83,31 @@ class Appointment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # приемы врача за день и проверка пересечений по времени
+            models.Index(fields=['doctor', 'date', 'start_time'], name='appointment_doctor_date'),
+            # приемы всех врачей за период (загрузка по месяцу)
+            models.Index(fields=['date', 'doctor'], name='appointment_date_doctor'),
+        ]
+
     def __str__(self):
         return f"{self.patient} → {self.doctor} on {self.date} at {self.start_time}-{self.end_time}"
+
+
+# --- Свободное время врача ---
+# День врача — битовая маска слотов по SLOT_MINUTES: бит i = слот, начинающийся в i * SLOT_MINUTES минут.
+# scheduled — слоты из расписания, free — они же без занятых приемами и записями (см. doctor/availability.py)
+class DoctorAvailability(models.Model):
+    doctor = models.ForeignKey(Doctor, related_name='availability', on_delete=models.CASCADE)
+    date = models.DateField()
+    scheduled = models.BinaryField(max_length=12)
+    free = models.BinaryField(max_length=12)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # уникальность (doctor, date) заодно индекс для выборки диапазона дат врача
+        unique_together = ('doctor', 'date')
+
+    def __str__(self):
+        return f"{self.doctor} - {self.date}"
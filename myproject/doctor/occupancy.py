@@ -0,0 +1,61 @@
+import calendar
+from datetime import date
+
+from django.db.models import Count, IntegerField, Q, Value
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from reception.models import CustomerRecord
+from .models import DoctorSchedule, Appointment
+
+
+CELL_FIELDS = ('booked', 'cancelled', 'capacity')
+
+
+# ?month=YYYY-MM, по умолчанию — текущий месяц; возвращает первый и последний день
+def month_period(value):
+    if value:
+        try:
+            year, month = (int(part) for part in value.split('-'))
+            first = date(year, month, 1)
+        except ValueError:
+            raise ValidationError({'month': 'Неверный формат месяца, используйте YYYY-MM.'})
+    else:
+        first = timezone.localdate().replace(day=1)
+    return first, first.replace(day=calendar.monthrange(first.year, first.month)[1])
+
+
+def _cells(queryset, date_field, booked=None, cancelled=None, capacity=None):
+    zero = Value(0, output_field=IntegerField())
+    return (queryset.values('doctor_id', date_field).order_by()
+            .annotate(booked=Count('id', filter=booked) if booked is not None else zero,
+                      cancelled=Count('id', filter=cancelled) if cancelled is not None else zero,
+                      capacity=Count('id', filter=capacity) if capacity is not None else zero))
+
+
+# Матрица врач × день за месяц одним запросом: UNION ALL трех группировок
+# (записи регистратуры, приемы, слоты расписания), суммы по ячейке — в Python
+def month_occupancy(first, last, department_id=None):
+    owner = Q(doctor__department_id=department_id) if department_id else Q()
+    record_cancelled = Q(status='Отменено') | Q(records='отменен')
+    records = _cells(CustomerRecord.objects.filter(owner, visit_date__range=(first, last), doctor__isnull=False),
+                     'visit_date', booked=~record_cancelled, cancelled=record_cancelled)
+    appointments = _cells(Appointment.objects.filter(owner, date__range=(first, last)), 'date',
+                          booked=~Q(status='cancelled'), cancelled=Q(status='cancelled'))
+    schedules = _cells(DoctorSchedule.objects.filter(owner, date__range=(first, last)), 'date',
+                       capacity=Q(is_available=True))
+
+    matrix = {}
+    for row in records.union(appointments, schedules, all=True):
+        cell = matrix.setdefault(row['doctor_id'], {}).setdefault(row['visit_date'], dict.fromkeys(CELL_FIELDS, 0))
+        for field in CELL_FIELDS:
+            cell[field] += row[field]
+
+    doctors = []
+    for doctor_id in sorted(matrix):
+        days = []
+        for day in sorted(matrix[doctor_id]):
+            cell = matrix[doctor_id][day]
+            days.append({'date': day, **cell, 'free': max(cell['capacity'] - cell['booked'], 0)})
+        doctors.append({'doctor': doctor_id, 'days': days})
+    return doctors
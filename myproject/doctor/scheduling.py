@@ -0,0 +1,78 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from django.db import transaction
+
+from reception.cache import bump_scopes
+from .availability import rebuild_availability
+from .models import DoctorSchedule, ScheduleTemplate, ScheduleException
+
+
+def _dates(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+# Слоты шаблона: [start, start + slot_minutes), последний неполный слот не создается
+def _template_slots(template):
+    step = timedelta(minutes=template.slot_minutes)
+    start = datetime.combine(date.min, template.start_time)
+    end = datetime.combine(date.min, template.end_time)
+    while start + step <= end:
+        yield start.time(), (start + step).time()
+        start += step
+
+
+def _blocked(exceptions, start_time, end_time):
+    for exception in exceptions:
+        if exception.start_time is None or exception.end_time is None:
+            return True
+        if exception.start_time < end_time and start_time < exception.end_time:
+            return True
+    return False
+
+
+def schedule_rows(start_date, end_date, doctor_ids=None):
+    templates = ScheduleTemplate.objects.filter(slot_minutes__gt=0).order_by('doctor_id', 'weekday', 'start_time')
+    exceptions = ScheduleException.objects.filter(date__range=(start_date, end_date))
+    if doctor_ids is not None:
+        templates = templates.filter(doctor_id__in=doctor_ids)
+        exceptions = exceptions.filter(doctor_id__in=doctor_ids)
+
+    by_weekday = defaultdict(list)
+    for template in templates:
+        by_weekday[template.weekday].append((template, list(_template_slots(template))))
+    day_exceptions = defaultdict(list)
+    for exception in exceptions:
+        day_exceptions[exception.doctor_id, exception.date].append(exception)
+
+    for day in _dates(start_date, end_date):
+        for template, slots in by_weekday[day.weekday()]:
+            blocked = day_exceptions.get((template.doctor_id, day), ())
+            for start_time, end_time in slots:
+                if not _blocked(blocked, start_time, end_time):
+                    yield DoctorSchedule(doctor_id=template.doctor_id, date=day, start_time=start_time,
+                                         end_time=end_time)
+
+
+# Разворачивает шаблоны на период и пишет слоты пачками. Уже существующие (doctor, date, start_time)
+# пропускаются уникальным ограничением — повторный запуск за тот же период ничего не дублирует.
+# bulk_create не вызывает сигналы, поэтому свободное время за период пересобирается в конце.
+def generate_schedule(start_date, end_date, doctor_ids=None, batch_size=1000):
+    existing = DoctorSchedule.objects.filter(date__range=(start_date, end_date))
+    if doctor_ids is not None:
+        existing = existing.filter(doctor_id__in=doctor_ids)
+    with transaction.atomic():
+        before = existing.count()
+        rows = schedule_rows(start_date, end_date, doctor_ids)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            DoctorSchedule.objects.bulk_create(batch, ignore_conflicts=True)
+        rebuild_availability(start_date, end_date, doctor_ids, batch_size=batch_size)
+        bump_scopes('schedules')
+        return existing.count() - before
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import DoctorSchedule, Appointment
+from reception.models import Doctor
+from .booking import book_appointment
+from .models import DoctorSchedule, Appointment, ScheduleTemplate, ScheduleException
 
 
 class DoctorScheduleSerializer(serializers.ModelSerializer):
@@ -14,9 +16,62 @@ class AppointmentSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def validate(self, data):
-        doctor = data['doctor']
-        date = data['date']
-        time = data['time']
-        if Appointment.objects.filter(doctor=doctor, date=date, time=time).exists():
-            raise serializers.ValidationError("На это время уже есть запись к врачу.")
-        return data
\ No newline at end of file
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and start_time >= end_time:
+            raise serializers.ValidationError({'end_time': 'Время окончания должно быть позже начала.'})
+        return data
+
+    # Пересечение с другими записями проверяется при сохранении, под блокировкой врача
+    def create(self, validated_data):
+        return book_appointment(validated_data)
+
+    def update(self, instance, validated_data):
+        return book_appointment(validated_data, instance)
+
+
+class ScheduleTemplateSerializer(serializers.ModelSerializer):
+    slot_minutes = serializers.IntegerField(min_value=5, max_value=480, default=30)
+
+    class Meta:
+        model = ScheduleTemplate
+        fields = '__all__'
+
+    def validate(self, data):
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time and end_time and start_time >= end_time:
+            raise serializers.ValidationError({'end_time': 'Время окончания должно быть позже начала.'})
+        return data
+
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleException
+        fields = '__all__'
+
+    # Без времени — выходной на весь день; иначе нужны оба конца интервала
+    def validate(self, data):
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if (start_time is None) != (end_time is None):
+            raise serializers.ValidationError('Укажите и start_time, и end_time, или ни одного.')
+        if start_time and start_time >= end_time:
+            raise serializers.ValidationError({'end_time': 'Время окончания должно быть позже начала.'})
+        return data
+
+
+class ScheduleGenerateSerializer(serializers.Serializer):
+    max_days = 366
+
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    # по умолчанию — все врачи с шаблонами
+    doctors = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), many=True, required=False)
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError({'end_date': 'end_date раньше start_date.'})
+        if (data['end_date'] - data['start_date']).days >= self.max_days:
+            raise serializers.ValidationError({'end_date': f'Период не больше {self.max_days} дней.'})
+        return data
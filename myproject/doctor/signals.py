@@ -0,0 +1,90 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from reception.cache import bump_scopes
+from reception.models import CustomerRecord
+from reception.signals import BOOKING_RECORD_FIELDS, old_record, signals_muted
+from .availability import appointment_booking, record_booking, rebuild_day, block_slots
+from .models import DoctorSchedule, Appointment
+
+
+APPOINTMENT_FIELDS = ('doctor_id', 'date', 'start_time', 'end_time', 'status')
+
+
+def _values(instance, fields):
+    return {field: getattr(instance, field) for field in fields}
+
+
+# Новая запись занимает слоты в уже посчитанном дне; отмена, перенос и удаление пересчитывают старый день
+def apply_booking(old, new):
+    if old == new:
+        return
+    if old:
+        rebuild_day(old[0], old[1])
+    if new and (not old or old[:2] != new[:2]):
+        block_slots(*new)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_old_appointment(sender, instance, **kwargs):
+    instance._availability_old = None
+    if instance.pk and not signals_muted():
+        old = Appointment.objects.filter(pk=instance.pk).values(*APPOINTMENT_FIELDS).first()
+        instance._availability_old = appointment_booking(old) if old else None
+
+
+@receiver(post_save, sender=Appointment)
+def update_availability_on_appointment(sender, instance, raw=False, **kwargs):
+    if raw or signals_muted():
+        return
+    apply_booking(getattr(instance, '_availability_old', None),
+                  appointment_booking(_values(instance, APPOINTMENT_FIELDS)))
+    bump_scopes('schedules')
+
+
+@receiver(post_delete, sender=Appointment)
+def update_availability_on_appointment_delete(sender, instance, **kwargs):
+    if not signals_muted():
+        apply_booking(appointment_booking(_values(instance, APPOINTMENT_FIELDS)), None)
+        bump_scopes('schedules')
+
+
+# Записи регистратуры со временем по умолчанию (start_at == end_at) слотов не занимают и день не трогают.
+# Старую строку уже прочитал pre_save в reception/signals.py — второго запроса нет.
+@receiver(post_save, sender=CustomerRecord)
+def update_availability_on_record(sender, instance, raw=False, **kwargs):
+    if raw or signals_muted():
+        return
+    old = old_record(instance)
+    apply_booking(record_booking(old) if old else None, record_booking(_values(instance, BOOKING_RECORD_FIELDS)))
+
+
+@receiver(post_delete, sender=CustomerRecord)
+def update_availability_on_record_delete(sender, instance, **kwargs):
+    if not signals_muted():
+        apply_booking(record_booking(_values(instance, BOOKING_RECORD_FIELDS)), None)
+
+
+@receiver(pre_save, sender=DoctorSchedule)
+def remember_old_schedule(sender, instance, **kwargs):
+    instance._availability_old = None
+    if instance.pk:
+        instance._availability_old = DoctorSchedule.objects.filter(pk=instance.pk).values_list(
+            'doctor_id', 'date').first()
+
+
+@receiver(post_save, sender=DoctorSchedule)
+def update_availability_on_schedule(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_availability_old', None)
+    if old and old != (instance.doctor_id, instance.date):
+        rebuild_day(*old)
+    rebuild_day(instance.doctor_id, instance.date)
+    bump_scopes('schedules')
+
+
+@receiver(post_delete, sender=DoctorSchedule)
+def update_availability_on_schedule_delete(sender, instance, **kwargs):
+    rebuild_day(instance.doctor_id, instance.date)
+    bump_scopes('schedules')
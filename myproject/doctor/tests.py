@@ -1,3 +1,314 @@
-from django.test import TestCase
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time
+from io import StringIO
+from unittest import SkipTest, skipIf
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from reception.models import CustomerRecord, Department, Doctor, Patient, Service
+from reception.tests import ClinicDataMixin
+
+from .availability import from_bitmap, rebuild_availability, slot_bits, slot_times
+from .booking import book_appointment
+from .models import Appointment, DoctorAvailability, DoctorSchedule, ScheduleException, ScheduleTemplate
+
+
+DAY = date(2030, 3, 5)
+
+
+class AvailabilityTests(ClinicDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.doctor)
+        DoctorSchedule.objects.create(doctor=self.doctor, date=DAY, start_time=time(9), end_time=time(10))
+        DoctorSchedule.objects.create(doctor=self.doctor, date=DAY, start_time=time(14), end_time=time(15))
+
+    def free(self, day=DAY):
+        row = DoctorAvailability.objects.filter(doctor=self.doctor, date=day).first()
+        return slot_times(from_bitmap(row.free)) if row else None
+
+    def book(self, start, end, day=DAY, **kwargs):
+        return Appointment.objects.create(patient=self.patient, doctor=self.doctor, department=self.department,
+                                          service=self.service, date=day, start_time=start, end_time=end, **kwargs)
+
+    def test_slot_bits(self):
+        self.assertEqual(slot_times(slot_bits(time(9), time(10), whole=True)), ['09:00', '09:15', '09:30', '09:45'])
+        # расписание — только целые слоты, запись — все задетые
+        self.assertEqual(slot_times(slot_bits(time(9, 10), time(9, 40), whole=True)), ['09:15'])
+        self.assertEqual(slot_times(slot_bits(time(9, 10), time(9, 40))), ['09:00', '09:15', '09:30'])
+        self.assertEqual(slot_bits(time(10), time(10)), 0)
+
+    def test_schedule_builds_day(self):
+        self.assertEqual(self.free(), ['09:00', '09:15', '09:30', '09:45', '14:00', '14:15', '14:30', '14:45'])
+        DoctorSchedule.objects.filter(start_time=time(14)).get().delete()
+        self.assertEqual(self.free(), ['09:00', '09:15', '09:30', '09:45'])
+        DoctorSchedule.objects.get().delete()
+        self.assertIsNone(self.free())
+
+    def test_appointment_blocks_and_releases_slots(self):
+        appointment = self.book(time(9), time(9, 30))
+        self.assertEqual(self.free(), ['09:30', '09:45', '14:00', '14:15', '14:30', '14:45'])
+        self.book(time(9, 15), time(9, 45))
+        self.assertEqual(self.free(), ['09:45', '14:00', '14:15', '14:30', '14:45'])
+        # отмена первой записи освобождает только то, что не занято второй
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertEqual(self.free(), ['09:00', '09:45', '14:00', '14:15', '14:30', '14:45'])
+        Appointment.objects.all().delete()
+        self.assertEqual(self.free(), ['09:00', '09:15', '09:30', '09:45', '14:00', '14:15', '14:30', '14:45'])
+
+    def test_moved_appointment_updates_both_days(self):
+        other_day = date(2030, 3, 6)
+        DoctorSchedule.objects.create(doctor=self.doctor, date=other_day, start_time=time(9), end_time=time(10))
+        appointment = self.book(time(9), time(10))
+        self.assertEqual(self.free(), ['14:00', '14:15', '14:30', '14:45'])
+        appointment.date = other_day
+        appointment.save()
+        self.assertEqual(self.free(), ['09:00', '09:15', '09:30', '09:45', '14:00', '14:15', '14:30', '14:45'])
+        self.assertEqual(self.free(other_day), [])
+
+    def test_customer_record_blocks_slots(self):
+        record = CustomerRecord(patient=self.patient, doctor=self.doctor, service=self.service,
+                                start_at=time(14), end_at=time(14, 30))
+        record.visit_at = record.visit_at.replace(year=DAY.year, month=DAY.month, day=DAY.day, hour=8)
+        record.save()
+        self.assertEqual(self.free(), ['09:00', '09:15', '09:30', '09:45', '14:30', '14:45'])
+        record.status = 'Отменено'
+        with CaptureQueriesContext(connection) as queries:
+            record.save()
+        self.assertEqual(self.free(), ['09:00', '09:15', '09:30', '09:45', '14:00', '14:15', '14:30', '14:45'])
+        # старую строку читает один pre_save на сводку, счетчики и свободное время
+        old_row = f'WHERE "reception_customerrecord"."id" = {record.pk} '
+        selects = [sql for sql in (query['sql'] for query in queries.captured_queries)
+                   if sql.startswith('SELECT') and old_row in sql]
+        self.assertEqual(len(selects), 1)
+
+    def test_rebuild_matches_incremental_state(self):
+        self.book(time(9), time(9, 30))
+        self.book(time(14, 10), time(14, 20), status='reserved')
+        expected = self.free()
+        DoctorAvailability.objects.all().delete()
+        self.assertEqual(rebuild_availability(), 1)
+        self.assertEqual(self.free(), expected)
+
+    def test_free_slots_endpoint(self):
+        self.book(time(9), time(10))
+        url = reverse('doctor_availability', args=[self.doctor.pk])
+        with self.assertNumQueries(1):
+            response = self.api.get(url, {'start_date': '2030-03-01', 'end_date': '2030-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['slot_minutes'], 15)
+        self.assertEqual(response.data['days'], [{'date': DAY, 'slots': ['14:00', '14:15', '14:30', '14:45']}])
+        response = self.api.get(url, {'start_date': '2030-01-01', 'end_date': '2030-12-31'})
+        self.assertEqual(response.status_code, 400)
+
+
+
+class ScheduleGenerationTests(ClinicDataMixin, TestCase):
+    # 2030-03-04 — понедельник
+    MONDAY = date(2030, 3, 4)
+
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.doctor)
+        ScheduleTemplate.objects.create(doctor=self.doctor, weekday=0, start_time=time(9), end_time=time(11),
+                                        slot_minutes=30)
+        # последний неполный слот (16:00–16:45) не создается
+        ScheduleTemplate.objects.create(doctor=self.doctor, weekday=2, start_time=time(14), end_time=time(16, 45),
+                                        slot_minutes=60)
+
+    def generate(self, **data):
+        return self.api.post(reverse('schedule_generate'), {'start_date': '2030-03-04', 'end_date': '2030-03-17',
+                                                           **data}, format='json')
+
+    def test_generates_slots_from_templates(self):
+        response = self.generate()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2 * (4 + 2))
+        monday = DoctorSchedule.objects.filter(date=self.MONDAY).order_by('start_time')
+        self.assertEqual([(row.start_time, row.end_time) for row in monday],
+                         [(time(9), time(9, 30)), (time(9, 30), time(10)), (time(10), time(10, 30)),
+                          (time(10, 30), time(11))])
+        self.assertEqual(set(DoctorSchedule.objects.values_list('date', flat=True).distinct()),
+                         {self.MONDAY, date(2030, 3, 6), date(2030, 3, 11), date(2030, 3, 13)})
+        # повторная генерация ничего не дублирует
+        self.assertEqual(self.generate().data['created'], 0)
+        self.assertEqual(DoctorSchedule.objects.count(), 12)
+
+    def test_exceptions_skip_slots(self):
+        ScheduleException.objects.create(doctor=self.doctor, date=self.MONDAY, reason='Отпуск')
+        ScheduleException.objects.create(doctor=self.doctor, date=date(2030, 3, 11), start_time=time(9, 45),
+                                         end_time=time(10, 15), reason='Совещание')
+        self.assertEqual(self.generate().data['created'], 2 + 2 + 2)
+        self.assertFalse(DoctorSchedule.objects.filter(date=self.MONDAY).exists())
+        self.assertEqual(list(DoctorSchedule.objects.filter(date=date(2030, 3, 11))
+                              .order_by('start_time').values_list('start_time', flat=True)), [time(9), time(10, 30)])
+
+    def test_generation_rebuilds_availability(self):
+        self.generate()
+        row = DoctorAvailability.objects.get(doctor=self.doctor, date=self.MONDAY)
+        self.assertEqual(slot_times(from_bitmap(row.free)),
+                         ['09:00', '09:15', '09:30', '09:45', '10:00', '10:15', '10:30', '10:45'])
+
+    def test_generation_limits(self):
+        self.assertEqual(self.generate(end_date='2030-03-01').status_code, 400)
+        self.assertEqual(self.generate(end_date='2031-12-31').status_code, 400)
+        other = ScheduleTemplate.objects.create(doctor=self.doctor, weekday=4, start_time=time(9),
+                                                end_time=time(10))
+        response = self.api.patch(f'/ru/schedule_template/{other.pk}/', {'end_time': '08:00'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        call_command('generate_schedule', '--start-date', '2030-03-04', '--end-date', '2030-03-10',
+                     '--doctor', str(self.doctor.pk), stdout=StringIO())
+        self.assertEqual(DoctorSchedule.objects.count(), 6)
+
+
+class OccupancyTests(ClinicDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.doctor)
+        for hour in (9, 10, 11):
+            DoctorSchedule.objects.create(doctor=self.doctor, date=DAY, start_time=time(hour),
+                                          end_time=time(hour + 1))
+        DoctorSchedule.objects.create(doctor=self.doctor, date=DAY, start_time=time(12), end_time=time(13),
+                                      is_available=False)
+        for status in ('waiting', 'cancelled'):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, department=self.department,
+                                       service=self.service, date=DAY, start_time=time(9), end_time=time(10),
+                                       status=status)
+        records = CustomerRecord.objects.filter(doctor=self.doctor).order_by('pk')
+        CustomerRecord.objects.filter(pk=records[0].pk).update(visit_date=DAY)
+        CustomerRecord.objects.filter(pk=records[1].pk).update(visit_date=DAY, status='Отменено')
+
+    def occupancy(self, **params):
+        return self.api.get(reverse('occupancy'), {'month': '2030-03', **params})
+
+    def test_month_matrix(self):
+        with self.assertNumQueries(1):
+            response = self.occupancy()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['month'], '2030-03')
+        self.assertEqual(response.data['doctors'], [{'doctor': self.doctor.pk, 'days': [
+            {'date': DAY, 'booked': 2, 'cancelled': 2, 'capacity': 3, 'free': 1},
+        ]}])
+        self.assertEqual(self.occupancy(department=self.department.pk + 1).data['doctors'], [])
+        self.assertEqual(self.occupancy(month='2030-13').status_code, 400)
+
+    def test_cached_until_bookings_change(self):
+        self.occupancy()
+        with self.assertNumQueries(0):
+            self.occupancy()
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, department=self.department,
+                                   service=self.service, date=DAY, start_time=time(10), end_time=time(11))
+        self.assertEqual(self.occupancy().data['doctors'][0]['days'][0]['booked'], 3)
+        DoctorSchedule.objects.filter(start_time=time(11)).delete()
+        self.assertEqual(self.occupancy().data['doctors'][0]['days'][0]['capacity'], 2)
+
+
+class AppointmentBookingTests(ClinicDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.api = APIClient()
+        self.api.force_authenticate(self.doctor)
+
+    def book(self, start, end, **extra):
+        return self.api.post('/ru/appointment/', {
+            'patient': self.patient.pk, 'doctor': self.doctor.pk, 'department': self.department.pk,
+            'service': self.service.pk, 'date': '2030-03-05', 'start_time': start, 'end_time': end, **extra,
+        })
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book('09:00', '09:30').status_code, 201)
+        response = self.book('09:15', '09:45')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start_time', response.data)
+        # соседний интервал и другой врач не пересекаются
+        self.assertEqual(self.book('09:30', '10:00').status_code, 201)
+        self.assertEqual(Appointment.objects.count(), 2)
+
+    def test_cancelled_appointment_frees_time(self):
+        self.assertEqual(self.book('09:00', '09:30', status='cancelled').status_code, 201)
+        self.assertEqual(self.book('09:00', '09:30').status_code, 201)
+
+    def test_update_into_overlap_is_rejected(self):
+        self.book('09:00', '09:30')
+        appointment = Appointment.objects.get(pk=self.book('10:00', '10:30').data['id'])
+        response = self.api.patch(f'/ru/appointment/{appointment.pk}/', {'start_time': '09:20'})
+        self.assertEqual(response.status_code, 400)
+        # сдвиг внутри собственного интервала — не пересечение
+        response = self.api.patch(f'/ru/appointment/{appointment.pk}/', {'end_time': '10:45'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_end_must_follow_start(self):
+        self.assertEqual(self.book('10:00', '09:00').status_code, 400)
+
+
+# Настоящие параллельные транзакции: нужна отдельная база на диске (SQLite в памяти блокирует таблицы целиком).
+# Обычный прогон идет в памяти и эти тесты пропускает; запуск — с TEST_DATABASE_NAME (см. settings.DATABASES).
+class AppointmentConcurrencyTests(TransactionTestCase):
+    workers = 8
+    attempts = 40
+
+    @classmethod
+    def setUpClass(cls):
+        # имя тестовой базы известно только после ее создания, поэтому проверка здесь, а не в skipIf
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise SkipTest('нужна файловая тестовая база: TEST_DATABASE_NAME')
+        super().setUpClass()
+
+    def setUp(self):
+        self.department = Department.objects.create(name='Терапия')
+        self.service = Service.objects.create(name='Консультация', department=self.department, price=1000)
+        self.doctor = Doctor.objects.create_user(email='doctor@example.com', password='pass', first_name='Азамат',
+                                                 last_name='Токтогулов', speciality='Терапевт',
+                                                 department=self.department, bonus=10, cabinet=1, image='')
+        self.patient = Patient.objects.create(full_name='Айбек Садыков', date_birth='1990-01-01', gender='male')
+
+    def attempt(self, start, end):
+        try:
+            book_appointment({'patient': self.patient, 'doctor': self.doctor, 'department': self.department,
+                              'service': self.service, 'date': DAY, 'start_time': start, 'end_time': end})
+            return True
+        except ValidationError:
+            return False
+        finally:
+            connections.close_all()
+
+    def run_concurrently(self, intervals):
+        started = clock.perf_counter()
+        with ThreadPoolExecutor(self.workers) as pool:
+            results = list(pool.map(lambda interval: self.attempt(*interval), intervals))
+        return results, clock.perf_counter() - started
+
+    def test_only_one_booking_wins_the_same_slot(self):
+        results, _ = self.run_concurrently([(time(9), time(9, 30))] * self.attempts)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    @skipIf(connection.vendor != 'sqlite', 'режим транзакции задается только на SQLite')
+    def test_booking_takes_write_lock_at_begin(self):
+        with CaptureQueriesContext(connection) as queries:
+            book_appointment({'patient': self.patient, 'doctor': self.doctor, 'department': self.department,
+                              'service': self.service, 'date': DAY, 'start_time': time(9), 'end_time': time(9, 30)})
+        begins = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('BEGIN')]
+        self.assertEqual(begins, ['BEGIN IMMEDIATE'])
+
+    def test_disjoint_bookings_all_succeed(self):
+        intervals = [(time(8 + slot // 4, slot % 4 * 15), time(8 + (slot + 1) // 4, (slot + 1) % 4 * 15))
+                     for slot in range(self.attempts)]
+        results, elapsed = self.run_concurrently(intervals)
+        self.assertTrue(all(results))
+        self.assertEqual(Appointment.objects.count(), self.attempts)
+        # блокировка врача сериализует записи, но не должна превращаться в секунды ожидания на каждую
+        self.assertLess(elapsed, 10)
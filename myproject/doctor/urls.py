@@ -5,8 +5,13 @@ from rest_framework import routers
 router = routers.SimpleRouter()
 router.register(r'schedule', DoctorScheduleViewSet, basename='schedule-list')
 router.register(r'appointment', AppointmentViewSet, basename='appointment-list')
+router.register(r'schedule_template', ScheduleTemplateViewSet, basename='schedule-template')
+router.register(r'schedule_exception', ScheduleExceptionViewSet, basename='schedule-exception')
 
 
 urlpatterns = [
     path('', include(router.urls)),
-]
\ No newline at end of file
+    path('schedule_generate/', ScheduleGenerateAPIView.as_view(), name='schedule_generate'),
+    path('availability/<int:doctor_id>/', DoctorAvailabilityAPIView.as_view(), name='doctor_availability'),
+    path('occupancy/', OccupancyAPIView.as_view(), name='occupancy'),
+]
@@ -1,6 +1,19 @@
-from rest_framework import viewsets, permissions
-from .models import DoctorSchedule, Appointment
-from .serializers import DoctorScheduleSerializer, AppointmentSerializer
+from datetime import timedelta
+
+from django.utils import timezone
+from rest_framework import viewsets, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from reception.cache import cached_report
+from reception.reports import report_period
+from .availability import SLOT_MINUTES, free_slots
+from .models import DoctorSchedule, Appointment, ScheduleTemplate, ScheduleException
+from .occupancy import month_occupancy, month_period
+from .scheduling import generate_schedule
+from .serializers import (DoctorScheduleSerializer, AppointmentSerializer, ScheduleTemplateSerializer,
+                          ScheduleExceptionSerializer, ScheduleGenerateSerializer)
 
 
 class DoctorScheduleViewSet(viewsets.ModelViewSet):
@@ -12,4 +25,64 @@ class DoctorScheduleViewSet(viewsets.ModelViewSet):
 class AppointmentViewSet(viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
-    permission_classes = [permissions.IsAuthenticated]
\ No newline at end of file
+    permission_classes = [permissions.IsAuthenticated]
+
+
+class ScheduleTemplateViewSet(viewsets.ModelViewSet):
+    queryset = ScheduleTemplate.objects.all()
+    serializer_class = ScheduleTemplateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+class ScheduleExceptionViewSet(viewsets.ModelViewSet):
+    queryset = ScheduleException.objects.all()
+    serializer_class = ScheduleExceptionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+
+# Расписание по шаблонам на период (например, квартал для всей клиники) одним запросом
+class ScheduleGenerateAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = ScheduleGenerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        doctor_ids = [doctor.pk for doctor in data['doctors']] if data.get('doctors') else None
+        created = generate_schedule(data['start_date'], data['end_date'], doctor_ids)
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+
+
+# Свободные слоты врача за период (по умолчанию неделя с сегодняшнего дня) — одно чтение по (doctor, date)
+class DoctorAvailabilityAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    max_days = 92
+
+    def get(self, request, doctor_id):
+        start_date, end_date = report_period(request.query_params)
+        start_date = start_date or timezone.localdate()
+        end_date = end_date or start_date + timedelta(days=6)
+        if start_date > end_date or (end_date - start_date).days >= self.max_days:
+            raise ValidationError({'detail': f'Период от start_date до end_date — не больше {self.max_days} дней.'})
+        return Response({
+            'doctor': doctor_id,
+            'slot_minutes': SLOT_MINUTES,
+            'days': free_slots(doctor_id, start_date, end_date),
+        })
+
+
+# Загрузка за месяц для календаря: занято/отменено/емкость по врачам и дням (?month=YYYY-MM&department=).
+# Кеш на месяц и фильтр; сбрасывается при любом изменении записей, приемов или расписания.
+class OccupancyAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @cached_report('records', 'schedules', 'doctors')
+    def get(self, request):
+        first, last = month_period(request.query_params.get('month'))
+        department = request.query_params.get('department')
+        if department and not department.isdigit():
+            raise ValidationError({'department': 'Ожидается id.'})
+        return Response({
+            'month': first.strftime('%Y-%m'),
+            'doctors': month_occupancy(first, last, int(department) if department else None),
+        })
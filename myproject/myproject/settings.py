@@ -92,6 +92,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Транзакции начинаются с BEGIN IMMEDIATE: запись берет блокировку сразу и ждет чужую (timeout, 5 с
+        # по умолчанию), а не падает с «database is locked» посреди транзакции (см. doctor/booking.py).
+        # Режим задается на соединение целиком, поэтому так начинаются и транзакции только на чтение.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        # Тесты идут на базе в памяти. Параллельные записи (doctor.tests.AppointmentConcurrencyTests) на ней
+        # пропускаются; для них: TEST_DATABASE_NAME=test_db.sqlite3 python manage.py test doctor
+        'TEST': {'NAME': os.getenv('TEST_DATABASE_NAME')},
     }
 }
 
@@ -149,6 +156,17 @@ REST_FRAMEWORK = {
     )
 }
 
+# Кеш отчетов общий для всех воркеров gunicorn
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')),
+    }
+}
+REPORT_CACHE_TIMEOUT = 300
+# Закрытые визиты старше этого срока переносятся в архив командой archive_records
+RECORD_ARCHIVE_AFTER_DAYS = 730
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 
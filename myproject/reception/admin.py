@@ -8,4 +8,8 @@ admin.site.register(Department)
 admin.site.register(Reception)
 admin.site.register(Service)
 admin.site.register(HistoryRecord)
+admin.site.register(ArchivedCustomerRecord)
+admin.site.register(ArchivedHistoryRecord)
 admin.site.register(PriceList)
+admin.site.register(DailyRevenue)
+admin.site.register(ReportJob)
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_scopes
+from .models import CustomerRecord, HistoryRecord, ArchivedCustomerRecord, ArchivedHistoryRecord
+from .pagination import RecordCursorPagination
+from .signals import muted_signals
+
+
+# Закрытый визит: прием состоялся или отменен; записи «в ожидании» остаются в живой таблице
+CLOSED_RECORDS = ('был в приеме', 'отменен')
+
+RECORD_FIELDS = [field.attname for field in CustomerRecord._meta.concrete_fields]
+HISTORY_FIELDS = [field.attname for field in HistoryRecord._meta.concrete_fields]
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.RECORD_ARCHIVE_AFTER_DAYS
+    return timezone.localdate() - timedelta(days=days)
+
+
+def archivable_records(before):
+    return CustomerRecord.objects.filter(visit_date__lt=before, records__in=CLOSED_RECORDS)
+
+
+# Переносит записи пачками: каждая пачка (записи + их история) — одна транзакция.
+# Строки уходят из живой таблицы без сигналов: DailyRevenue и PatientStats считают и архив.
+def archive_records(before, batch_size=1000, progress=None):
+    counts = {'CustomerRecord': 0, 'HistoryRecord': 0}
+    while True:
+        with transaction.atomic():
+            ids = list(archivable_records(before).select_for_update().order_by('pk')
+                       .values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            records = CustomerRecord.objects.filter(pk__in=ids)
+            history = HistoryRecord.objects.filter(payment_id__in=ids)
+            ArchivedCustomerRecord.objects.bulk_create(
+                [ArchivedCustomerRecord(**row) for row in records.values(*RECORD_FIELDS)])
+            archived_history = [ArchivedHistoryRecord(**row) for row in history.values(*HISTORY_FIELDS)]
+            ArchivedHistoryRecord.objects.bulk_create(archived_history)
+            with muted_signals():
+                history.delete()
+                records.delete()
+            # сигналы отключены, а списки и отчеты по живой таблице изменились — сбрасываем их кеш
+            bump_scopes('records')
+
+        counts['CustomerRecord'] += len(ids)
+        counts['HistoryRecord'] += len(archived_history)
+        if progress:
+            progress(counts)
+    return counts
+
+
+def include_archived(request):
+    return request.query_params.get('archived', '').lower() in ('1', 'true', 'yes')
+
+
+# Живые и архивные записи одной лентой от новых к старым. Архив может быть сколь угодно длинным, поэтому
+# лента идет страницами RecordCursorPagination: из каждой таблицы читается только окно страницы.
+# Возвращает записи страницы и ссылки next/previous для ответа.
+def merge_archived(request, records, archived, view=None):
+    paginator = RecordCursorPagination()
+    page = paginator.paginate_querysets([records, archived], request, view=view)
+    return page, {'next': paginator.get_next_link(), 'previous': paginator.get_previous_link()}
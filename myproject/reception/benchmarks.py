@@ -0,0 +1,259 @@
+import importlib
+import json
+import os
+import sys
+import time
+from base64 import b64encode
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import quote, urlencode
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from doctor.models import Appointment, DoctorSchedule
+from .eager import eager_loading_plan
+from .models import UserProfile, Department, Service, Doctor, Patient, CustomerRecord, ReportJob
+from .projection import values_projection
+from .seeding import seed_clinic
+
+
+# Бенчмарк эндпоинтов на сгенерированной клинике (в обычный прогон тестов не входит):
+#   python manage.py test reception.benchmarks
+#   BENCH_RECORD=1 python manage.py test reception.benchmarks  — записать новый baseline
+BASELINE_PATH = Path(__file__).with_name('benchmark_baseline.json')
+BENCH_VOLUMES = {
+    'doctors': int(os.environ.get('BENCH_DOCTORS', 30)),
+    'patients': int(os.environ.get('BENCH_PATIENTS', 20000)),
+    'records': int(os.environ.get('BENCH_RECORDS', 200000)),
+}
+TIME_TOLERANCE = float(os.environ.get('BENCH_TIME_TOLERANCE', 1.5))
+TIME_SLACK_MS = 50
+SIZE_TOLERANCE = 1.1
+LIST_ROWS = int(os.environ.get('BENCH_LIST_ROWS', 10000))
+
+# Маршрут -> путь; {record}, {patient} и т.д. подставляются из сгенерированных данных
+ROUTES = {
+    # doctor/urls.py
+    'schedule-list': '/ru/schedule/',
+    'schedule-detail': '/ru/schedule/{schedule}/',
+    'appointment-list': '/ru/appointment/',
+    'appointment-detail': '/ru/appointment/{appointment}/',
+    'schedule-template-list': '/ru/schedule_template/',
+    'schedule-exception-list': '/ru/schedule_exception/',
+    'occupancy': '/ru/occupancy/',
+    'doctor_availability': '/ru/availability/{doctor}/?start_date={today}&end_date={month_ahead}',
+    # crm_app/urls.py
+    'department-list': '/ru/department/',
+    'department-detail': '/ru/department/{department}/',
+    'service-list': '/ru/service/',
+    'service-detail': '/ru/service/{service}/',
+    'appointment_list': '/ru/records/',
+    'doctor_save': '/ru/doctor_create/{doctor}/',
+    'records_detail': '/ru/records/{record}/',
+    'history_patient': '/ru/records/{record}/history/',
+    'status_waiting': '/ru/records/{record}/history/waiting/',
+    'payment_history': '/ru/records/{record}/history/payment/',
+    'info_patient': '/ru/records/{patient}/history/payment/info',
+    'doctor_list': '/ru/doctors/',
+    'detailed_report': '/ru/doctors/{doctor}/',
+    'doctor_bonus': '/ru/doctors/{doctor}/bonus/',
+    'summary_clinic': '/ru/summary_clinic/',
+    'payroll': '/ru/payroll/',
+    'doctor_schedule': '/ru/doctors/schedule/',
+    'price_list': '/ru/price_list/',
+    # reception/urls.py
+    'customer_record_list': '/ru/customer_record/',
+    'customer_record_deep_page': '/ru/customer_record/?cursor={deep_cursor}',
+    'customer_record_search': '/ru/customer_record/?search=Айбек',
+    'customer_record_detail': '/ru/customer_record/{record}/',
+    'api-root': '/ru/',
+    'doctor-list': '/ru/doctor/',
+    'doctor-detail': '/ru/doctor/{doctor}/',
+    'calendar-list': '/ru/calendar/',
+    'calendar-detail': '/ru/calendar/{record}/',
+    'calendar_feed': '/ru/calendar_feed/?doctor={doctor}&from={month_ago}&to={today}',
+    'about_patient': '/ru/about_patient/',
+    'about_patient_update': '/ru/about_patient/{patient}/',
+    'Patient_history': '/ru/history/{patient}/records/',
+    'patient-visited-records': '/ru/patient/{patient}/visited-records/',
+    'payment': '/ru/payment/{patient}/patient/',
+    'info_patient_list': '/ru/info_patient/',
+    'patient_search': '/ru/patient_search/?q=айб',
+    'patient_search_phone': '/ru/patient_search/?q=0700',
+    'price_detail': '/ru/price_list/{service}/',
+    'detailed_record': '/ru/detailed_record/',
+    'doctor_record': '/ru/report_doctor/',
+    'summary_report': '/ru/summary_report/',
+    'revenue_timeseries': '/ru/revenue_timeseries/?start_date={month_ago}&end_date={today}',
+    'report_cache_stats': '/ru/report_cache/stats/',
+    'report_job_detail': '/ru/report_jobs/{job}/',
+    'report_job_result': '/ru/report_jobs/{job}/result/',
+}
+
+# Вьюхи без GET (регистрация, вход, создание) и маршруты, перекрытые crm_app
+SKIPPED_VIEWS = {
+    'RegisterView', 'CustomLoginView', 'CustomAdminLoginView', 'LogoutView', 'PatientCreateApView',
+    'DoctorCreateApiView', 'CustomerRecordCreateAPIView', 'ReportJobCreateAPIView', 'ReceptionRegisterView',
+    'DoctorRegisterView', 'CustomerRecordRetrieveUpdateDestroyAPIView', 'PriceListAPIView',
+    'ScheduleGenerateAPIView',
+}
+
+
+def view_name(callback):
+    view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    return view_class.__name__ if view_class else callback.__name__
+
+
+def app_view_names(*urlconfs):
+    names = set()
+    patterns = [pattern for urlconf in urlconfs for pattern in importlib.import_module(urlconf).urlpatterns]
+    while patterns:
+        pattern = patterns.pop()
+        if isinstance(pattern, URLResolver):
+            patterns.extend(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            names.add(view_name(pattern.callback))
+    return names
+
+
+def record_cursor(record):
+    position = f'{record["visit_at"].isoformat()}|{record["id"]}'
+    return quote(b64encode(urlencode({'p': position}).encode()).decode())
+
+
+def benchmark_urls():
+    today = timezone.localdate()
+    # курсор почти в самом начале истории — глубокая страница должна стоить как первая
+    oldest = CustomerRecord.objects.order_by('visit_at', 'id').values('visit_at', 'id')[100:101]
+    params = {
+        'record': CustomerRecord.objects.order_by('-pk').values_list('pk', flat=True).first(),
+        'patient': Patient.objects.filter(customer_record__isnull=False).values_list('pk', flat=True).first(),
+        'doctor': Doctor.objects.values_list('pk', flat=True).first(),
+        'department': Department.objects.values_list('pk', flat=True).first(),
+        'service': Service.objects.values_list('pk', flat=True).first(),
+        'schedule': DoctorSchedule.objects.values_list('pk', flat=True).first(),
+        'appointment': Appointment.objects.values_list('pk', flat=True).first(),
+        'job': ReportJob.objects.values_list('pk', flat=True).first(),
+        'today': today,
+        'month_ago': today - timedelta(days=30),
+        'month_ahead': today + timedelta(days=30),
+        'deep_cursor': record_cursor(oldest[0]) if oldest else '',
+    }
+    return {name: path.format(**params) for name, path in ROUTES.items()}
+
+
+def measure(client, url):
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(url)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        elapsed = time.perf_counter() - start
+    return {
+        'status': response.status_code,
+        'queries': len(queries),
+        'time_ms': round(elapsed * 1000, 1),
+        'bytes': len(content),
+    }
+
+
+def benchmark_client():
+    user = UserProfile.objects.filter(is_superuser=True).first() or UserProfile.objects.create_superuser(
+        email='bench@example.com', password='bench')
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def create_benchmark_job():
+    return ReportJob.objects.create(kind='summary', status='done', result={}, finished_at=timezone.now())
+
+
+def load_baseline():
+    if not BASELINE_PATH.exists():
+        return {'volumes': {}, 'routes': {}}
+    return json.loads(BASELINE_PATH.read_text())
+
+
+def budget_errors(name, result, budget, compare_volume=True):
+    errors = []
+    if result['status'] >= 400:
+        errors.append(f'{name}: status {result["status"]}')
+    if not budget:
+        return errors + [f'{name}: no baseline']
+    if result['queries'] > budget['queries']:
+        errors.append(f'{name}: {result["queries"]} queries > {budget["queries"]}')
+    if compare_volume:
+        if result['time_ms'] > budget['time_ms'] * TIME_TOLERANCE + TIME_SLACK_MS:
+            errors.append(f'{name}: {result["time_ms"]} ms > {budget["time_ms"]} ms')
+        if result['bytes'] > budget['bytes'] * SIZE_TOLERANCE:
+            errors.append(f'{name}: {result["bytes"]} bytes > {budget["bytes"]} bytes')
+    return errors
+
+
+class EndpointBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        started = time.perf_counter()
+        cls.volumes = seed_clinic(doctors=BENCH_VOLUMES['doctors'], patients=BENCH_VOLUMES['patients'],
+                                  records=BENCH_VOLUMES['records'])
+        create_benchmark_job()
+        sys.stderr.write(f'\nseeded {cls.volumes} in {time.perf_counter() - started:.1f}s\n')
+
+    def test_routes(self):
+        client = benchmark_client()
+        baseline = load_baseline()
+        same_volume = baseline['volumes'] == BENCH_VOLUMES
+
+        results = {}
+        errors = []
+        sys.stderr.write(f'\n{"route":<28}{"status":>7}{"queries":>9}{"ms":>10}{"bytes":>12}\n')
+        for name, url in benchmark_urls().items():
+            result = measure(client, url)
+            results[name] = result
+            sys.stderr.write(f'{name:<28}{result["status"]:>7}{result["queries"]:>9}{result["time_ms"]:>10}'
+                             f'{result["bytes"]:>12}\n')
+            errors += budget_errors(name, result, baseline['routes'].get(name), same_volume)
+
+        if os.environ.get('BENCH_RECORD'):
+            routes = {name: {key: value for key, value in result.items() if key != 'status'}
+                      for name, result in results.items()}
+            BASELINE_PATH.write_text(json.dumps({'volumes': BENCH_VOLUMES, 'routes': routes}, indent=2,
+                                                sort_keys=True) + '\n')
+            return
+        self.assertFalse(errors, '\n'.join(errors))
+
+
+# Пропускная способность values()-проекции против обычного сериализатора на списке из LIST_ROWS записей
+class SerializerThroughputBenchmark(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_clinic(doctors=10, patients=1000, records=LIST_ROWS)
+
+    def timed(self, serialize):
+        start = time.perf_counter()
+        data = serialize()
+        return data, time.perf_counter() - start
+
+    def test_projection_throughput(self):
+        from crm_app.serializers import AppointmentAdminSerializer
+        from .serializers import CustomerRecordListSerializer, CalendarSerializer
+
+        sys.stderr.write(f'\n{"serializer":<32}{"rows/s":>12}{"values rows/s":>15}{"speedup":>9}\n')
+        for serializer_class in [CustomerRecordListSerializer, AppointmentAdminSerializer, CalendarSerializer]:
+            # для обычного пути — тот же select_related/only(), что и во вьюхах
+            queryset = eager_loading_plan(serializer_class, CustomerRecord).apply(CustomerRecord.objects.all())
+            expected, slow = self.timed(lambda: serializer_class(queryset, many=True).data)
+            projection = values_projection(serializer_class(), CustomerRecord)
+            data, fast = self.timed(lambda: projection.serialize(queryset))
+
+            self.assertEqual(data, expected)
+            self.assertLess(fast, slow)
+            sys.stderr.write(f'{serializer_class.__name__:<32}{LIST_ROWS / slow:>12.0f}{LIST_ROWS / fast:>15.0f}'
+                             f'{slow / fast:>9.1f}\n')
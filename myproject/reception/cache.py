@@ -0,0 +1,89 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+REPORT_CACHE_TIMEOUT = getattr(settings, 'REPORT_CACHE_TIMEOUT', 300)
+REPORT_CACHE_PREFIX = 'report_cache'
+
+
+def _version_key(scope):
+    return f'{REPORT_CACHE_PREFIX}:version:{scope}'
+
+
+def scope_version(scope):
+    # Начальное значение — время, чтобы после вытеснения ключа версия не повторилась
+    return cache.get_or_set(_version_key(scope), time.time_ns(), None)
+
+
+def _bump(scopes):
+    for scope in scopes:
+        try:
+            cache.incr(_version_key(scope))
+        except ValueError:
+            cache.set(_version_key(scope), time.time_ns(), None)
+
+
+# Инвалидация: новая версия области делает все старые ключи недостижимыми.
+# Повторяем после коммита, чтобы не закешировать данные незакоммиченной транзакции.
+def bump_scopes(*scopes):
+    _bump(scopes)
+    transaction.on_commit(lambda: _bump(scopes))
+
+
+# Счетчики попаданий приблизительные: на FileBasedCache incr — это чтение и запись без блокировки,
+# и параллельные запросы могут потерять часть увеличений. Для точных значений нужен бэкенд
+# с атомарным incr (Redis, Memcached).
+def _count(name):
+    key = f'{REPORT_CACHE_PREFIX}:{name}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def cache_stats():
+    return {
+        'hits': cache.get(f'{REPORT_CACHE_PREFIX}:hits', 0),
+        'misses': cache.get(f'{REPORT_CACHE_PREFIX}:misses', 0),
+    }
+
+
+def normalized_params(params):
+    items = []
+    for name in sorted(params):
+        values = sorted(value.strip() for value in params.getlist(name) if value.strip())
+        if values:
+            items.append(f'{name}={",".join(values)}')
+    return '&'.join(items)
+
+
+def report_cache_key(request, scopes):
+    versions = ':'.join(f'{scope}{scope_version(scope)}' for scope in scopes)
+    params = hashlib.md5(normalized_params(request.query_params).encode()).hexdigest()
+    return f'{REPORT_CACHE_PREFIX}:{request.path}:{request.accepted_renderer.format}:{versions}:{params}'
+
+
+# Кеширует ответ отчета (декоратор для get/list); ключ — путь, версии областей и фильтры
+def cached_report(*scopes, timeout=REPORT_CACHE_TIMEOUT):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            key = report_cache_key(request, scopes)
+            data = cache.get(key)
+            if data is not None:
+                _count('hits')
+                return Response(data)
+
+            _count('misses')
+            response = method(self, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
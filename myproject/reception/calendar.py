@@ -0,0 +1,53 @@
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Count, Max
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .cache import scope_version
+from .models import CustomerRecord
+
+
+CALENDAR_MAX_DAYS = 62
+CALENDAR_SCOPES = ('services', 'patients')
+
+
+# Окно календаря: ?doctor= или ?department= и ?from=&to= (YYYY-MM-DD)
+def calendar_window(params):
+    owner = {}
+    for name in ('doctor', 'department'):
+        value = params.get(name)
+        if value:
+            if not value.isdigit():
+                raise ValidationError({name: 'Ожидается id.'})
+            owner[f'{name}_id'] = int(value)
+    if len(owner) != 1:
+        raise ValidationError({'detail': 'Укажите doctor или department.'})
+
+    window = []
+    for name in ('from', 'to'):
+        try:
+            value = parse_date(params.get(name) or '')
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValidationError({name: 'Неверный формат даты, используйте YYYY-MM-DD.'})
+        window.append(value)
+    start, end = window
+    if start > end or end - start >= timedelta(days=CALENDAR_MAX_DAYS):
+        raise ValidationError({'detail': f'Окно from..to — не больше {CALENDAR_MAX_DAYS} дней.'})
+    return CustomerRecord.objects.filter(visit_date__range=(start, end), **owner)
+
+
+# Версия окна: один агрегат по записям (created_date — auto_now, количество ловит удаления и переносы
+# из окна) и версии областей кеша: переименование услуги или пациента меняет service_name/patient_name
+# в ленте, не трогая сами записи. Last-Modified не отдаем: удаление или перенос записи из окна не двигают
+# Max(created_date), и If-Modified-Since вернул бы 304 для измененного окна.
+def calendar_version(records):
+    state = records.aggregate(count=Count('id'), modified=Max('created_date'))
+    modified = state['modified']
+    parts = [state['count'], modified.isoformat() if modified else '']
+    parts += [scope_version(scope) for scope in CALENDAR_SCOPES]
+    digest = hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .cache import bump_scopes
+from .models import Patient
+from .normalization import digits
+from .patient_stats import reconcile_patient_stats
+
+
+# Повторный пациент на регистрации: тот же телефон (только цифры) и дата рождения.
+# Вызывается внутри транзакции создания записи; строка пациента блокируется до ее конца.
+# Два одновременных первых визита одного человека все же могут создать два Patient —
+# их сольет merge_duplicate_patients.
+def find_or_create_patient(data):
+    phone_digits = digits(data.get('phone_number'))
+    if phone_digits and data.get('date_birth'):
+        patient = (Patient.objects.select_for_update()
+                   .filter(phone_digits=phone_digits, date_birth=data['date_birth'])
+                   .order_by('pk').first())
+        if patient is not None:
+            return patient
+    return Patient.objects.create(**data)
+
+
+def duplicate_groups():
+    return (Patient.objects.exclude(phone_digits='')
+            .values('phone_digits', 'date_birth')
+            .annotate(count=Count('id'), keep=Min('id'))
+            .filter(count__gt=1)
+            .order_by('keep'))
+
+
+# Все ссылки на пациента: записи, история, архив, приемы врача (PatientStats — one-to-one, пересчитывается)
+def _patient_relations():
+    return [relation for relation in Patient._meta.related_objects if relation.one_to_many]
+
+
+# update() сигналов не вызывает: отчеты по записям и расписания (приемы врача) сбрасываются здесь,
+# еще раз — после коммита
+MERGE_SCOPES = ('records', 'schedules')
+
+
+def merge_patients(keep, duplicates):
+    duplicate_ids = [patient.pk for patient in duplicates]
+    for relation in _patient_relations():
+        manager = relation.related_model._base_manager
+        manager.filter(**{f'{relation.field.name}__in': duplicate_ids}).update(**{relation.field.name: keep})
+    if keep.user_id is None:
+        donor = next((patient for patient in duplicates if patient.user_id), None)
+        if donor is not None:
+            keep.user_id, donor.user_id = donor.user_id, None
+            Patient.objects.filter(pk=donor.pk).update(user=None)
+            Patient.objects.filter(pk=keep.pk).update(user=keep.user_id)
+    Patient.objects.filter(pk__in=duplicate_ids).delete()
+    bump_scopes(*MERGE_SCOPES)
+
+
+# Сливает дубликаты пачками групп (группа = телефон + дата рождения); остается самый старый Patient.
+# update() не вызывает сигналы, поэтому счетчики оставшихся пациентов пересчитываются в той же транзакции.
+def merge_duplicate_patients(batch_size=500, progress=None):
+    counts = {'groups': 0, 'merged': 0}
+    while True:
+        groups = list(duplicate_groups()[:batch_size])
+        if not groups:
+            break
+        with transaction.atomic():
+            keep_ids = []
+            for group in groups:
+                patients = list(Patient.objects.select_for_update()
+                                .filter(phone_digits=group['phone_digits'], date_birth=group['date_birth'])
+                                .order_by('pk'))
+                keep, duplicates = patients[0], patients[1:]
+                merge_patients(keep, duplicates)
+                keep_ids.append(keep.pk)
+                counts['merged'] += len(duplicates)
+            reconcile_patient_stats(patient_ids=keep_ids)
+        counts['groups'] += len(groups)
+        if progress:
+            progress(counts)
+    return counts
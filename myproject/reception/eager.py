@@ -0,0 +1,112 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+class EagerLoadingPlan:
+    def __init__(self):
+        self.select_related = set()
+        self.prefetch_related = set()
+        self.only = set()
+        # only() безопасен, только если все поля сериализатора — обычные поля модели
+        self.can_defer = True
+
+    def apply(self, queryset, defer=True, also=()):
+        can_defer = defer and self.can_defer and queryset.query.select_related is False
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch_related))
+        if can_defer and self.only:
+            queryset = queryset.only(*sorted(self.only | set(also)))
+        return queryset
+
+
+def _nested_serializer(field):
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+def _walk(serializer, model, prefix, plan, in_prefetch):
+    if not in_prefetch:
+        plan.only.add(prefix + model._meta.pk.name)
+
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        nested = _nested_serializer(field)
+        if isinstance(field, serializers.SerializerMethodField):
+            plan.can_defer = False
+            continue
+        if field.source == '*':
+            if nested is not None:
+                _walk(nested, model, prefix, plan, in_prefetch)
+            else:
+                plan.can_defer = False
+            continue
+
+        current_model, path, to_many = model, prefix, in_prefetch
+        relation = None
+        for index, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current_model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # метод или свойство модели — какие поля ему нужны, неизвестно
+                plan.can_defer = False
+                relation = None
+                break
+
+            if not model_field.is_relation:
+                if not to_many:
+                    plan.only.add(path + attr)
+                if index < len(field.source_attrs) - 1:
+                    plan.can_defer = False
+                break
+
+            is_last = index == len(field.source_attrs) - 1
+            if model_field.concrete and not to_many:
+                plan.only.add(path + attr)
+            if is_last and isinstance(field, serializers.PrimaryKeyRelatedField):
+                # pk берется из самого FK, join не нужен
+                break
+
+            to_many = to_many or model_field.one_to_many or model_field.many_to_many
+            path = f'{path}{attr}__'
+            (plan.prefetch_related if to_many else plan.select_related).add(path[:-2])
+            current_model = model_field.related_model
+            relation = model_field if is_last else None
+
+        if relation is None:
+            continue
+        if nested is not None:
+            _walk(nested, current_model, path, plan, to_many)
+        elif not isinstance(field, (serializers.ManyRelatedField, serializers.PrimaryKeyRelatedField)):
+            # StringRelatedField и т.п. используют произвольные поля связанной модели
+            plan.can_defer = False
+
+
+_plans = {}
+
+
+def eager_loading_plan(serializer_class, model):
+    key = (serializer_class, model)
+    if key not in _plans:
+        plan = EagerLoadingPlan()
+        _walk(serializer_class(), model, '', plan, False)
+        _plans[key] = plan
+    return _plans[key]
+
+
+# Подбирает select_related/prefetch_related/only() по вложенным полям сериализатора.
+# only() применяется только для чтения: при сохранении отложенные поля (auto_now) не записываются.
+class EagerLoadingMixin:
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        plan = eager_loading_plan(self.get_serializer_class(), queryset.model)
+        # поля сортировки курсорной пагинации тоже нужны, иначе позиция читается доп. запросом
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        return plan.apply(queryset, defer=self.request.method in SAFE_METHODS,
+                          also=[field.lstrip('-') for field in ordering])
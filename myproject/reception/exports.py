@@ -0,0 +1,163 @@
+import csv
+import io
+import tempfile
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+EXPORT_CHUNK_SIZE = 2000
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _data_rows(data):
+    if isinstance(data, dict):
+        return [[key, value] for key, value in data.items()]
+    if isinstance(data, list):
+        return [[item] for item in data]
+    return [[data]]
+
+
+# Рендереры нужны, чтобы DRF принимал ?format=csv/xlsx; сами выгрузки
+# отдаются потоком из ReportExportMixin, а рендереры — только для ошибок
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(_data_rows(data))
+        return buffer.getvalue()
+
+
+class XLSXRenderer(BaseRenderer):
+    media_type = XLSX_MEDIA_TYPE
+    format = 'xlsx'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in _data_rows(data):
+            sheet.append([str(value) for value in row])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_response(rows, filename):
+    writer = csv.writer(Echo())
+
+    def stream():
+        yield '\ufeff'  # BOM, чтобы Excel открыл кириллицу в UTF-8
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def xlsx_response(rows, filename):
+    from openpyxl import Workbook
+
+    # write_only пишет строки во временные файлы, а не держит лист в памяти
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(filename[:31])
+    for row in rows:
+        sheet.append(row)
+    file = tempfile.TemporaryFile()
+    workbook.save(file)
+    file.seek(0)
+    return FileResponse(file, as_attachment=True, filename=f'{filename}.xlsx', content_type=XLSX_MEDIA_TYPE)
+
+
+EXPORT_RESPONSES = {
+    'csv': csv_response,
+    'xlsx': xlsx_response,
+}
+
+
+def _format_date(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def detailed_report_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    yield ['id', 'visit_at', 'doctor', 'department', 'patient', 'service', 'payment_type', 'price',
+           'discount', 'bonus']
+
+    count = total_price = total_discount = cash_sum = card_sum = doctor_income = 0
+    rows = queryset.values_list('id', 'visit_at', 'doctor_id', 'department_id', 'patient__full_name',
+                                'service__name', 'payment_type', 'price', 'discount', 'doctor__bonus')
+    for pk, visit_at, doctor, department, patient, service, payment_type, price, discount, bonus in \
+            rows.iterator(chunk_size=chunk_size):
+        price = price or 0
+        count += 1
+        total_price += price
+        total_discount += discount or 0
+        if payment_type == 'cash':
+            cash_sum += price
+        elif payment_type == 'card':
+            card_sum += price
+        doctor_income += price * (bonus or 0) / 100.0
+        yield [pk, _format_date(visit_at), doctor, department, patient, service, payment_type, price,
+               discount, bonus]
+
+    yield []
+    yield ['total_count', 'total_price', 'total_discount', 'cash_sum', 'card_sum', 'total_doctor_income']
+    yield [count, total_price, total_discount, cash_sum, card_sum, round(doctor_income, 2)]
+
+
+def doctor_report_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    yield ['doctor', 'id', 'visit_at', 'price', 'doctor_income']
+
+    doctor_income = 0
+    rows = queryset.values_list('doctor__first_name', 'id', 'visit_at', 'price', 'doctor__bonus')
+    for doctor, pk, visit_at, price, bonus in rows.iterator(chunk_size=chunk_size):
+        income = (price or 0) * (bonus or 0) / 100.0
+        doctor_income += income
+        yield [doctor, pk, _format_date(visit_at), price, round(income, 2)]
+
+    yield []
+    yield ['total_doctor_income']
+    yield [round(doctor_income, 2)]
+
+
+EXPORT_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVRenderer, XLSXRenderer]
+
+
+def export_format(request):
+    export_format = getattr(request.accepted_renderer, 'format', None)
+    return export_format if export_format in EXPORT_RESPONSES else None
+
+
+def payroll_rows(payroll, totals):
+    columns = ['doctor', 'first_name', 'last_name', 'bonus_percent', 'appointments', 'gross', 'discounted', 'bonus']
+    yield columns
+    for row in payroll:
+        yield [row[column] for column in columns]
+    yield ['total', '', '', '', totals['appointments'], totals['gross'], totals['discounted'], totals['bonus']]
+
+
+# ?format=csv / ?format=xlsx: потоковая выгрузка отчета вместо JSON
+class ReportExportMixin:
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    export_filename = 'report'
+    export_rows = None
+
+    def get(self, request, *args, **kwargs):
+        if export_format(request):
+            queryset = self.filter_queryset(self.get_queryset())
+            return EXPORT_RESPONSES[export_format(request)](self.export_rows(queryset), self.export_filename)
+        return super().get(request, *args, **kwargs)
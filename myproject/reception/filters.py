@@ -1,7 +1,9 @@
 import django_filters
 from django import forms
 from django_filters import FilterSet
+from rest_framework.filters import BaseFilterBackend
 from .models import *
+from .search import matching_patients
 
 
 # class DetailedRecordListFilter(django_filters.FilterSet):
@@ -23,8 +25,7 @@ from .models import *
 
 class CustomerRecordListFilter(FilterSet):
     created_date = django_filters.DateFilter(
-        field_name='created_date',
-        lookup_expr='date',
+        field_name='visit_date',
         widget=forms.DateInput(attrs={
             'type': 'date'
         })
@@ -32,7 +33,7 @@ class CustomerRecordListFilter(FilterSet):
 
     class Meta:
         model = CustomerRecord
-        fields = ['created_date', 'doctor']
+        fields = ['created_date', 'doctor', 'department']
 
 
 class DoctorListFilter(FilterSet):
@@ -41,3 +42,48 @@ class DoctorListFilter(FilterSet):
         fields = {
             'department': ['exact'],
         }
+
+
+# Сводка по DailyRevenue должна понимать все фильтры списка записей (CustomerRecordListFilter)
+class DailyRevenueFilter(FilterSet):
+    created_date = django_filters.DateFilter(field_name='day')
+    start_date = django_filters.DateFilter(field_name='day', lookup_expr='gte')
+    end_date = django_filters.DateFilter(field_name='day', lookup_expr='lte')
+
+    class Meta:
+        model = DailyRevenue
+        fields = ['created_date', 'start_date', 'end_date', 'doctor', 'department']
+
+
+class ReportPeriodFilter(FilterSet):
+    start_date = django_filters.DateFilter(field_name='visit_date', lookup_expr='gte')
+    end_date = django_filters.DateFilter(field_name='visit_date', lookup_expr='lte')
+
+    class Meta:
+        model = CustomerRecord
+        fields = ['start_date', 'end_date', 'doctor', 'department', 'payment_type']
+
+
+# Фильтры фоновых отчетов по виду задачи — те же, что применяет reception/jobs.py
+REPORT_JOB_FILTERS = {
+    'detailed': ReportPeriodFilter,
+    'doctor': ReportPeriodFilter,
+    'summary': DailyRevenueFilter,
+}
+
+
+class RecordDimensionFilter(FilterSet):
+    class Meta:
+        model = CustomerRecord
+        fields = ['doctor', 'department', 'payment_type']
+
+
+# ?search= по пациенту записи через поисковый индекс (имя или телефон, по началу слова)
+class PatientSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return queryset.filter(patient__in=matching_patients(query).values('id'))
@@ -0,0 +1,105 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .filters import REPORT_JOB_FILTERS
+from .models import CustomerRecord, DailyRevenue, ReportJob
+from .reports import report_totals, summary_totals, record_doctor_income
+from .serializers import DetailedReportSerializer, DoctorReportSerializers, SummaryReportSerializer
+
+
+logger = logging.getLogger(__name__)
+
+REPORT_JOB_WORKERS = getattr(settings, 'REPORT_JOB_WORKERS', 2)
+REPORT_JOB_CHUNK_SIZE = 2000
+STALE_JOB_ERROR = 'Задача прервана перезапуском сервера, запросите отчет заново.'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix='report-job')
+    return _executor
+
+
+def _filtered(kind, params, queryset):
+    filterset = REPORT_JOB_FILTERS[kind](params, queryset=queryset)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def build_detailed_report(params):
+    queryset = _filtered('detailed', params, CustomerRecord.objects.select_related('doctor', 'patient', 'service'))
+    totals = report_totals(queryset)
+    records = DetailedReportSerializer(queryset.iterator(chunk_size=REPORT_JOB_CHUNK_SIZE), many=True).data
+    return {
+        'total_count': totals['total_count'],
+        'total_price': totals['total_price'],
+        'total_discount': totals['total_discount'],
+        'cash_sum': totals['cash_sum'],
+        'card_sum': totals['card_sum'],
+        'total_doctor_income': totals['total_doctor_income'],
+        'records': records,
+    }
+
+
+def build_doctor_report(params):
+    queryset = _filtered('doctor', params, CustomerRecord.objects.select_related('doctor'))
+    records = DoctorReportSerializers(queryset.iterator(chunk_size=REPORT_JOB_CHUNK_SIZE), many=True).data
+    return {
+        'total_doctor_income': record_doctor_income(queryset),
+        'records': records,
+    }
+
+
+def build_summary_report(params):
+    rollup = _filtered('summary', params, DailyRevenue.objects.filter(records='был в приеме'))
+    return SummaryReportSerializer(summary_totals(rollup)).data
+
+
+REPORT_BUILDERS = {
+    'detailed': build_detailed_report,
+    'doctor': build_doctor_report,
+    'summary': build_summary_report,
+}
+
+
+def run_report_job(job_id):
+    if not ReportJob.objects.filter(pk=job_id, status='pending').update(status='running',
+                                                                        started_at=timezone.now()):
+        return
+    job = ReportJob.objects.get(pk=job_id)
+    try:
+        result = REPORT_BUILDERS[job.kind](job.params)
+    except Exception as exc:
+        logger.exception('Report job %s failed', job_id)
+        ReportJob.objects.filter(pk=job_id).update(status='failed', error=str(exc), finished_at=timezone.now())
+    else:
+        ReportJob.objects.filter(pk=job_id).update(status='done', result=result, finished_at=timezone.now())
+
+
+def _run_in_worker(job_id):
+    try:
+        run_report_job(job_id)
+    finally:
+        connection.close()
+
+
+# Пул живет в процессе сервера: после перезапуска незавершенные задачи уже никто не выполнит.
+# Вызывается при старте (команда fail_stale_report_jobs) — такие задачи помечаются ошибкой, отчет нужно запросить заново.
+def fail_stale_report_jobs():
+    return ReportJob.objects.filter(status__in=('pending', 'running')).update(
+        status='failed', error=STALE_JOB_ERROR, finished_at=timezone.now())
+
+
+# Задача попадает в пул только после коммита, иначе поток может не увидеть запись
+def submit_report_job(job):
+    transaction.on_commit(lambda: get_executor().submit(_run_in_worker, job.pk))
+    return job
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reception.archive import archivable_records, archive_cutoff, archive_records
+
+
+class Command(BaseCommand):
+    help = ('Переносит закрытые визиты (был в приеме / отменен) старше заданного срока вместе с их историей '
+            'в архивные таблицы. Сводка DailyRevenue и счетчики пациентов при этом не меняются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.RECORD_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать записи для архива')
+
+    def handle(self, *args, **options):
+        if options['older_than_days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--older-than-days и --batch-size должны быть больше нуля')
+
+        before = archive_cutoff(options['older_than_days'])
+        if options['dry_run']:
+            self.stdout.write(f'К переносу: {archivable_records(before).count()} записей до {before}')
+            return
+
+        reported = [0]
+
+        def progress(counts):
+            if counts['CustomerRecord'] - reported[0] >= 100000:
+                reported[0] = counts['CustomerRecord']
+                self.stdout.write(f'CustomerRecord: {counts["CustomerRecord"]}, '
+                                  f'HistoryRecord: {counts["HistoryRecord"]}')
+
+        counts = archive_records(before, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(
+            f'В архив перенесено {counts["CustomerRecord"]} записей и {counts["HistoryRecord"]} строк истории '
+            f'(визиты до {before})'))
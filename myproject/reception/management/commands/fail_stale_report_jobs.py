@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from reception.jobs import fail_stale_report_jobs
+
+
+class Command(BaseCommand):
+    help = ('Помечает ошибкой фоновые отчеты, оставшиеся в очереди или в работе после перезапуска сервера '
+            '(запускать при старте, до gunicorn)')
+
+    def handle(self, *args, **options):
+        count = fail_stale_report_jobs()
+        self.stdout.write(self.style.SUCCESS(f'Прерванных задач: {count}'))
@@ -0,0 +1,57 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from reception.cache import bump_scopes
+from reception.seeding import seed_clinic
+
+
+class Command(BaseCommand):
+    help = ('Генерирует синтетическую клинику для нагрузочного тестирования: отделения, услуги, врачей, '
+            'регистраторов, пациентов, записи, историю, расписание и приемы (без реальных данных пациентов)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=30)
+        parser.add_argument('--receptions', type=int, default=5)
+        parser.add_argument('--patients', type=int, default=20000)
+        parser.add_argument('--records', type=int, default=200000)
+        parser.add_argument('--history-ratio', type=float, default=0.5,
+                            help='Доля записей, для которых создается HistoryRecord')
+        parser.add_argument('--schedule-days', type=int, default=30,
+                            help='На сколько дней вперед от --end-date создавать расписание и приемы')
+        parser.add_argument('--start-date', type=date.fromisoformat, help='YYYY-MM-DD, по умолчанию год назад')
+        parser.add_argument('--end-date', type=date.fromisoformat, help='YYYY-MM-DD, по умолчанию сегодня')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['start_date'] and options['end_date'] and options['start_date'] > options['end_date']:
+            raise CommandError('--start-date позже --end-date')
+        if options['doctors'] < 1 or options['receptions'] < 1 or (options['records'] and options['patients'] < 1):
+            raise CommandError('Нужен хотя бы один врач, регистратор и пациент')
+
+        started = time.monotonic()
+        last_report = {}
+
+        def progress(name, count):
+            if count - last_report.get(name, 0) >= 100000:
+                last_report[name] = count
+                self.stdout.write(f'{name}: {count} ({time.monotonic() - started:.0f} с)')
+
+        try:
+            counts = seed_clinic(
+                doctors=options['doctors'], receptions=options['receptions'], patients=options['patients'],
+                records=options['records'], history_ratio=options['history_ratio'],
+                schedule_days=options['schedule_days'], start_date=options['start_date'],
+                end_date=options['end_date'], seed=options['seed'], batch_size=options['batch_size'],
+                progress=progress,
+            )
+        except IntegrityError:
+            raise CommandError(f'Данные с --seed {options["seed"]} уже сгенерированы, укажите другой seed')
+        bump_scopes('records', 'doctors', 'services')
+
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Готово за {time.monotonic() - started:.1f} с'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from reception.dedupe import duplicate_groups, merge_duplicate_patients
+
+
+class Command(BaseCommand):
+    help = ('Сливает пациентов с одинаковым телефоном и датой рождения в самого старого: записи, история, '
+            'архив и приемы переносятся, счетчики PatientStats пересчитываются')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Групп дубликатов на транзакцию')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать дубликаты')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            groups = list(duplicate_groups())
+            extra = sum(group['count'] - 1 for group in groups)
+            self.stdout.write(f'Групп дубликатов: {len(groups)}, лишних пациентов: {extra}')
+            return
+
+        def progress(counts):
+            self.stdout.write(f'Групп: {counts["groups"]}, слито пациентов: {counts["merged"]}')
+
+        counts = merge_duplicate_patients(batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Слито {counts["merged"]} пациентов в {counts["groups"]} групп'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from reception.cache import bump_scopes
+from reception.rollups import rebuild_daily_revenue
+
+
+class Command(BaseCommand):
+    help = ('Полностью пересобирает таблицу DailyRevenue из CustomerRecord '
+            '(нужно после queryset.update()/bulk_create, которые не вызывают сигналы)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_revenue(batch_size=options['batch_size'])
+        bump_scopes('records')
+        self.stdout.write(self.style.SUCCESS(f'DailyRevenue пересобрана: {count} строк'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from reception.patient_stats import reconcile_patient_stats
+
+
+class Command(BaseCommand):
+    help = ('Сверяет PatientStats с агрегатами по CustomerRecord и HistoryRecord и исправляет расхождения '
+            '(нужно после queryset.update()/bulk_create, которые не вызывают сигналы)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        mismatched = reconcile_patient_stats(batch_size=options['batch_size'], repair=not options['dry_run'])
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('PatientStats совпадает с записями'))
+            return
+        shown = ', '.join(str(pk) for pk in mismatched[:20]) + (' ...' if len(mismatched) > 20 else '')
+        action = 'найдены' if options['dry_run'] else 'исправлены'
+        self.stdout.write(self.style.WARNING(f'Расхождения {action} у {len(mismatched)} пациентов: {shown}'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0006_remove_historyrecord_departament_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('payment_type', models.CharField(blank=True, choices=[('cash', 'Наличные'), ('card', 'Карта')], max_length=10, null=True)),
+                ('records', models.CharField(choices=[('был в приеме', 'был в приеме'), ('в ожидании', 'в ожидании'), ('отменен', 'отменен')], default='был в приеме', max_length=16)),
+                ('count', models.IntegerField(default=0)),
+                ('gross', models.BigIntegerField(default=0)),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='reception.department')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='reception.doctor')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='reception.service')),
+            ],
+            options={
+                'unique_together': {('day', 'doctor', 'department', 'service', 'payment_type', 'records')},
+            },
+        ),
+    ]
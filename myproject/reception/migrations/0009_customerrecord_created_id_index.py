@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0008_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['created_date', 'id'], name='customerrecord_created_id'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0009_customerrecord_created_id_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['records', 'created_date'], name='customerrecord_records_date'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['payment_type', 'created_date'], name='customerrecord_payment_date'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['doctor', 'created_date'], name='customerrecord_doctor_date'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['patient', 'created_date'], name='customerrecord_patient_date'),
+        ),
+        migrations.AddIndex(
+            model_name='historyrecord',
+            index=models.Index(fields=['patient', 'record'], name='historyrecord_patient_record'),
+        ),
+        migrations.AddIndex(
+            model_name='historyrecord',
+            index=models.Index(fields=['doctor', 'date'], name='historyrecord_doctor_date'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+from zoneinfo import ZoneInfo
+
+import django.utils.timezone
+import reception.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import TruncDate
+
+
+# Время визита неизвестно точнее, чем created_date, поэтому берем его (одним UPDATE на поле)
+def backfill_visit(apps, schema_editor):
+    CustomerRecord = apps.get_model('reception', 'CustomerRecord')
+    records = CustomerRecord.objects.using(schema_editor.connection.alias)
+    records.update(visit_at=F('created_date'))
+    records.update(visit_date=TruncDate('created_date', tzinfo=ZoneInfo(settings.TIME_ZONE)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0010_report_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customerrecord',
+            name='customerrecord_created_id',
+        ),
+        migrations.RemoveIndex(
+            model_name='customerrecord',
+            name='customerrecord_records_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='customerrecord',
+            name='customerrecord_payment_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='customerrecord',
+            name='customerrecord_doctor_date',
+        ),
+        migrations.RemoveIndex(
+            model_name='customerrecord',
+            name='customerrecord_patient_date',
+        ),
+        migrations.AddField(
+            model_name='customerrecord',
+            name='visit_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerrecord',
+            name='visit_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_visit, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='customerrecord',
+            name='visit_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='customerrecord',
+            name='visit_date',
+            field=reception.models.LocalDateField(db_index=True, editable=False, source='visit_at'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['visit_at', 'id'], name='customerrecord_visit_id'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['records', 'visit_date'], name='customerrecord_records_date'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['payment_type', 'visit_date'], name='customerrecord_payment_date'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['doctor', 'visit_date'], name='customerrecord_doctor_date'),
+        ),
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['patient', 'visit_at'], name='customerrecord_patient_visit'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+# Копия агрегатов reception.patient_stats на момент миграции: код приложения может измениться,
+# а миграция должна заполнять таблицу так же, как при создании
+STATUS_COUNTERS = {
+    'Живая очередь': 'live_queue_count',
+    'Отменено': 'cancelled_count',
+    'Предзапись': 'reserved_count',
+    'в ожидании': 'waiting_count',
+}
+RECORDS_COUNTERS = {
+    'был в приеме': 'visited_count',
+    'в ожидании': 'pending_count',
+    'отменен': 'missed_count',
+}
+PAYMENT_COUNTERS = {
+    None: ('unknown_payment_count', 'unknown_payment_sum'),
+    'card': ('card_count', 'card_sum'),
+    'cash': ('cash_count', 'cash_sum'),
+}
+STATS_FIELDS = [
+    'record_count', 'waiting_count', 'live_queue_count', 'reserved_count', 'cancelled_count', 'visited_count',
+    'pending_count', 'missed_count', 'total_paid', 'cash_count', 'cash_sum', 'card_count', 'card_sum',
+    'unknown_payment_count', 'unknown_payment_sum', 'history_count', 'history_visited_count',
+]
+
+
+def fill_patient_stats(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    PatientStats = apps.get_model('reception', 'PatientStats')
+    CustomerRecord = apps.get_model('reception', 'CustomerRecord')
+    HistoryRecord = apps.get_model('reception', 'HistoryRecord')
+
+    record_aggregates = {'record_count': Count('id'), 'total_paid': Sum('price')}
+    for status, field in STATUS_COUNTERS.items():
+        record_aggregates[field] = Count('id', filter=Q(status=status))
+    for records, field in RECORDS_COUNTERS.items():
+        record_aggregates[field] = Count('id', filter=Q(records=records))
+    for code, (count_field, sum_field) in PAYMENT_COUNTERS.items():
+        condition = Q(payment_type__isnull=True) if code is None else Q(payment_type=code)
+        record_aggregates[count_field] = Count('id', filter=condition)
+        record_aggregates[sum_field] = Sum('price', filter=condition)
+    history_aggregates = {
+        'history_count': Count('id'),
+        'history_visited_count': Count('id', filter=Q(record='был в приеме')),
+    }
+
+    stats = {}
+    for model, aggregates in [(CustomerRecord, record_aggregates), (HistoryRecord, history_aggregates)]:
+        rows = model.objects.using(db_alias).filter(patient_id__isnull=False)
+        for row in rows.values('patient_id').annotate(**aggregates).order_by():
+            values = stats.setdefault(row.pop('patient_id'), dict.fromkeys(STATS_FIELDS, 0))
+            for field, value in row.items():
+                values[field] += value or 0
+    PatientStats.objects.using(db_alias).bulk_create(
+        [PatientStats(patient_id=patient_id, **values) for patient_id, values in stats.items()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0011_customerrecord_visit_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientStats',
+            fields=[
+                ('patient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='reception.patient')),
+                ('record_count', models.IntegerField(default=0)),
+                ('waiting_count', models.IntegerField(default=0)),
+                ('live_queue_count', models.IntegerField(default=0)),
+                ('reserved_count', models.IntegerField(default=0)),
+                ('cancelled_count', models.IntegerField(default=0)),
+                ('visited_count', models.IntegerField(default=0)),
+                ('pending_count', models.IntegerField(default=0)),
+                ('missed_count', models.IntegerField(default=0)),
+                ('total_paid', models.BigIntegerField(default=0)),
+                ('cash_count', models.IntegerField(default=0)),
+                ('cash_sum', models.BigIntegerField(default=0)),
+                ('card_count', models.IntegerField(default=0)),
+                ('card_sum', models.BigIntegerField(default=0)),
+                ('unknown_payment_count', models.IntegerField(default=0)),
+                ('unknown_payment_sum', models.BigIntegerField(default=0)),
+                ('history_count', models.IntegerField(default=0)),
+                ('history_visited_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_patient_stats, migrations.RunPython.noop),
+    ]
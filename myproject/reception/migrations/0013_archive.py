@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:03
+
+import django.db.models.deletion
+import phonenumber_field.modelfields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0012_patientstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCustomerRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('price', models.PositiveIntegerField(blank=True, default=0, null=True)),
+                ('change', models.PositiveIntegerField(blank=True, null=True)),
+                ('payment_type', models.CharField(blank=True, choices=[('cash', 'Наличные'), ('card', 'Карта')], max_length=10, null=True)),
+                ('created_date', models.DateTimeField()),
+                ('visit_at', models.DateTimeField()),
+                ('visit_date', models.DateField()),
+                ('status', models.CharField(choices=[('Живая очередь', 'Живая очередь'), ('Предзапись', 'Предзапись'), ('Отменено', 'Отменено')], max_length=20)),
+                ('records', models.CharField(choices=[('был в приеме', 'был в приеме'), ('в ожидании', 'в ожидании'), ('отменен', 'отменен')], max_length=16)),
+                ('phone_number', phonenumber_field.modelfields.PhoneNumberField(blank=True, max_length=128, null=True, region='KG')),
+                ('time', models.TimeField(blank=True, null=True)),
+                ('discount', models.PositiveIntegerField(default=0)),
+                ('start_at', models.TimeField(blank=True, null=True)),
+                ('end_at', models.TimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.department')),
+                ('doctor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.doctor')),
+                ('patient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_records', to='reception.patient')),
+                ('reception', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.reception')),
+                ('service', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.service')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedHistoryRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('record', models.CharField(choices=[('был в приеме', 'был в приеме'), ('в ожидании', 'в ожидании'), ('отменен', 'отменен')], max_length=16)),
+                ('description', models.TextField()),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.department')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_history', to='reception.patient')),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payment_history', to='reception.archivedcustomerrecord')),
+                ('reception', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.reception')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='reception.service')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedcustomerrecord',
+            index=models.Index(fields=['patient', 'visit_at'], name='archivedrecord_patient_visit'),
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:06
+
+import re
+import unicodedata
+
+import reception.models
+from django.db import migrations
+
+
+# Копия reception.normalization на момент миграции: заполнение колонок не должно зависеть от
+# будущих правок нормализации (после них колонки пересчитываются отдельной миграцией)
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i', 'к': 'k',
+    'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'ң': 'n', 'ө': 'o', 'ү': 'u', 'і': 'i', 'ј': 'j',
+}
+LATIN_VARIANTS = (('y', 'i'), ('kh', 'h'), ('j', 'zh'))
+
+
+def normalize_name(value):
+    text = unicodedata.normalize('NFKD', str(value or '').casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = ''.join(TRANSLIT.get(char, char) for char in text)
+    for variant, canonical in LATIN_VARIANTS:
+        text = text.replace(variant, canonical)
+    return ' '.join(re.findall(r'[^\W_]+', text))
+
+
+def digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+
+def national_digits(value):
+    number = getattr(value, 'national_number', None)
+    if number:
+        return str(number)
+    value = digits(value)
+    if value.startswith('996'):
+        return value[3:]
+    return value.lstrip('0')
+
+
+# SQLite: внешний FTS5-индекс по колонкам reception_patient, синхронизируется триггерами.
+# prefix='2 3 4' — готовые префиксные индексы для автодополнения по первым буквам.
+SQLITE_INDEX_SQL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS reception_patient_search USING fts5(
+        search_name, phone_digits, phone_local,
+        content='reception_patient', content_rowid='id', tokenize='unicode61', prefix='2 3 4')""",
+    """CREATE TRIGGER IF NOT EXISTS reception_patient_search_ai AFTER INSERT ON reception_patient BEGIN
+        INSERT INTO reception_patient_search(rowid, search_name, phone_digits, phone_local)
+        VALUES (new.id, new.search_name, new.phone_digits, new.phone_local);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS reception_patient_search_ad AFTER DELETE ON reception_patient BEGIN
+        INSERT INTO reception_patient_search(reception_patient_search, rowid, search_name, phone_digits, phone_local)
+        VALUES ('delete', old.id, old.search_name, old.phone_digits, old.phone_local);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS reception_patient_search_au AFTER UPDATE ON reception_patient BEGIN
+        INSERT INTO reception_patient_search(reception_patient_search, rowid, search_name, phone_digits, phone_local)
+        VALUES ('delete', old.id, old.search_name, old.phone_digits, old.phone_local);
+        INSERT INTO reception_patient_search(rowid, search_name, phone_digits, phone_local)
+        VALUES (new.id, new.search_name, new.phone_digits, new.phone_local);
+    END""",
+    "INSERT INTO reception_patient_search(reception_patient_search) VALUES ('rebuild')",
+]
+SQLITE_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS reception_patient_search_ai',
+    'DROP TRIGGER IF EXISTS reception_patient_search_ad',
+    'DROP TRIGGER IF EXISTS reception_patient_search_au',
+    'DROP TABLE IF EXISTS reception_patient_search',
+]
+# PostgreSQL: триграммные GIN-индексы, работают и для префикса, и для подстроки
+POSTGRES_INDEX_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS patient_search_name_trgm ON reception_patient USING gin (search_name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS patient_phone_digits_trgm ON reception_patient USING gin (phone_digits gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS patient_phone_local_trgm ON reception_patient USING gin (phone_local gin_trgm_ops)',
+]
+POSTGRES_DROP_SQL = [
+    'DROP INDEX IF EXISTS patient_search_name_trgm',
+    'DROP INDEX IF EXISTS patient_phone_digits_trgm',
+    'DROP INDEX IF EXISTS patient_phone_local_trgm',
+]
+
+
+def index_sql(vendor, drop=False):
+    if vendor == 'sqlite':
+        return SQLITE_DROP_SQL if drop else SQLITE_INDEX_SQL
+    if vendor == 'postgresql':
+        return POSTGRES_DROP_SQL if drop else POSTGRES_INDEX_SQL
+    return []
+
+
+def fill_search_columns(apps, schema_editor):
+    Patient = apps.get_model('reception', 'Patient')
+    manager = Patient.objects.db_manager(schema_editor.connection.alias)
+    patients = manager.only('full_name', 'phone_number')
+    batch = []
+    for patient in patients.iterator(chunk_size=2000):
+        patient.search_name = normalize_name(patient.full_name)[:128]
+        patient.phone_digits = digits(patient.phone_number)[:20]
+        patient.phone_local = national_digits(patient.phone_number)[:20]
+        batch.append(patient)
+        if len(batch) >= 2000:
+            manager.bulk_update(batch, ['search_name', 'phone_digits', 'phone_local'])
+            batch = []
+    manager.bulk_update(batch, ['search_name', 'phone_digits', 'phone_local'])
+
+
+# FTS5 (SQLite) или pg_trgm (PostgreSQL); на других СУБД поиск работает без индекса
+def create_search_index(apps, schema_editor):
+    for sql in index_sql(schema_editor.connection.vendor):
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    for sql in index_sql(schema_editor.connection.vendor, drop=True):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0013_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='phone_digits',
+            field=reception.models.PhoneDigitsField(default='', editable=False, max_length=20, source='phone_number'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='phone_local',
+            field=reception.models.PhoneDigitsField(default='', editable=False, max_length=20, national=True, source='phone_number'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='search_name',
+            field=reception.models.SearchNameField(default='', editable=False, max_length=128, source='full_name'),
+        ),
+        migrations.RunPython(fill_search_columns, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0014_patient_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['phone_digits', 'date_birth'], name='patient_phone_birth'),
+        ),
+    ]
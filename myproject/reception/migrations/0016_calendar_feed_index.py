@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reception', '0015_patient_phone_birth_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerrecord',
+            index=models.Index(fields=['department', 'visit_date'], name='customerrecord_department_date'),
+        ),
+    ]
@@ -1,12 +1,15 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Sum, ExpressionWrapper, F, FloatField
+from django.db.models import Sum, Count, Q, ExpressionWrapper, F, FloatField
 from phonenumber_field.modelfields import PhoneNumberField
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.contrib.auth.base_user import BaseUserManager
 from django.utils import timezone
 from datetime import timedelta
 
+from .normalization import normalize_name, digits, national_digits
+
 
 ROLE_CHOICES = (
     ('Admin', 'admin'),
@@ -80,6 +83,35 @@ class Department(models.Model):
         return self.name
 
 
+class DoctorQuerySet(models.QuerySet):
+    # Итоги отчета по врачу одним запросом (вместо total_price/total_bonus/... по отдельности)
+    def with_report_totals(self, start_date=None, end_date=None):
+        period = Q()
+        if start_date:
+            period &= Q(doctor_customer__visit_date__gte=start_date)
+        if end_date:
+            period &= Q(doctor_customer__visit_date__lte=end_date)
+
+        return self.annotate(
+            sum_price=Sum('doctor_customer__price', filter=period),
+            sum_discounted_price=Sum(
+                ExpressionWrapper(
+                    F('doctor_customer__price') - (F('doctor_customer__price') * F('doctor_customer__discount') / 100.0),
+                    output_field=FloatField()
+                ),
+                filter=period
+            ),
+            appointments_count=Count('doctor_customer', filter=period),
+            cash_sum=Sum('doctor_customer__price', filter=period & Q(doctor_customer__payment_type='cash')),
+            card_sum=Sum('doctor_customer__price', filter=period & Q(doctor_customer__payment_type='card')),
+            unset_sum=Sum('doctor_customer__price', filter=period & Q(doctor_customer__payment_type__isnull=True)),
+        )
+
+
+class DoctorManager(CustomUserManager.from_queryset(DoctorQuerySet)):
+    pass
+
+
 class Doctor(UserProfile):
     speciality = models.CharField(max_length=256)
     medical_license = models.CharField(max_length=256, null=True, blank=True )
@@ -91,6 +123,8 @@ class Doctor(UserProfile):
     #admin models
     job_title = models.CharField(max_length=34, null=True, blank=True)
 
+    objects = DoctorManager()
+
     class Meta:
          verbose_name = "Doctor"
 
@@ -147,6 +181,46 @@ class Service(models.Model):
         return self.name
 
 
+# Поисковые колонки пациента: вычисляются из source при каждом сохранении (и в bulk_create)
+class NormalizedCharField(models.CharField):
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def normalize(self, value):
+        return value
+
+    def pre_save(self, model_instance, add):
+        value = self.normalize(getattr(model_instance, self.source))[:self.max_length]
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class SearchNameField(NormalizedCharField):
+    def normalize(self, value):
+        return normalize_name(value)
+
+
+class PhoneDigitsField(NormalizedCharField):
+    def __init__(self, *args, national=False, **kwargs):
+        self.national = national
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.national:
+            kwargs['national'] = True
+        return name, path, args, kwargs
+
+    def normalize(self, value):
+        return national_digits(value) if self.national else digits(value)
+
+
 class Patient(models.Model):
     GENDER_CHOICES = (
         ('male', 'Мужской'),
@@ -168,11 +242,42 @@ class Patient(models.Model):
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Предзапись')
     user = models.OneToOneField(UserProfile, on_delete=models.CASCADE, related_name="patient_profile", null=True, blank=True)
+    # для поиска (см. reception/search.py): имя в нижнем регистре латиницей, телефон только цифрами
+    search_name = SearchNameField(source='full_name', max_length=128, default='', editable=False)
+    phone_digits = PhoneDigitsField(source='phone_number', max_length=20, default='', editable=False)
+    phone_local = PhoneDigitsField(source='phone_number', national=True, max_length=20, default='',
+                                   editable=False)
+
+    class Meta:
+        indexes = [
+            # повторный пациент на регистрации ищется по телефону и дате рождения (reception/dedupe.py)
+            models.Index(fields=['phone_digits', 'date_birth'], name='patient_phone_birth'),
+        ]
 
     def __str__(self):
         return f"{self.full_name}"
 
 
+# Дата визита по часовому поясу клиники, вычисляется из source при сохранении.
+# pre_save вызывается и в bulk_create, поэтому поле заполняется всегда.
+class LocalDateField(models.DateField):
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if value is None:
+            value = timezone.localdate(getattr(model_instance, self.source), timezone.get_default_timezone())
+            setattr(model_instance, self.attname, value)
+        return value
+
+
 class CustomerRecord(models.Model):
     reception = models.ForeignKey(Reception, related_name='reception_customer', on_delete=models.CASCADE,
                                   null=True, blank=True)
@@ -188,6 +293,9 @@ class CustomerRecord(models.Model):
     )
     payment_type = models.CharField(max_length=10, choices=PAYMENT_CHOICES, default='cash', null=True, blank=True)
     created_date = models.DateTimeField(auto_now=True)
+    # created_date меняется при каждом сохранении; время и дата визита — нет (для отчетов и фильтров)
+    visit_at = models.DateTimeField(default=timezone.now, editable=False)
+    visit_date = LocalDateField(source='visit_at', editable=False, db_index=True)
     STATUS_CHOICES = (
         ('Живая очередь', 'Живая очередь'),
         ('Предзапись', 'Предзапись'),
@@ -207,9 +315,28 @@ class CustomerRecord(models.Model):
     start_at = models.TimeField(default="10:00", null=True, blank=True)
     end_at = models.TimeField(default="10:00", null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # курсорная пагинация списков записей: ORDER BY visit_at DESC, id DESC
+            models.Index(fields=['visit_at', 'id'], name='customerrecord_visit_id'),
+            # отчеты: равенство по измерению + диапазон дат визита
+            models.Index(fields=['records', 'visit_date'], name='customerrecord_records_date'),
+            models.Index(fields=['payment_type', 'visit_date'], name='customerrecord_payment_date'),
+            models.Index(fields=['doctor', 'visit_date'], name='customerrecord_doctor_date'),
+            # календарь отделения за окно дат
+            models.Index(fields=['department', 'visit_date'], name='customerrecord_department_date'),
+            # история и оплаты пациента
+            models.Index(fields=['patient', 'visit_at'], name='customerrecord_patient_visit'),
+        ]
+
     def str(self):
         return f"{self.patient} → {self.doctor} on {self.created_date} at {self.time}"
 
+    # Сигналы обновляют DailyRevenue и PatientStats — в той же транзакции, что и сама запись
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     # Оплата
     def get_payment_method_sums(patient, target_date):
         from .models import CustomerRecord
@@ -231,13 +358,18 @@ class CustomerRecord(models.Model):
         }
 
 ###
+    # живая история без архива, как и в исходных COUNT по HistoryRecord
+    def get_history_stats(self):
+        from .patient_stats import patients_stats
+        return patients_stats([self.patient_id], archived=False, record_models=()).get(self.patient_id)
+
     def get_total_records(self):
-        from .models import HistoryRecord
-        return HistoryRecord.objects.filter(patient=self.patient).count()
+        stats = self.get_history_stats()
+        return stats.history_count if stats else 0
 
     def get_was_on_reception(self):
-        from .models import HistoryRecord
-        return HistoryRecord.objects.filter(patient=self.patient, record='был в приеме').count()
+        stats = self.get_history_stats()
+        return stats.history_visited_count if stats else 0
 
     def __str__(self):
             return f"Invoice for {self.patient}"
@@ -259,10 +391,98 @@ class HistoryRecord(models.Model):
     payment = models.ForeignKey(CustomerRecord, related_name='payment_history', on_delete=models.CASCADE)
     description = models.TextField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'record'], name='historyrecord_patient_record'),
+            models.Index(fields=['doctor', 'date'], name='historyrecord_doctor_date'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.patient}'
+
+
+# Архив закрытых визитов старше RECORD_ARCHIVE_AFTER_DAYS (см. reception/archive.py).
+# Поля и id те же, что у CustomerRecord/HistoryRecord, чтобы строки переносились как есть.
+class ArchivedCustomerRecord(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    reception = models.ForeignKey(Reception, related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    patient = models.ForeignKey(Patient, related_name='archived_records', on_delete=models.CASCADE, null=True,
+                                blank=True)
+    doctor = models.ForeignKey(Doctor, related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    service = models.ForeignKey(Service, related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    department = models.ForeignKey(Department, related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    price = models.PositiveIntegerField(default=0, null=True, blank=True)
+    change = models.PositiveIntegerField(null=True, blank=True)
+    payment_type = models.CharField(max_length=10, choices=CustomerRecord.PAYMENT_CHOICES, null=True, blank=True)
+    created_date = models.DateTimeField()
+    visit_at = models.DateTimeField()
+    visit_date = models.DateField()
+    status = models.CharField(max_length=20, choices=CustomerRecord.STATUS_CHOICES)
+    records = models.CharField(max_length=16, choices=CustomerRecord.CHOICES_RECORD)
+    phone_number = PhoneNumberField(region='KG', null=True, blank=True)
+    time = models.TimeField(null=True, blank=True)
+    discount = models.PositiveIntegerField(default=0)
+    start_at = models.TimeField(null=True, blank=True)
+    end_at = models.TimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'visit_at'], name='archivedrecord_patient_visit'),
+        ]
+
+    def __str__(self):
+        return f'{self.patient} {self.visit_date}'
+
+
+class ArchivedHistoryRecord(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, related_name='archived_history', on_delete=models.CASCADE)
+    reception = models.ForeignKey(Reception, related_name='+', on_delete=models.CASCADE)
+    department = models.ForeignKey(Department, related_name='+', on_delete=models.CASCADE, null=True, blank=True)
+    doctor = models.ForeignKey(Doctor, related_name='+', on_delete=models.CASCADE)
+    service = models.ForeignKey(Service, related_name='+', on_delete=models.CASCADE)
+    date = models.DateField()
+    record = models.CharField(max_length=16, choices=HistoryRecord.CHOICES_RECORD)
+    payment = models.ForeignKey(ArchivedCustomerRecord, related_name='payment_history', on_delete=models.CASCADE)
+    description = models.TextField()
+
     def __str__(self):
         return f'{self.patient}'
 
 
+# Счетчики по пациенту для карточки, обновляются сигналами через F() (см. reception/patient_stats.py)
+class PatientStats(models.Model):
+    patient = models.OneToOneField(Patient, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    record_count = models.IntegerField(default=0)
+    # по CustomerRecord.status; 'в ожидании' нет в STATUS_CHOICES, но API отдает его как waiting
+    waiting_count = models.IntegerField(default=0)
+    live_queue_count = models.IntegerField(default=0)
+    reserved_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    # по CustomerRecord.records
+    visited_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    missed_count = models.IntegerField(default=0)
+    total_paid = models.BigIntegerField(default=0)
+    cash_count = models.IntegerField(default=0)
+    cash_sum = models.BigIntegerField(default=0)
+    card_count = models.IntegerField(default=0)
+    card_sum = models.BigIntegerField(default=0)
+    unknown_payment_count = models.IntegerField(default=0)
+    unknown_payment_sum = models.BigIntegerField(default=0)
+    # по HistoryRecord
+    history_count = models.IntegerField(default=0)
+    history_visited_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.patient_id}: {self.record_count}'
+
+
 class PriceList(models.Model):
     department = models.ForeignKey(Department, related_name='departament_price_list', on_delete=models.CASCADE)
     service = models.ForeignKey(Service, related_name='price_service', on_delete=models.CASCADE)
@@ -270,3 +490,52 @@ class PriceList(models.Model):
 
     def __str__(self):
         return f'{self.department}'
+
+
+# Дневная сводка выручки, обновляется сигналами при изменении CustomerRecord
+class DailyRevenue(models.Model):
+    day = models.DateField()
+    doctor = models.ForeignKey(Doctor, related_name='daily_revenue', on_delete=models.CASCADE, null=True, blank=True)
+    department = models.ForeignKey(Department, related_name='daily_revenue', on_delete=models.CASCADE, null=True,
+                                   blank=True)
+    service = models.ForeignKey(Service, related_name='daily_revenue', on_delete=models.CASCADE, null=True, blank=True)
+    payment_type = models.CharField(max_length=10, choices=CustomerRecord.PAYMENT_CHOICES, null=True, blank=True)
+    records = models.CharField(max_length=16, choices=CustomerRecord.CHOICES_RECORD, default='был в приеме')
+    count = models.IntegerField(default=0)
+    gross = models.BigIntegerField(default=0)
+    discount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('day', 'doctor', 'department', 'service', 'payment_type', 'records')
+
+    def __str__(self):
+        return f'{self.day} {self.doctor} {self.payment_type}'
+
+
+# Фоновые отчеты за длинные периоды (см. reception/jobs.py)
+class ReportJob(models.Model):
+    KIND_CHOICES = (
+        ('detailed', 'Подробный отчет'),
+        ('doctor', 'Отчет по врачам'),
+        ('summary', 'Сводный отчет'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(UserProfile, related_name='report_jobs', on_delete=models.SET_NULL, null=True,
+                                   blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
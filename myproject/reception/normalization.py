@@ -0,0 +1,41 @@
+import re
+import unicodedata
+
+
+# Кириллица (в т.ч. кыргызские буквы) приводится к латинице, чтобы «Айбек» и «Aibek» искались одинаково
+TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i', 'к': 'k',
+    'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f',
+    'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu',
+    'я': 'ya', 'ң': 'n', 'ө': 'o', 'ү': 'u', 'і': 'i', 'ј': 'j',
+}
+# Латинские варианты, которые пишут по-разному для одной и той же кириллической буквы
+LATIN_VARIANTS = (('y', 'i'), ('kh', 'h'), ('j', 'zh'))
+
+
+def normalize_name(value):
+    # регистр и диакритика (й -> и, ё -> е, é -> e) отбрасываются до транслитерации
+    text = unicodedata.normalize('NFKD', str(value or '').casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = ''.join(TRANSLIT.get(char, char) for char in text)
+    for variant, canonical in LATIN_VARIANTS:
+        text = text.replace(variant, canonical)
+    return ' '.join(re.findall(r'[^\W_]+', text))
+
+
+def digits(value):
+    return re.sub(r'\D', '', str(value or ''))
+
+
+# Номер без кода страны и ведущего нуля: +996 700 123 456 и 0700 123 456 -> 700123456
+def national_digits(value):
+    number = getattr(value, 'national_number', None)
+    if number:
+        return str(number)
+    return local_phone_query(digits(value))
+
+
+def local_phone_query(query_digits):
+    if query_digits.startswith('996'):
+        return query_digits[3:]
+    return query_digits.lstrip('0')
@@ -0,0 +1,109 @@
+import heapq
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination, CursorPagination, _reverse_ordering
+
+
+class DoctorRecordsPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+# Keyset-пагинация: позиция курсора — значения всех полей сортировки (последнее — id),
+# поэтому страница в глубине истории стоит столько же, сколько первая (без OFFSET).
+# Стандартный CursorPagination берет только первое поле и добирает дубли через offset.
+class KeysetCursorPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    position_separator = '|'
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return self.position_separator.join(values)
+
+    def position_filter(self, position, reverse):
+        values = position.split(self.position_separator)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        fields = [(field.lstrip('-'), field.startswith('-') != reverse) for field in self.ordering]
+        # (a, b) < (x, y)  ->  a <= x AND (a < x OR (a = x AND b < y)); первое условие — диапазон по индексу
+        first, descending = fields[0]
+        condition = Q()
+        equal = {}
+        for (name, descending_field), value in zip(fields, values):
+            condition |= Q(**equal, **{f'{name}__{"lt" if descending_field else "gt"}': value})
+            equal[name] = value
+        return Q(**{f'{first}__{"lte" if descending else "gte"}': values[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    # Несколько queryset с одинаковой сортировкой (живые записи и архив) одной лентой: из каждого читается
+    # только окно страницы (позиция курсора + page_size + 1), окна сливаются heapq.merge.
+    # Слияние требует, чтобы все поля сортировки шли в одном направлении.
+    def paginate_querysets(self, querysets, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, querysets[0], view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        windows = []
+        for queryset in querysets:
+            queryset = queryset.order_by(*ordering)
+            if current_position is not None:
+                try:
+                    queryset = queryset.filter(self.position_filter(current_position, reverse))
+                except (TypeError, ValueError, ValidationError):
+                    raise NotFound(self.invalid_cursor_message)
+            windows.append(queryset)
+
+        if len(windows) == 1:
+            results = list(windows[0][offset:offset + self.page_size + 1])
+        else:
+            names = [field.lstrip('-') for field in ordering]
+            merged = heapq.merge(*(window[:offset + self.page_size + 1] for window in windows),
+                                 key=lambda instance: tuple(getattr(instance, name) for name in names),
+                                 reverse=ordering[0].startswith('-'))
+            results = list(islice(merged, offset, offset + self.page_size + 1))
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class RecordCursorPagination(KeysetCursorPagination):
+    ordering = ('-visit_at', '-id')
+
+
+class PatientCursorPagination(KeysetCursorPagination):
+    ordering = ('-id',)
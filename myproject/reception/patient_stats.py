@@ -0,0 +1,163 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, Q, F
+
+from .models import (CustomerRecord, HistoryRecord, ArchivedCustomerRecord, ArchivedHistoryRecord, Patient,
+                     PatientStats)
+
+
+STATUS_COUNTERS = {
+    'Живая очередь': 'live_queue_count',
+    'Отменено': 'cancelled_count',
+    'Предзапись': 'reserved_count',
+    'в ожидании': 'waiting_count',
+}
+RECORDS_COUNTERS = {
+    'был в приеме': 'visited_count',
+    'в ожидании': 'pending_count',
+    'отменен': 'missed_count',
+}
+# Порядок как у прежнего агрегата: сначала без способа оплаты, затем коды по алфавиту
+PAYMENT_COUNTERS = {
+    None: ('unknown_payment_count', 'unknown_payment_sum'),
+    'card': ('card_count', 'card_sum'),
+    'cash': ('cash_count', 'cash_sum'),
+}
+STATS_FIELDS = [field.name for field in PatientStats._meta.concrete_fields if field.name != 'patient']
+
+RECORD_STATS_FIELDS = ('patient_id', 'status', 'records', 'payment_type', 'price')
+HISTORY_STATS_FIELDS = ('patient_id', 'record')
+
+
+def record_stats_values(record):
+    return {field: getattr(record, field) for field in RECORD_STATS_FIELDS}
+
+
+def history_stats_values(history):
+    return {field: getattr(history, field) for field in HISTORY_STATS_FIELDS}
+
+
+def record_deltas(values):
+    price = values['price'] or 0
+    deltas = {'record_count': 1, 'total_paid': price}
+    if values['status'] in STATUS_COUNTERS:
+        deltas[STATUS_COUNTERS[values['status']]] = 1
+    if values['records'] in RECORDS_COUNTERS:
+        deltas[RECORDS_COUNTERS[values['records']]] = 1
+    if values['payment_type'] in PAYMENT_COUNTERS:
+        count_field, sum_field = PAYMENT_COUNTERS[values['payment_type']]
+        deltas[count_field] = 1
+        deltas[sum_field] = price
+    return deltas
+
+
+def history_deltas(values):
+    return {'history_count': 1, 'history_visited_count': int(values['record'] == 'был в приеме')}
+
+
+def apply_stats(patient_id, deltas, sign):
+    if patient_id is None:
+        return
+    changes = {field: F(field) + value * sign for field, value in deltas.items() if value}
+    if PatientStats.objects.filter(patient_id=patient_id).update(**changes) or sign < 0:
+        return
+    try:
+        with transaction.atomic():
+            PatientStats.objects.create(patient_id=patient_id, **deltas)
+    except IntegrityError:
+        PatientStats.objects.filter(patient_id=patient_id).update(**changes)
+
+
+# Счетчики учитывают и архив. Без archived из них вычитается архивная часть (записи и/или история — по
+# переданным моделям): так итоги совпадают со списками, которые по умолчанию архив не показывают.
+# Один запрос на модель архива для всех пациентов.
+def patients_stats(patient_ids, archived=True, record_models=(ArchivedCustomerRecord,),
+                   history_models=(ArchivedHistoryRecord,)):
+    stats = {patient_id: PatientStats(patient_id=patient_id) for patient_id in patient_ids if patient_id is not None}
+    stats.update((row.patient_id, row) for row in PatientStats.objects.filter(patient_id__in=list(stats)))
+    if not archived and stats:
+        archived_values = collect_patient_stats(list(stats), record_models=record_models,
+                                                history_models=history_models)
+        for patient_id, values in archived_values.items():
+            for field, value in values.items():
+                setattr(stats[patient_id], field, getattr(stats[patient_id], field) - value)
+    return stats
+
+
+# Экраны записей пациента поля истории не показывают — вычитаются только архивные записи
+def patient_stats(patient_id, archived=True):
+    return patients_stats([patient_id], archived=archived, history_models=())[patient_id]
+
+
+def status_summary(stats):
+    return [{'status': status, 'count': getattr(stats, field)}
+            for status, field in STATUS_COUNTERS.items() if getattr(stats, field)]
+
+
+def payment_method_sums(stats):
+    return {code: getattr(stats, sum_field)
+            for code, (count_field, sum_field) in PAYMENT_COUNTERS.items() if getattr(stats, count_field)}
+
+
+# Счетчики, посчитанные заново агрегатами по живым и архивным записям (или только по переданным моделям)
+def collect_patient_stats(patient_ids=None, record_models=(CustomerRecord, ArchivedCustomerRecord),
+                          history_models=(HistoryRecord, ArchivedHistoryRecord)):
+    record_aggregates = {'record_count': Count('id'), 'total_paid': Sum('price')}
+    for status, field in STATUS_COUNTERS.items():
+        record_aggregates[field] = Count('id', filter=Q(status=status))
+    for records, field in RECORDS_COUNTERS.items():
+        record_aggregates[field] = Count('id', filter=Q(records=records))
+    for code, (count_field, sum_field) in PAYMENT_COUNTERS.items():
+        condition = Q(payment_type__isnull=True) if code is None else Q(payment_type=code)
+        record_aggregates[count_field] = Count('id', filter=condition)
+        record_aggregates[sum_field] = Sum('price', filter=condition)
+    history_aggregates = {
+        'history_count': Count('id'),
+        'history_visited_count': Count('id', filter=Q(record='был в приеме')),
+    }
+
+    stats = {}
+    sources = [(model, record_aggregates) for model in record_models]
+    sources += [(model, history_aggregates) for model in history_models]
+    for model, aggregates in sources:
+        rows = model.objects.filter(patient_id__isnull=False)
+        if patient_ids is not None:
+            rows = rows.filter(patient_id__in=patient_ids)
+        for row in rows.values('patient_id').annotate(**aggregates).order_by():
+            values = stats.setdefault(row.pop('patient_id'), dict.fromkeys(STATS_FIELDS, 0))
+            for field, value in row.items():
+                values[field] += value or 0
+    return stats
+
+
+def rebuild_patient_stats(batch_size=1000):
+    objs = [PatientStats(patient_id=patient_id, **values) for patient_id, values in collect_patient_stats().items()]
+    with transaction.atomic():
+        PatientStats.objects.all().delete()
+        PatientStats.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
+
+
+# Сверяет счетчики с агрегатами по пачкам пациентов и (если repair) исправляет расхождения.
+# Строки пачки блокируются, чтобы сигналы параллельных сохранений применились уже поверх исправления.
+def reconcile_patient_stats(batch_size=1000, repair=True, patient_ids=None):
+    mismatched = []
+    patients = Patient.objects.order_by('pk')
+    if patient_ids is not None:
+        patients = patients.filter(pk__in=patient_ids)
+    patient_ids = list(patients.values_list('pk', flat=True))
+    for start in range(0, len(patient_ids), batch_size):
+        chunk = patient_ids[start:start + batch_size]
+        with transaction.atomic():
+            current = {stats.patient_id: stats
+                       for stats in PatientStats.objects.select_for_update().filter(patient_id__in=chunk)}
+            expected = collect_patient_stats(chunk)
+            for patient_id in chunk:
+                values = expected.get(patient_id, dict.fromkeys(STATS_FIELDS, 0))
+                stats = current.get(patient_id)
+                actual = {field: getattr(stats, field) for field in STATS_FIELDS} if stats else None
+                if actual == values or (actual is None and not any(values.values())):
+                    continue
+                mismatched.append(patient_id)
+                if repair:
+                    PatientStats.objects.update_or_create(patient_id=patient_id, defaults=values)
+    return mismatched
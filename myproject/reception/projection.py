@@ -0,0 +1,128 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import PKOnlyObject
+from rest_framework.response import Response
+
+
+class Unsupported(Exception):
+    pass
+
+
+# Проекция сериализатора на values(): те же ключи и то же форматирование
+# (to_representation полей), но без создания экземпляров моделей
+class ValuesProjection:
+    def __init__(self, serializer, model):
+        self.columns = []
+        self.entries = self._entries(serializer, model, '')
+
+    def _column(self, path):
+        if path not in self.columns:
+            self.columns.append(path)
+        return path
+
+    def _entries(self, serializer, model, prefix):
+        entries = []
+        for field in serializer._readable_fields:
+            if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+                raise Unsupported(field.field_name)
+
+            current_model, path, guards = model, prefix, []
+            for index, attr in enumerate(field.source_attrs):
+                is_last = index == len(field.source_attrs) - 1
+                try:
+                    model_field = current_model._meta.get_field(attr)
+                except FieldDoesNotExist:
+                    if hasattr(current_model, attr) or field.default is not empty:
+                        # свойство или метод модели — значение в БД не выбрать
+                        raise Unsupported(field.field_name)
+                    # атрибута нет: DRF отдает None (allow_null) или пропускает поле
+                    entries.append((field.field_name, 'none' if field.allow_null else 'skip', None, None, None))
+                    break
+                if model_field.one_to_many or model_field.many_to_many or (model_field.is_relation
+                                                                           and not model_field.concrete):
+                    raise Unsupported(field.field_name)
+
+                if not model_field.is_relation:
+                    if not is_last:
+                        raise Unsupported(field.field_name)
+                    entries.append((field.field_name, 'value', self._column(path + attr), field, guards))
+                    break
+
+                if is_last:
+                    fk = self._column(path + attr)
+                    if isinstance(field, serializers.PrimaryKeyRelatedField):
+                        entries.append((field.field_name, 'pk', fk, field, guards))
+                    elif isinstance(field, serializers.BaseSerializer) and not isinstance(
+                            field, serializers.ListSerializer):
+                        children = self._entries(field, model_field.related_model, f'{path}{attr}__')
+                        entries.append((field.field_name, 'nested', fk, children, guards))
+                    else:
+                        raise Unsupported(field.field_name)
+                    break
+
+                # промежуточный FK: если он пустой, DRF получает AttributeError
+                if field.required or field.default is not empty:
+                    raise Unsupported(field.field_name)
+                guards = guards + [(self._column(path + attr), field.allow_null)]
+                current_model, path = model_field.related_model, f'{path}{attr}__'
+        return entries
+
+    def _represent_row(self, entries, row):
+        data = {}
+        for name, kind, column, payload, guards in entries:
+            if kind == 'skip':
+                continue
+            if kind == 'none':
+                data[name] = None
+                continue
+            missing = next((allow_null for guard, allow_null in guards if row[guard] is None), empty)
+            if missing is not empty:
+                if missing:
+                    data[name] = None
+                continue
+
+            value = row[column]
+            if value is None:
+                data[name] = None
+            elif kind == 'nested':
+                data[name] = self._represent_row(payload, row)
+            elif kind == 'pk':
+                data[name] = payload.to_representation(PKOnlyObject(pk=value))
+            else:
+                data[name] = payload.to_representation(value)
+        return data
+
+    def rows(self, queryset, *extra_columns):
+        # extra_columns — например, поля сортировки, из которых пагинация берет позицию курсора
+        return queryset.values(*self.columns, *(column for column in extra_columns if column not in self.columns))
+
+    def represent(self, rows):
+        return [self._represent_row(self.entries, row) for row in rows]
+
+    def serialize(self, queryset):
+        return self.represent(self.rows(queryset))
+
+
+def values_projection(serializer, model):
+    try:
+        return ValuesProjection(serializer, model)
+    except Unsupported:
+        return None
+
+
+# Быстрый list только для чтения: строки собираются из values() по полям сериализатора.
+# Если сериализатор нельзя спроецировать (методы, свойства, to-many), работает обычный list().
+class ValuesListMixin:
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        projection = values_projection(self.get_serializer(), queryset.model)
+        if projection is None:
+            return super().list(request, *args, **kwargs)
+
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        rows = projection.rows(queryset, *(field.lstrip('-') for field in ordering))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(projection.represent(page))
+        return Response(projection.represent(rows))
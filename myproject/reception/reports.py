@@ -0,0 +1,260 @@
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import Count, Q, Sum, F, FloatField, IntegerField, ExpressionWrapper, DateField
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from .archive import archive_cutoff
+from .filters import CustomerRecordListFilter, DailyRevenueFilter
+from .models import CustomerRecord, DailyRevenue, PatientStats
+from .patient_stats import patients_stats, payment_method_sums
+
+
+# Период отчета из query params (?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD)
+def report_period(params):
+    period = []
+    for name in ('start_date', 'end_date'):
+        value = params.get(name) or None
+        if value is not None:
+            try:
+                value = parse_date(value)
+            except ValueError:
+                value = None
+            if value is None:
+                raise ValidationError({name: 'Неверный формат даты, используйте YYYY-MM-DD.'})
+        period.append(value)
+    return tuple(period)
+
+
+# Все итоги отчета одним запросом (условная агрегация по одному queryset)
+def report_totals(queryset):
+    totals = queryset.aggregate(
+        total_count=Count('id'),
+        total_price=Sum('price'),
+        total_discount=Sum('discount'),
+        cash_sum=Sum('price', filter=Q(payment_type='cash')),
+        card_sum=Sum('price', filter=Q(payment_type='card')),
+        total_doctor_income=Sum(
+            ExpressionWrapper(
+                F('price') * F('doctor__bonus') / 100.0,
+                output_field=FloatField()
+            )
+        ),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    totals['total_doctor_income'] = round(totals['total_doctor_income'], 2)
+    return totals
+
+
+# Те же итоги по дневной сводке DailyRevenue (без сканирования CustomerRecord)
+def rollup_totals(queryset):
+    totals = queryset.aggregate(
+        total_count=Sum('count'),
+        total_price=Sum('gross'),
+        total_net=Sum('net'),
+        cash_sum=Sum('gross', filter=Q(payment_type='cash')),
+        card_sum=Sum('gross', filter=Q(payment_type='card')),
+    )
+    return {key: value or 0 for key, value in totals.items()}
+
+
+def summary_totals(queryset):
+    totals = rollup_totals(queryset)
+    return {
+        "total_cash": totals['cash_sum'],
+        "total_card": totals['card_sum'],
+        "total_price": totals['total_price'],
+        # поле API с исходной версии отчета: вся выручка, а не доля врачей
+        "total_to_doctors": totals['total_price'],
+    }
+
+
+def _doctor_income(queryset, price_field):
+    total = queryset.aggregate(total=Sum(ExpressionWrapper(F(price_field) * F('doctor__bonus') / 100.0,
+                                                           output_field=FloatField())))['total']
+    return round(total or 0, 2)
+
+
+# Доля врачей по сырым записям — тот же отфильтрованный queryset, что у списка
+def record_doctor_income(queryset):
+    return _doctor_income(queryset, 'price')
+
+
+# Доля врачей для отчета по врачам: из DailyRevenue по тем же фильтрам, что у списка (день, врач, отделение).
+# Сводка не может ответить в двух случаях, тогда итог считается по записям списка:
+# поиск по пациенту (пациентов в сводке нет) и выборка без дня или за день старше границы архива —
+# сводка учитывает и архивные визиты, а список показывает только живую таблицу.
+def doctor_income_total(queryset, params):
+    list_params = {name: params.get(name) for name in CustomerRecordListFilter.base_filters if params.get(name)}
+    filterset = DailyRevenueFilter(list_params, queryset=DailyRevenue.objects.all())
+    day = filterset.form.cleaned_data.get('created_date') if filterset.is_valid() else None
+    if params.get('search') or day is None or day < archive_cutoff():
+        return record_doctor_income(queryset)
+    return _doctor_income(filterset.qs, 'gross')
+
+
+# Границы периода в часовом поясе клиники — диапазон по самому полю, без __date
+def period_filter(start_date=None, end_date=None, field='visit_date'):
+    condition = Q()
+    if start_date:
+        condition &= Q(**{f'{field}__gte': start_date})
+    if end_date:
+        condition &= Q(**{f'{field}__lte': end_date})
+    return condition
+
+
+TIMESERIES_INTERVALS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+TIMESERIES_GROUPS = {
+    'payment_type': ('payment_type',),
+    'doctor': ('doctor_id', 'doctor__first_name', 'doctor__last_name'),
+    'department': ('department_id', 'department__name'),
+}
+TIMESERIES_MAX_BUCKETS = 1000
+
+
+def _bucket_start(day, interval):
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(day, interval):
+    if interval == 'week':
+        return day + timedelta(days=7)
+    if interval == 'month':
+        return (day + timedelta(days=32)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _group_label(row, fields):
+    if fields == TIMESERIES_GROUPS['payment_type']:
+        return dict(CustomerRecord.PAYMENT_CHOICES).get(row['payment_type'])
+    return ' '.join(str(row[field]) for field in fields[1:] if row[field]) or None
+
+
+# Выручка по дням/неделям/месяцам одним GROUP BY; пустые периоды заполняются нулями
+def revenue_timeseries(queryset, interval, start_date, end_date, group_by=None):
+    if interval not in TIMESERIES_INTERVALS:
+        raise ValidationError({'interval': f'Допустимые значения: {", ".join(TIMESERIES_INTERVALS)}.'})
+    if group_by and group_by not in TIMESERIES_GROUPS:
+        raise ValidationError({'group_by': f'Допустимые значения: {", ".join(TIMESERIES_GROUPS)}.'})
+    if not start_date or not end_date or start_date > end_date:
+        raise ValidationError({'detail': 'Укажите start_date и end_date (start_date <= end_date).'})
+
+    buckets = []
+    bucket = _bucket_start(start_date, interval)
+    while bucket <= end_date:
+        buckets.append(bucket)
+        bucket = _next_bucket(bucket, interval)
+    if len(buckets) > TIMESERIES_MAX_BUCKETS:
+        raise ValidationError({'detail': f'Слишком много периодов (максимум {TIMESERIES_MAX_BUCKETS}).'})
+
+    trunc = TIMESERIES_INTERVALS[interval]('visit_date', output_field=DateField())
+    group_fields = TIMESERIES_GROUPS.get(group_by, ())
+
+    rows = (
+        queryset
+        .filter(period_filter(start_date, end_date))
+        .annotate(bucket=trunc)
+        .values('bucket', *group_fields)
+        .annotate(count=Count('id'), total=Sum('price'))
+        .order_by('bucket')
+    )
+
+    series = {bucket: {'bucket': bucket, 'count': 0, 'total': 0} for bucket in buckets}
+    groups = {}
+    for row in rows:
+        point = series[row['bucket']]
+        point['count'] += row['count']
+        point['total'] += row['total'] or 0
+        if group_fields:
+            key = row[group_fields[0]]
+            groups.setdefault(key, _group_label(row, group_fields))
+            point.setdefault('groups', {})[key] = (row['count'], row['total'] or 0)
+
+    for point in series.values():
+        if group_by:
+            values = point.pop('groups', {})
+            point['groups'] = [
+                {'key': key, 'label': label, 'count': values.get(key, (0, 0))[0],
+                 'total': values.get(key, (0, 0))[1]}
+                for key, label in sorted(groups.items(), key=lambda item: str(item[0]))
+            ]
+
+    return {
+        'interval': interval,
+        'group_by': group_by,
+        'start_date': start_date,
+        'end_date': end_date,
+        'series': list(series.values()),
+    }
+
+
+CENT = Decimal('0.01')
+
+
+# Зарплатная ведомость: все врачи одним GROUP BY, суммы в Decimal без FloatField
+def doctor_payroll(queryset):
+    rows = (
+        queryset
+        .filter(doctor__isnull=False)
+        .values('doctor_id', 'doctor__first_name', 'doctor__last_name', 'doctor__bonus')
+        .annotate(
+            appointments=Count('id'),
+            gross=Sum('price'),
+            # price * (100 - discount) — целое, делим на 100 уже в Decimal
+            discounted_x100=Sum(ExpressionWrapper(F('price') * (100 - F('discount')), output_field=IntegerField())),
+        )
+        .order_by('doctor__last_name', 'doctor__first_name', 'doctor_id')
+    )
+
+    payroll = []
+    for row in rows:
+        discounted_x100 = Decimal(row['discounted_x100'] or 0)
+        bonus_percent = row['doctor__bonus'] or 0
+        payroll.append({
+            'doctor': row['doctor_id'],
+            'first_name': row['doctor__first_name'],
+            'last_name': row['doctor__last_name'],
+            'bonus_percent': bonus_percent,
+            'appointments': row['appointments'],
+            'gross': row['gross'] or 0,
+            'discounted': (discounted_x100 / 100).quantize(CENT),
+            'bonus': (discounted_x100 * bonus_percent / 10000).quantize(CENT, rounding=ROUND_HALF_UP),
+        })
+    return payroll
+
+
+def payroll_totals(payroll):
+    return {
+        'appointments': sum(row['appointments'] for row in payroll),
+        'gross': sum(row['gross'] for row in payroll),
+        'discounted': sum((row['discounted'] for row in payroll), Decimal('0.00')),
+        'bonus': sum((row['bonus'] for row in payroll), Decimal('0.00')),
+    }
+
+
+# Итоги по пациентам из PatientStats: всего записей, статусы, оплачено, суммы по способам оплаты.
+# Списки crm архив не показывают, поэтому по умолчанию архивная часть вычитается.
+def patient_totals(patient_ids, archived=False):
+    return {
+        patient_id: {
+            'total_appointments': row.record_count,
+            'status_counts': {
+                'waiting': row.waiting_count,
+                'reserved': row.reserved_count,
+                'cancelled': row.cancelled_count,
+            },
+            'total_paid': row.total_paid,
+            'payment_method_sums': payment_method_sums(row),
+        }
+        for patient_id, row in patients_stats(patient_ids, archived=archived, history_models=()).items()
+    }
@@ -0,0 +1,73 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum, F, IntegerField, ExpressionWrapper
+
+from .models import CustomerRecord, ArchivedCustomerRecord, DailyRevenue
+
+
+ROLLUP_KEY_FIELDS = ('doctor_id', 'department_id', 'service_id', 'payment_type', 'records')
+ROLLUP_VALUE_FIELDS = ('visit_date', 'price', 'discount') + ROLLUP_KEY_FIELDS
+
+
+def record_rollup_values(record):
+    return {field: getattr(record, field) for field in ROLLUP_VALUE_FIELDS}
+
+
+def _discount_amount(price, discount):
+    return Decimal((price or 0) * (discount or 0)) / 100
+
+
+def apply_record(values, sign):
+    key = {field: values[field] for field in ROLLUP_KEY_FIELDS}
+    key['day'] = values['visit_date']
+    gross = (values['price'] or 0) * sign
+    discount = _discount_amount(values['price'], values['discount']) * sign
+
+    delta = {
+        'count': F('count') + sign,
+        'gross': F('gross') + gross,
+        'discount': F('discount') + discount,
+        'net': F('net') + (gross - discount),
+    }
+    if DailyRevenue.objects.filter(**key).update(**delta) or sign < 0:
+        return
+    try:
+        with transaction.atomic():
+            DailyRevenue.objects.create(count=1, gross=gross, discount=discount, net=gross - discount, **key)
+    except IntegrityError:
+        DailyRevenue.objects.filter(**key).update(**delta)
+
+
+# Сводка строится по живым и архивным записям: перенос в архив ее не меняет
+def rebuild_daily_revenue(batch_size=1000):
+    totals = {}
+    for model in (CustomerRecord, ArchivedCustomerRecord):
+        rows = (
+            model.objects
+            .values('visit_date', *ROLLUP_KEY_FIELDS)
+            .annotate(
+                count=Count('id'),
+                gross=Sum('price'),
+                discount_total=Sum(ExpressionWrapper(F('price') * F('discount'), output_field=IntegerField())),
+            )
+            .order_by()
+        )
+        for row in rows.iterator():
+            key = (row['visit_date'],) + tuple(row[field] for field in ROLLUP_KEY_FIELDS)
+            total = totals.setdefault(key, {'count': 0, 'gross': 0, 'discount_total': 0})
+            for field in total:
+                total[field] += row[field] or 0
+
+    objs = []
+    for (day, *key), total in totals.items():
+        discount = Decimal(total['discount_total']) / 100
+        objs.append(DailyRevenue(
+            day=day, **dict(zip(ROLLUP_KEY_FIELDS, key)),
+            count=total['count'], gross=total['gross'], discount=discount, net=total['gross'] - discount,
+        ))
+
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        DailyRevenue.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
@@ -0,0 +1,83 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Patient
+from .normalization import normalize_name, digits, local_phone_query
+
+
+FTS_TABLE = 'reception_patient_search'
+PHONE_PART = re.compile(r'^[+(]*\d[\d()\-.]*$')
+# Сколько совпадений (самых новых пациентов) ранжировать: короткий префикс может совпасть с сотнями тысяч
+RANK_CANDIDATES = 1000
+
+# Индекс создается миграцией 0014_patient_search: на SQLite — внешняя FTS5-таблица FTS_TABLE
+# (синхронизируется триггерами), на PostgreSQL — триграммные GIN-индексы по тем же колонкам.
+
+
+# Запрос делится на слова имени и цифры телефона: «Айбек +996 700-12» -> (['aibek'], '99670012').
+# Телефоном считаются только части из цифр и знаков номера, «Садыков2» остается словом имени.
+def parse_query(query):
+    parts = (query or '').split()
+    phone = ''.join(digits(part) for part in parts if PHONE_PART.match(part))
+    words = normalize_name(' '.join(part for part in parts if not PHONE_PART.match(part))).split()
+    return words, phone
+
+
+def _fts_expression(words, phone):
+    terms = [f'search_name : "{word}"*' for word in words]
+    if phone:
+        local = local_phone_query(phone)
+        phone_terms = [f'phone_digits : "{phone}"*']
+        if local:
+            phone_terms.append(f'phone_local : "{local}"*')
+        terms.append('(' + ' OR '.join(phone_terms) + ')')
+    return ' AND '.join(terms)
+
+
+def _like_condition(words, phone):
+    condition = Q()
+    for word in words:
+        # начало любого слова имени
+        condition &= Q(search_name__startswith=word) | Q(search_name__contains=f' {word}')
+    if phone:
+        local = local_phone_query(phone)
+        phone_condition = Q(phone_digits__startswith=phone)
+        if local:
+            phone_condition |= Q(phone_local__startswith=local)
+        condition &= phone_condition
+    return condition
+
+
+# Пациенты, подходящие под запрос (для фильтрации списков, без сортировки)
+def matching_patients(query):
+    words, phone = parse_query(query)
+    if not words and not phone:
+        return Patient.objects.all()
+    if connection.vendor == 'sqlite':
+        return Patient.objects.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts_expression(words, phone)]))
+    # PostgreSQL: LIKE по триграммным индексам
+    return Patient.objects.filter(_like_condition(words, phone))
+
+
+# Автодополнение: лучшие совпадения первыми (bm25 в SQLite, сходство триграмм в PostgreSQL)
+def autocomplete_patients(query, limit=10):
+    words, phone = parse_query(query)
+    if not words and not phone:
+        return Patient.objects.none()
+    if connection.vendor == 'sqlite':
+        return Patient.objects.raw(
+            f'SELECT p.* FROM (SELECT rowid, rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rowid DESC LIMIT %s) s JOIN reception_patient p ON p.id = s.rowid '
+            f'ORDER BY s.rank, length(p.search_name), p.id LIMIT %s',
+            [_fts_expression(words, phone), RANK_CANDIDATES, limit])
+    queryset = Patient.objects.filter(_like_condition(words, phone))
+    if connection.vendor == 'postgresql' and words:
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        queryset = queryset.annotate(similarity=TrigramSimilarity('search_name', ' '.join(words)))
+        return queryset.order_by('-similarity', 'id')[:limit]
+    return queryset.order_by('search_name', 'id')[:limit]
@@ -0,0 +1,159 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from doctor.availability import rebuild_availability
+from doctor.models import Appointment, ScheduleTemplate
+from doctor.scheduling import generate_schedule
+from .models import Department, Service, Doctor, Reception, Patient, CustomerRecord, HistoryRecord
+from .patient_stats import rebuild_patient_stats
+from .rollups import rebuild_daily_revenue
+
+
+FIRST_NAMES = ['Айбек', 'Азамат', 'Бакыт', 'Нурлан', 'Эрлан', 'Тимур', 'Руслан', 'Алина', 'Айгерим', 'Динара',
+               'Жылдыз', 'Нурия', 'Мээрим', 'Elena', 'Ivan', 'Aidana']
+LAST_NAMES = ['Садыков', 'Токтогулов', 'Алиев', 'Асанов', 'Жумабеков', 'Исаков', 'Кадыров', 'Мамытов', 'Осмонов',
+              'Иванов', 'Петров', 'Omurov']
+DEPARTMENTS = ['Терапия', 'Хирургия', 'Кардиология', 'Неврология', 'Педиатрия', 'Стоматология', 'Офтальмология',
+               'Гинекология']
+SERVICES = ['Консультация', 'Повторный прием', 'УЗИ', 'Анализ крови', 'ЭКГ', 'Процедура']
+
+
+def _full_name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _phone(rng):
+    return f'+9967{rng.randrange(10 ** 8):08d}'
+
+
+def _batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed_clinic(doctors=30, receptions=5, patients=20000, records=200000, history_ratio=0.5, schedule_days=30,
+                start_date=None, end_date=None, seed=0, batch_size=5000, progress=None):
+    rng = random.Random(seed)
+    end_date = end_date or timezone.localdate()
+    start_date = start_date or end_date - timedelta(days=364)
+    days = (end_date - start_date).days + 1
+    password = make_password(None)
+    tz = timezone.get_current_timezone()
+    progress = progress or (lambda name, count: None)
+    counts = {}
+
+    def insert(model, rows, on_batch=None):
+        counts.setdefault(model.__name__, 0)
+        for batch in _batches(rows, batch_size):
+            created = model.objects.bulk_create(batch)
+            counts[model.__name__] += len(created)
+            progress(model.__name__, counts[model.__name__])
+            if on_batch:
+                on_batch(created)
+
+    with transaction.atomic():
+        departments = Department.objects.bulk_create([Department(name=name) for name in DEPARTMENTS])
+        services = Service.objects.bulk_create([
+            Service(name=name, department=department, price=rng.randrange(500, 5000, 100))
+            for department in departments for name in SERVICES
+        ])
+        counts.update(Department=len(departments), Service=len(services))
+
+        # Doctor/Reception — наследники UserProfile (multi-table), bulk_create для них не работает.
+        # seed в email, чтобы несколько генераций с разным seed не конфликтовали
+        doctor_objs = [
+            Doctor.objects.create(
+                email=f'doctor{index}.{seed}@seed.local', password=password, first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES), role='Doctor', speciality='Врач', image='',
+                department=departments[index % len(departments)], bonus=rng.choice([5, 10, 15, 20]),
+                cabinet=100 + index,
+            )
+            for index in range(doctors)
+        ]
+        reception_objs = [
+            Reception.objects.create(email=f'reception{index}.{seed}@seed.local', password=password,
+                                     role='Reception', desk_name=str(index + 1))
+            for index in range(receptions)
+        ]
+        counts.update(Doctor=len(doctor_objs), Reception=len(reception_objs))
+
+        patient_ids = []
+        insert(Patient, (
+            Patient(full_name=_full_name(rng), date_birth=date(1950, 1, 1) + timedelta(days=rng.randrange(25000)),
+                    gender=rng.choice(['male', 'female']), phone_number=_phone(rng))
+            for _ in range(patients)
+        ), lambda created: patient_ids.extend(patient.pk for patient in created))
+
+        def record_rows():
+            for _ in range(records):
+                doctor = rng.choice(doctor_objs)
+                day = start_date + timedelta(days=rng.randrange(days))
+                created = datetime.combine(day, time(rng.randrange(8, 19), rng.randrange(0, 60, 15)), tzinfo=tz)
+                service = rng.choice(services)
+                yield CustomerRecord(
+                    reception=rng.choice(reception_objs), patient_id=rng.choice(patient_ids), doctor=doctor,
+                    service=service, department_id=doctor.department_id, price=service.price,
+                    payment_type=rng.choice(['cash', 'cash', 'card']), visit_at=created,
+                    status=rng.choice(['Живая очередь', 'Предзапись', 'Отменено']),
+                    records=rng.choice(['был в приеме', 'был в приеме', 'в ожидании', 'отменен']),
+                    time=created.timetz().replace(tzinfo=None), discount=rng.choice([0, 0, 0, 5, 10]),
+                    start_at=created.time(), end_at=(created + timedelta(minutes=30)).time(),
+                )
+
+        # created_date (auto_now) и date (auto_now_add) bulk_create перезаписывает текущим временем —
+        # даты прошлых визитов проставляются отдельным update() после каждой пачки
+        visit_day = Subquery(CustomerRecord.objects.filter(pk=OuterRef('payment_id')).values('visit_date')[:1])
+
+        def history_rows(created):
+            CustomerRecord.objects.filter(pk__in=[record.pk for record in created]).update(created_date=F('visit_at'))
+            insert(HistoryRecord, (
+                HistoryRecord(patient_id=record.patient_id, reception_id=record.reception_id,
+                              department_id=record.department_id, doctor_id=record.doctor_id,
+                              service_id=record.service_id, record=record.records, payment=record,
+                              description='')
+                for record in created if rng.random() < history_ratio
+            ), lambda history: HistoryRecord.objects.filter(pk__in=[row.pk for row in history]).update(date=visit_day))
+
+        insert(CustomerRecord, record_rows(), history_rows)
+
+        # Расписание (по недельным шаблонам, 9:00–17:00 каждый день) и записи — на schedule_days дней от end_date
+        insert(ScheduleTemplate, (
+            ScheduleTemplate(doctor=doctor, weekday=weekday, start_time=time(9), end_time=time(17), slot_minutes=60)
+            for doctor in doctor_objs for weekday in range(7)
+        ))
+        counts['DoctorSchedule'] = generate_schedule(end_date, end_date + timedelta(days=schedule_days - 1),
+                                                     [doctor.pk for doctor in doctor_objs], batch_size=batch_size)
+        progress('DoctorSchedule', counts['DoctorSchedule'])
+
+        def appointment_rows():
+            for doctor in doctor_objs:
+                for offset in range(schedule_days):
+                    day = end_date + timedelta(days=offset)
+                    for hour in range(9, 17):
+                        if rng.random() < 0.3:
+                            yield Appointment(
+                                patient_id=rng.choice(patient_ids), doctor=doctor,
+                                department_id=doctor.department_id, service=rng.choice(services), date=day,
+                                start_time=time(hour), end_time=time(hour, 30),
+                                status=rng.choice(['waiting', 'reserved', 'cancelled']),
+                            )
+
+        insert(Appointment, appointment_rows())
+
+        # bulk_create не вызывает сигналы — сводку, счетчики пациентов и свободное время пересобираем целиком
+        rebuild_daily_revenue(batch_size=batch_size)
+        rebuild_patient_stats(batch_size=batch_size)
+        rebuild_availability(batch_size=batch_size)
+
+    return counts
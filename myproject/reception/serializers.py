@@ -1,4 +1,8 @@
 from .models import *
+from .dedupe import find_or_create_patient
+from .filters import REPORT_JOB_FILTERS
+from .patient_stats import patients_stats
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
@@ -173,6 +177,12 @@ class CustomerRecordListSerializer(serializers.ModelSerializer):
         fields = ['department', 'patient', 'created_date', 'doctor', 'payment_type', 'price']
 
 
+class PatientSearchSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Patient
+        fields = ['id', 'full_name', 'phone_number', 'date_birth']
+
+
 class PatientCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Patient
@@ -198,8 +208,9 @@ class CustomerRecordCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         patient_data = validated_data.pop('patient')
-        patient = Patient.objects.create(**patient_data)
-        customer_record = CustomerRecord.objects.create(patient=patient, **validated_data)
+        with transaction.atomic():
+            patient = find_or_create_patient(patient_data)
+            customer_record = CustomerRecord.objects.create(patient=patient, **validated_data)
         return customer_record
 
 
@@ -246,11 +257,23 @@ class AboutPatientHistorySerializer(serializers.ModelSerializer):
         model = CustomerRecord
         fields = ['reception', 'department', 'doctor', 'service', 'records', 'total_records', 'was_on_reception']
 
+    # из PatientStats без архива: один раз на весь ответ вместо двух COUNT на каждую запись
+    def get_live_stats(self, obj):
+        stats = self.context.setdefault('patient_stats', {})
+        if obj.patient_id not in stats:
+            records = self.root.instance if getattr(self.root, 'many', False) else [obj]
+            patient_ids = {record.patient_id for record in records} | {obj.patient_id}
+            stats.update(dict.fromkeys(patient_ids))
+            stats.update(patients_stats(patient_ids, archived=False, record_models=()))
+        return stats[obj.patient_id]
+
     def get_total_records(self, obj):
-        return obj.get_total_records()
+        stats = self.get_live_stats(obj)
+        return stats.history_count if stats else 0
 
     def get_was_on_reception(self, obj):
-        return obj.get_was_on_reception()
+        stats = self.get_live_stats(obj)
+        return stats.history_visited_count if stats else 0
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -336,5 +359,36 @@ class CalendarSerializer(serializers.ModelSerializer):
         fields = ['doctor', 'department', 'created_date', 'time', 'service', 'status', 'speciality']
 
 
+class CalendarFeedSerializer(serializers.ModelSerializer):
+    patient_name = serializers.CharField(source='patient.full_name', read_only=True, allow_null=True)
+    service_name = serializers.CharField(source='service.name', read_only=True, allow_null=True)
+    start_at = serializers.TimeField(format='%H:%M', read_only=True)
+    end_at = serializers.TimeField(format='%H:%M', read_only=True)
 
+    class Meta:
+        model = CustomerRecord
+        fields = ['id', 'doctor', 'department', 'patient', 'patient_name', 'service', 'service_name', 'visit_date',
+                  'start_at', 'end_at', 'status', 'records']
 
+
+
+
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'kind', 'params', 'status', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = ['status', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('params должен быть объектом.')
+        return value
+
+    # Ошибки фильтров (неверная дата, несуществующий врач) — сразу 400, а не упавшая задача
+    def validate(self, attrs):
+        filterset = REPORT_JOB_FILTERS[attrs['kind']](attrs.get('params', {}))
+        if not filterset.is_valid():
+            raise serializers.ValidationError({'params': filterset.errors})
+        return attrs
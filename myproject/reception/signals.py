@@ -0,0 +1,160 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .cache import bump_scopes
+from .models import CustomerRecord, HistoryRecord, Doctor, Service, Patient
+from .patient_stats import (RECORD_STATS_FIELDS, HISTORY_STATS_FIELDS, apply_stats, record_deltas, history_deltas,
+                            record_stats_values, history_stats_values)
+from .rollups import ROLLUP_VALUE_FIELDS, apply_record, record_rollup_values
+
+
+# Перенос в архив не меняет ни сводку, ни счетчики пациента — сигналы на это время отключаются
+_muted = ContextVar('reception_signals_muted', default=False)
+
+
+@contextmanager
+def muted_signals():
+    token = _muted.set(True)
+    try:
+        yield
+    finally:
+        _muted.reset(token)
+
+
+def signals_muted():
+    return _muted.get()
+
+
+# Занятость слотов врача (doctor/signals.py) по записи регистратуры
+BOOKING_RECORD_FIELDS = ('doctor_id', 'visit_date', 'start_at', 'end_at', 'status', 'records')
+# Старые значения нужны сводке, счетчикам пациента и свободному времени врача — читаем их одним запросом
+OLD_RECORD_FIELDS = tuple(dict.fromkeys(ROLLUP_VALUE_FIELDS + RECORD_STATS_FIELDS + BOOKING_RECORD_FIELDS))
+
+
+@receiver(pre_save, sender=CustomerRecord)
+def remember_old_record(sender, instance, **kwargs):
+    instance._old_record = None
+    if instance.pk and not _muted.get():
+        instance._old_record = CustomerRecord.objects.filter(pk=instance.pk).values(*OLD_RECORD_FIELDS).first()
+
+
+# Строка до сохранения (None для новой записи и при отключенных сигналах); читать в post_save
+def old_record(instance):
+    return getattr(instance, '_old_record', None)
+
+
+@receiver(post_save, sender=CustomerRecord)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw or _muted.get():
+        return
+    old = old_record(instance)
+    if old:
+        apply_record(old, -1)
+        apply_stats(old['patient_id'], record_deltas(old), -1)
+    apply_record(record_rollup_values(instance), 1)
+    apply_stats(instance.patient_id, record_deltas(record_stats_values(instance)), 1)
+    bump_scopes('records')
+
+
+@receiver(post_delete, sender=CustomerRecord)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    if _muted.get():
+        return
+    apply_record(record_rollup_values(instance), -1)
+    apply_stats(instance.patient_id, record_deltas(record_stats_values(instance)), -1)
+    bump_scopes('records')
+
+
+@receiver(pre_save, sender=HistoryRecord)
+def remember_old_history(sender, instance, **kwargs):
+    instance._stats_old = None
+    if instance.pk and not _muted.get():
+        instance._stats_old = HistoryRecord.objects.filter(pk=instance.pk).values(*HISTORY_STATS_FIELDS).first()
+
+
+@receiver(post_save, sender=HistoryRecord)
+def update_stats_on_history_save(sender, instance, raw=False, **kwargs):
+    if raw or _muted.get():
+        return
+    old = getattr(instance, '_stats_old', None)
+    if old:
+        apply_stats(old['patient_id'], history_deltas(old), -1)
+    apply_stats(instance.patient_id, history_deltas(history_stats_values(instance)), 1)
+
+
+@receiver(post_delete, sender=HistoryRecord)
+def update_stats_on_history_delete(sender, instance, **kwargs):
+    if _muted.get():
+        return
+    apply_stats(instance.patient_id, history_deltas(history_stats_values(instance)), -1)
+
+
+# Бонус врача, цены услуг и их имена участвуют в отчетах — кеш сбрасываем, только если они изменились
+# (Doctor — пользователь, и вход в систему тоже сохраняет его через last_login).
+# Имя пациента показывает календарь (версия окна в reception/calendar.py).
+DOCTOR_REPORT_FIELDS = ('bonus', 'first_name', 'last_name')
+SERVICE_REPORT_FIELDS = ('price', 'name')
+PATIENT_REPORT_FIELDS = ('full_name',)
+
+
+def remember_report_fields(sender, instance, fields, update_fields=None):
+    instance._report_old = None
+    if instance.pk and (update_fields is None or set(update_fields) & set(fields)):
+        instance._report_old = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+# Новый врач или услуга еще не встречаются ни в одной записи — сбрасывать нечего
+def report_fields_changed(instance, fields):
+    old = getattr(instance, '_report_old', None)
+    return old is not None and any(old[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(pre_save, sender=Doctor)
+def remember_old_doctor(sender, instance, update_fields=None, **kwargs):
+    remember_report_fields(sender, instance, DOCTOR_REPORT_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=Doctor)
+def invalidate_doctor_reports(sender, instance, **kwargs):
+    if report_fields_changed(instance, DOCTOR_REPORT_FIELDS):
+        bump_scopes('doctors')
+
+
+@receiver(post_delete, sender=Doctor)
+def invalidate_deleted_doctor_reports(sender, **kwargs):
+    bump_scopes('doctors')
+
+
+@receiver(pre_save, sender=Service)
+def remember_old_service(sender, instance, update_fields=None, **kwargs):
+    remember_report_fields(sender, instance, SERVICE_REPORT_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=Service)
+def invalidate_service_reports(sender, instance, **kwargs):
+    if report_fields_changed(instance, SERVICE_REPORT_FIELDS):
+        bump_scopes('services')
+
+
+@receiver(post_delete, sender=Service)
+def invalidate_deleted_service_reports(sender, **kwargs):
+    bump_scopes('services')
+
+
+@receiver(pre_save, sender=Patient)
+def remember_old_patient(sender, instance, update_fields=None, **kwargs):
+    remember_report_fields(sender, instance, PATIENT_REPORT_FIELDS, update_fields)
+
+
+@receiver(post_save, sender=Patient)
+def invalidate_patient_reports(sender, instance, **kwargs):
+    if report_fields_changed(instance, PATIENT_REPORT_FIELDS):
+        bump_scopes('patients')
+
+
+@receiver(post_delete, sender=Patient)
+def invalidate_deleted_patient_reports(sender, **kwargs):
+    bump_scopes('patients')
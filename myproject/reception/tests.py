@@ -1,3 +1,1010 @@
+import json
+from base64 import b64encode
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F, Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .archive import archive_cutoff, archive_records
+from .cache import scope_version
+from .benchmarks import (SKIPPED_VIEWS, app_view_names, benchmark_client, benchmark_urls, budget_errors,
+                         create_benchmark_job, load_baseline, measure, view_name)
+from .eager import eager_loading_plan
+from .exports import XLSX_MEDIA_TYPE
+from .filters import CustomerRecordListFilter, DailyRevenueFilter, ReportPeriodFilter
+from .projection import values_projection
+from .jobs import run_report_job
+from doctor.models import Appointment, DoctorSchedule
+from .models import (UserProfile, Department, Service, Doctor, Reception, Patient, CustomerRecord, HistoryRecord,
+                     DailyRevenue, ReportJob, PatientStats, ArchivedCustomerRecord, ArchivedHistoryRecord)
+from .patient_stats import STATS_FIELDS, collect_patient_stats, reconcile_patient_stats
+from .search import parse_query
+from .seeding import seed_clinic
+from .serializers import AboutPatientHistorySerializer
+
+
+class ClinicDataMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='Терапия')
+        cls.service = Service.objects.create(name='Консультация', department=cls.department, price=1000)
+        cls.doctor = Doctor.objects.create_user(email='doctor@example.com', password='pass', first_name='Азамат',
+                                                last_name='Токтогулов', speciality='Терапевт',
+                                                department=cls.department, bonus=10, cabinet=1, image='')
+        cls.reception = Reception.objects.create_user(email='reception@example.com', password='pass',
+                                                      desk_name='1')
+        cls.patient = Patient.objects.create(full_name='Айбек Садыков', date_birth='1990-01-01', gender='male',
+                                             phone_number='+996700123456')
+        for price, payment_type, discount in [(1000, 'cash', 0), (2000, 'card', 10), (500, 'cash', 50)]:
+            CustomerRecord.objects.create(patient=cls.patient, doctor=cls.doctor, service=cls.service,
+                                          department=cls.department, reception=cls.reception, price=price,
+                                          payment_type=payment_type, discount=discount)
+
+    def setUp(self):
+        cache.clear()
+
+
+class ReportQueryCountTests(ClinicDataMixin, TestCase):
+    def test_detailed_report(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('detailed_record'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_count'], 3)
+        self.assertEqual(response.data['total_price'], 3500)
+        self.assertEqual(response.data['total_discount'], 60)
+        self.assertEqual(response.data['cash_sum'], 1500)
+        self.assertEqual(response.data['card_sum'], 2000)
+        self.assertEqual(response.data['total_doctor_income'], 350)
+        self.assertEqual(len(response.data['records']), 3)
+
+    def test_doctor_report(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/ru/report_doctor/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_doctor_income'], 350)
+
+    def test_summary_report(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/ru/summary_report/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'total_cash': 1500, 'total_card': 2000, 'total_price': 3500,
+                                         'total_to_doctors': 3500})
+
+    def test_payment_report(self):
+        # счетчики пациента, архивная часть (вычитается из них) и сами записи
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('payment', args=[self.patient.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_paid'], 3500)
+        self.assertEqual(response.data['cash_paid'], 1500)
+        self.assertEqual(response.data['card_paid'], 2000)
+
+
+class DoctorIncomeTotalTests(ClinicDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other = Department.objects.create(name='Хирургия')
+        surgeon = Doctor.objects.create_user(email='surgeon@example.com', password='pass', first_name='Бакыт',
+                                             last_name='Исаев', speciality='Хирург', department=other, bonus=20,
+                                             cabinet=2, image='')
+        CustomerRecord.objects.create(patient=cls.patient, doctor=surgeon, service=cls.service, department=other,
+                                      reception=cls.reception, price=1250, payment_type='card')
+
+    # Итог считается по тем же записям, что возвращает список
+    def assertTotalMatchesRows(self, url, params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        ids = [row['id'] for row in response.data['records']]
+        expected = sum(record.price * record.doctor.bonus / 100
+                       for record in CustomerRecord.objects.filter(id__in=ids).select_related('doctor'))
+        self.assertEqual(response.data['total_doctor_income'], round(expected, 2))
+
+    def test_day_total_reads_rollup(self):
+        params = {'created_date': timezone.localdate(), 'department': self.department.pk}
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTotalMatchesRows('/ru/report_doctor/', params)
+        self.assertTrue(any('reception_dailyrevenue' in query['sql'] for query in queries.captured_queries))
+
+    # за день старше границы архива сводка считает и архивные визиты — итог берется по записям списка
+    def test_archived_day_falls_back_to_records(self):
+        old_day = timezone.now() - timedelta(days=800)
+        CustomerRecord.objects.create(patient=self.patient, doctor=self.doctor, price=300, records='в ожидании',
+                                      visit_at=old_day)
+        CustomerRecord.objects.create(patient=self.patient, doctor=self.doctor, price=700, visit_at=old_day)
+        archive_records(archive_cutoff())
+        params = {'created_date': timezone.localdate(old_day)}
+        self.assertTotalMatchesRows('/ru/report_doctor/', params)
+        self.assertEqual(self.client.get('/ru/report_doctor/', params).data['total_doctor_income'], 30)
+
+    def test_total_follows_list_filters(self):
+        day = timezone.localdate()
+        filters = [{}, {'department': self.department.pk}, {'doctor': self.doctor.pk},
+                   {'created_date': day}, {'start_date': '2000-01-01', 'end_date': '2000-01-31'},
+                   {'search': 'Садыков'}]
+        for url in ('/ru/report_doctor/', reverse('doctor_bonus', args=[self.doctor.pk])):
+            for params in filters:
+                with self.subTest(url=url, params=params):
+                    self.assertTotalMatchesRows(url, params)
+
+
+class DailyRevenueTests(ClinicDataMixin, TestCase):
+    def rollup_rows(self):
+        return sorted(DailyRevenue.objects.filter(count__gt=0).values_list(
+            'day', 'doctor', 'department', 'service', 'payment_type', 'records', 'count', 'gross', 'discount', 'net'))
+
+    def test_incremental_matches_rebuild(self):
+        record = CustomerRecord.objects.filter(payment_type='cash').first()
+        record.payment_type = 'card'
+        record.price = 700
+        record.save()
+        CustomerRecord.objects.filter(price=2000).first().delete()
+        incremental = self.rollup_rows()
+
+        call_command('rebuild_daily_revenue', stdout=StringIO())
+        self.assertEqual(incremental, self.rollup_rows())
+
+    def test_rollup_amounts(self):
+        totals = DailyRevenue.objects.get(payment_type='card')
+        self.assertEqual((totals.count, totals.gross, totals.discount, totals.net), (1, 2000, 200, 1800))
+
+    def test_summary_date_range(self):
+        day = DailyRevenue.objects.first().day
+        response = self.client.get('/ru/summary_report/', {'start_date': day, 'end_date': day})
+        self.assertEqual(response.data['total_price'], 3500)
+        response = self.client.get('/ru/summary_report/', {'start_date': '2000-01-01', 'end_date': '2000-01-31'})
+        self.assertEqual(response.data['total_price'], 0)
+
+    def test_summary_period_validation(self):
+        for url in ['/ru/summary_report/', reverse('summary_clinic')]:
+            self.assertEqual(self.client.get(url, {'start_date': '2024-13-01'}).status_code, 400)
+            self.assertEqual(self.client.get(url, {'start_date': '2999-01-01'}).data['total_price'], 0)
+            self.assertEqual(self.client.get(url, {'end_date': '2000-01-01'}).data['total_price'], 0)
+
+
+class ReportExportTests(ClinicDataMixin, TestCase):
+    def test_detailed_report_csv(self):
+        response = self.client.get(reverse('detailed_record'), {'format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[0], 'id')
+        self.assertEqual(len(lines), 1 + 3 + 3)
+        self.assertEqual(lines[-1], '3,3500,60,1500,2000,350.0')
+
+    def test_doctor_report_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get('/ru/report_doctor/', {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], XLSX_MEDIA_TYPE)
+        self.assertIn('attachment; filename="doctor_report.xlsx"', response['Content-Disposition'])
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.values)
+        self.assertEqual(rows[0], ('doctor', 'id', 'visit_at', 'price', 'doctor_income'))
+        self.assertEqual(rows[-1], (350,))
+
+    def test_detailed_report_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(reverse('detailed_record'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], XLSX_MEDIA_TYPE)
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True)
+        self.assertEqual(workbook.sheetnames, ['detailed_report'])
+        rows = list(workbook.active.values)
+        self.assertEqual(len(rows), 1 + 3 + 3)
+        self.assertEqual(rows[-1], (3, 3500, 60, 1500, 2000, 350))
+
+
+class ReportCacheTests(ClinicDataMixin, TestCase):
+    def test_cache_hit_and_invalidation(self):
+        url = reverse('detailed_record')
+        self.client.get(url, {'doctor': '', 'page': '1'})
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'page': '1'})
+        self.assertEqual(response.data['total_price'], 3500)
+        self.assertEqual(self.client.get(reverse('report_cache_stats')).data, {'hits': 1, 'misses': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomerRecord.objects.create(doctor=self.doctor, price=500, payment_type='cash')
+        response = self.client.get(url, {'page': '1'})
+        self.assertEqual(response.data['total_price'], 4000)
+
+    def test_summary_views_are_cached(self):
+        for url in ['/ru/summary_report/', reverse('summary_clinic')]:
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).data['total_price'], 3500)
+
+    def test_doctor_bonus_invalidates(self):
+        url = '/ru/report_doctor/'
+        self.assertEqual(self.client.get(url).data['total_doctor_income'], 350)
+        self.doctor.bonus = 20
+        self.doctor.save()
+        self.assertEqual(self.client.get(url).data['total_doctor_income'], 700)
+
+    def test_unrelated_doctor_save_keeps_cache(self):
+        url = '/ru/report_doctor/'
+        self.client.get(url)
+        self.doctor.cabinet = 5
+        self.doctor.save()
+        self.client.force_login(self.doctor)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['total_doctor_income'], 350)
+
+
+class ReportJobTests(ClinicDataMixin, TestCase):
+    def submit(self, kind, params=None):
+        response = self.client.post(reverse('report_job_create'), {'kind': kind, 'params': params or {}},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        return response.data['id']
+
+    def test_detailed_job(self):
+        job_id = self.submit('detailed', {'payment_type': 'cash'})
+        self.assertEqual(self.client.get(reverse('report_job_detail', args=[job_id])).data['status'], 'pending')
+        self.assertEqual(self.client.get(reverse('report_job_result', args=[job_id])).status_code, 409)
+
+        run_report_job(job_id)
+
+        self.assertEqual(self.client.get(reverse('report_job_detail', args=[job_id])).data['status'], 'done')
+        result = self.client.get(reverse('report_job_result', args=[job_id])).json()
+        self.assertEqual(result['total_price'], 1500)
+        self.assertEqual(len(result['records']), 2)
+
+    def test_summary_job_matches_endpoint(self):
+        job_id = self.submit('summary')
+        run_report_job(job_id)
+        result = self.client.get(reverse('report_job_result', args=[job_id])).json()
+        self.assertEqual(result, self.client.get('/ru/summary_report/').json())
+
+    def test_invalid_params_are_rejected(self):
+        for kind, params in [('doctor', {'start_date': 'not-a-date'}), ('detailed', {'doctor': 999999}),
+                             ('summary', {'end_date': '2024-13-01'})]:
+            response = self.client.post(reverse('report_job_create'), {'kind': kind, 'params': params},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(next(iter(params)), response.data['params'])
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_doctor_job_total_follows_filters(self):
+        job_id = self.submit('doctor', {'department': self.department.pk, 'payment_type': 'cash'})
+        run_report_job(job_id)
+        result = self.client.get(reverse('report_job_result', args=[job_id])).json()
+        self.assertEqual(len(result['records']), 2)
+        self.assertEqual(result['total_doctor_income'], 150)
+
+    def test_stale_jobs_fail_on_startup(self):
+        pending, running = self.submit('summary'), self.submit('detailed')
+        ReportJob.objects.filter(pk=running).update(status='running')
+        done = self.submit('summary')
+        run_report_job(done)
+
+        call_command('fail_stale_report_jobs', stdout=StringIO())
+        statuses = dict(ReportJob.objects.values_list('pk', 'status'))
+        self.assertEqual((statuses[pending], statuses[running], statuses[done]), ('failed', 'failed', 'done'))
+        self.assertEqual(self.client.get(reverse('report_job_result', args=[pending])).status_code, 409)
+
+
+class RevenueTimeseriesTests(ClinicDataMixin, TestCase):
+    def test_daily_series_is_zero_filled(self):
+        today = timezone.localdate()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('revenue_timeseries'), {
+                'start_date': today - timedelta(days=2), 'end_date': today, 'group_by': 'payment_type'})
+        self.assertEqual(response.status_code, 200)
+        series = response.data['series']
+        self.assertEqual([point['bucket'] for point in series], [today - timedelta(days=n) for n in (2, 1, 0)])
+        self.assertEqual([point['total'] for point in series], [0, 0, 3500])
+        self.assertEqual([(group['key'], group['total']) for group in series[0]['groups']], [('card', 0), ('cash', 0)])
+        self.assertEqual([(group['key'], group['count'], group['total']) for group in series[2]['groups']],
+                         [('card', 1, 2000), ('cash', 2, 1500)])
+
+    def test_monthly_series_by_doctor(self):
+        today = timezone.localdate()
+        start = (today.replace(day=1) - timedelta(days=40)).replace(day=1)
+        response = self.client.get(reverse('revenue_timeseries'), {
+            'start_date': start, 'end_date': today, 'interval': 'month', 'group_by': 'doctor'})
+        series = response.data['series']
+        self.assertEqual(len(series), 3)
+        self.assertEqual(series[-1]['groups'], [{'key': self.doctor.pk, 'label': 'Азамат Токтогулов', 'count': 3,
+                                                 'total': 3500}])
+
+    def test_invalid_arguments(self):
+        url = reverse('revenue_timeseries')
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start_date': '2025-01-01', 'end_date': '2025-01-31',
+                                               'interval': 'hour'}).status_code, 400)
+
+
+class EagerLoadingTests(ClinicDataMixin, TestCase):
+    list_urls = ['/ru/customer_record/', '/ru/records/', '/ru/calendar/', '/ru/about_patient/', '/ru/doctors/schedule/',
+                 '/ru/doctors/', '/ru/price_list/', '/ru/info_patient/', '/ru/doctor/',
+                 '/ru/history/{patient}/records/', '/ru/patient/{patient}/visited-records/']
+
+    def add_rows(self):
+        department = Department.objects.create(name='Хирургия')
+        Service.objects.create(name='Операция', department=department, price=5000)
+        doctor = Doctor.objects.create_user(email='surgeon@example.com', password='pass', first_name='Бакыт',
+                                            speciality='Хирург', department=department, image='')
+        patient = Patient.objects.create(full_name='Нурия Асанова', date_birth='1985-05-05', gender='female',
+                                         phone_number='+996700654321')
+        for _ in range(3):
+            CustomerRecord.objects.create(patient=self.patient, doctor=doctor, service=self.service,
+                                          department=department, reception=self.reception, price=100)
+            CustomerRecord.objects.create(patient=patient, doctor=doctor, price=100)
+
+    def count_queries(self):
+        counts = {}
+        for url in self.list_urls:
+            url = url.format(patient=self.patient.pk)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def test_query_count_does_not_grow_with_rows(self):
+        before = self.count_queries()
+        self.add_rows()
+        self.assertEqual(self.count_queries(), before)
+
+    def test_plan(self):
+        from crm_app.serializers import AppointmentScheduleSerializer, PriceListSerializer
+
+        plan = eager_loading_plan(AppointmentScheduleSerializer, CustomerRecord)
+        self.assertEqual(plan.select_related, {'doctor', 'doctor__department'})
+        self.assertTrue(plan.can_defer)
+        plan = eager_loading_plan(PriceListSerializer, Department)
+        self.assertEqual(plan.prefetch_related, {'services'})
+        plan = eager_loading_plan(AboutPatientHistorySerializer, CustomerRecord)
+        self.assertEqual(plan.select_related, {'department', 'doctor', 'service', 'reception'})
+
+
+class ValuesProjectionTests(ClinicDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        CustomerRecord.objects.create(price=None, payment_type=None, time='09:30')
+        CustomerRecord.objects.create(patient=cls.patient, service=cls.service, time='18:05', status='Предзапись')
+
+    def serializers(self):
+        from crm_app.serializers import AppointmentAdminSerializer
+        from .serializers import CustomerRecordListSerializer, CalendarSerializer
+
+        return [CustomerRecordListSerializer, AppointmentAdminSerializer, CalendarSerializer]
+
+    def test_same_output_as_serializer(self):
+        queryset = CustomerRecord.objects.order_by('pk')
+        for serializer_class in self.serializers():
+            projection = values_projection(serializer_class(), CustomerRecord)
+            self.assertIsNotNone(projection, serializer_class)
+            self.assertEqual(projection.serialize(queryset), serializer_class(queryset, many=True).data,
+                             serializer_class)
+
+    def test_endpoints(self):
+        from crm_app.serializers import AppointmentAdminSerializer
+        from .serializers import CustomerRecordListSerializer, CalendarSerializer
+
+        for url, serializer_class in [('/ru/customer_record/', CustomerRecordListSerializer),
+                                      ('/ru/records/', AppointmentAdminSerializer),
+                                      ('/ru/calendar/', CalendarSerializer)]:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            expected = serializer_class(CustomerRecord.objects.order_by('-visit_at', '-id'), many=True).data
+            self.assertEqual(response.json()['results'], json.loads(JSONRenderer().render(expected)), url)
+
+    def test_unsupported_serializer(self):
+        from crm_app.serializers import AppointmentHistorySerializer
+
+        self.assertIsNone(values_projection(AppointmentHistorySerializer(), CustomerRecord))
+
+
+class CursorPaginationTests(ClinicDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # несколько записей с одинаковым visit_at — порядок внутри определяет id
+        same_time = timezone.now() - timedelta(days=10)
+        CustomerRecord.objects.bulk_create([
+            CustomerRecord(patient=cls.patient, doctor=cls.doctor, price=index, visit_at=same_time,
+                           time=f'10:{index:02d}')
+            for index in range(7)
+        ])
+
+    def walk(self, url, key, **params):
+        seen = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen += [item[key] for item in response.data['results']]
+            url, params = response.data['next'], {}
+        return seen
+
+    def test_pages_cover_all_records_once(self):
+        expected = list(CustomerRecord.objects.order_by('-visit_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/ru/records/', 'id', page_size=3), expected)
+
+        times = [value.strftime('%H:%M:%S') for value in
+                 CustomerRecord.objects.order_by('-visit_at', '-id').values_list('time', flat=True)
+                 if value is not None]
+        self.assertEqual([value for value in self.walk('/ru/about_patient/', 'time', page_size=2) if value], times)
+
+    def test_previous_link(self):
+        first = self.client.get('/ru/records/', {'page_size': 4}).data
+        second = self.client.get(first['next']).data
+        self.assertEqual(self.client.get(second['previous']).data['results'], first['results'])
+
+    def test_patients(self):
+        Patient.objects.create(full_name='Нурия Асанова', date_birth='1985-05-05', gender='female',
+                               phone_number='+996700654321')
+        self.assertEqual(self.walk('/ru/info_patient/', 'full_name', page_size=1),
+                         ['Нурия Асанова', 'Айбек Садыков'])
+
+    def test_page_size_cap_and_invalid_cursor(self):
+        CustomerRecord.objects.bulk_create([CustomerRecord(price=1) for _ in range(200)])
+        self.assertEqual(len(self.client.get('/ru/customer_record/', {'page_size': 1000}).data['results']), 200)
+        self.assertEqual(self.client.get('/ru/customer_record/', {'cursor': 'garbage'}).status_code, 404)
+        cursor = b64encode(b'p=not-a-date%7Cx').decode()
+        self.assertEqual(self.client.get('/ru/customer_record/', {'cursor': cursor}).status_code, 404)
+
+
+class IndexPlanTests(ClinicDataMixin, TestCase):
+    # На маленьких таблицах PostgreSQL предпочитает seq scan — запрещаем его, чтобы проверить доступность индекса
+    def plan(self, queryset):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = self.plan(queryset)
+        table = queryset.model._meta.db_table
+        self.assertTrue(any(name in plan for name in index_names), plan)
+        self.assertNotIn(f'Seq Scan on {table}', plan)
+        self.assertNotRegex(plan, rf'SCAN {table}(?! USING)')
+
+    def test_report_period_queries(self):
+        from .reports import period_filter
+
+        today = timezone.localdate()
+        period = period_filter(today - timedelta(days=30), today)
+        visited = CustomerRecord.objects.filter(period, records='был в приеме')
+        self.assertUsesIndex(visited, 'customerrecord_records_date')
+        self.assertUsesIndex(visited.values('doctor_id').annotate(total=Sum('price')), 'customerrecord_records_date')
+        self.assertUsesIndex(CustomerRecord.objects.filter(period, payment_type='cash'), 'customerrecord_payment_date')
+        self.assertUsesIndex(CustomerRecord.objects.filter(period, doctor=self.doctor), 'customerrecord_doctor_date',
+                             'customerrecord_records_date')
+
+        params = {'start_date': str(today - timedelta(days=30)), 'end_date': str(today)}
+        self.assertUsesIndex(ReportPeriodFilter(params, queryset=CustomerRecord.objects.all()).qs,
+                             'customerrecord_visit_date')
+        plan = self.plan(CustomerRecordListFilter({'created_date': str(today)}, queryset=CustomerRecord.objects.all()).qs)
+        self.assertIn('visit_date', plan)
+
+    def test_patient_queries(self):
+        self.assertUsesIndex(CustomerRecord.objects.filter(patient=self.patient).order_by('-visit_at'),
+                             'customerrecord_patient_visit')
+        self.assertUsesIndex(HistoryRecord.objects.filter(patient=self.patient, record='был в приеме'),
+                             'historyrecord_patient_record')
+
+    def test_schedule_queries(self):
+        today = timezone.localdate()
+        self.assertUsesIndex(Appointment.objects.filter(doctor=self.doctor, date=today, start_time__lt='12:00'),
+                             'appointment_doctor_date')
+        self.assertUsesIndex(DoctorSchedule.objects.filter(date__range=[today, today + timedelta(days=30)]),
+                             'doctorschedule_date_doctor')
+        self.assertUsesIndex(Appointment.objects.filter(date__range=[today, today + timedelta(days=30)]),
+                             'appointment_date_doctor')
+        self.assertUsesIndex(HistoryRecord.objects.filter(doctor=self.doctor, date__gte=today),
+                             'historyrecord_doctor_date')
+
+    def test_calendar_window_queries(self):
+        from .calendar import calendar_window
+
+        today = str(timezone.localdate())
+        self.assertUsesIndex(calendar_window({'doctor': str(self.doctor.pk), 'from': today, 'to': today}),
+                             'customerrecord_doctor_date')
+        self.assertUsesIndex(calendar_window({'department': str(self.department.pk), 'from': today, 'to': today}),
+                             'customerrecord_department_date')
+
+
+class CalendarFeedTests(ClinicDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.params = {'doctor': self.doctor.pk, 'from': str(today - timedelta(days=3)),
+                       'to': str(today + timedelta(days=3))}
+
+    def feed(self, **headers):
+        return self.client.get(reverse('calendar_feed'), self.params, headers=headers)
+
+    def test_window_feed(self):
+        outside = CustomerRecord.objects.create(patient=self.patient, doctor=self.doctor, service=self.service,
+                                                department=self.department, price=100)
+        CustomerRecord.objects.filter(pk=outside.pk).update(visit_date=timezone.localdate() - timedelta(days=10))
+        with self.assertNumQueries(2):
+            response = self.feed()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]['patient_name'], 'Айбек Садыков')
+        self.assertEqual(response.data[0]['service_name'], 'Консультация')
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        self.params = {'department': self.department.pk, 'from': self.params['from'], 'to': self.params['to']}
+        self.assertEqual(len(self.feed().data), 3)
+
+    def test_feed_without_projection(self):
+        expected = self.feed().data
+        with mock.patch('reception.views.values_projection', return_value=None):
+            with self.assertNumQueries(2):
+                response = self.feed()
+        self.assertEqual(json.loads(JSONRenderer().render(response.data)), json.loads(JSONRenderer().render(expected)))
+
+    def test_unchanged_window_is_not_modified(self):
+        first = self.feed()
+        with self.assertNumQueries(1):
+            response = self.feed(if_none_match=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_changes_in_window_change_version(self):
+        etag = self.feed()['ETag']
+        record = CustomerRecord.objects.filter(doctor=self.doctor).first()
+        record.status = 'Отменено'
+        record.save()
+        response = self.feed(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        # удаление не двигает created_date, но меняет количество
+        etag = response['ETag']
+        CustomerRecord.objects.filter(doctor=self.doctor).exclude(pk=record.pk).first().delete()
+        self.assertEqual(self.feed(if_none_match=etag).status_code, 200)
+
+    def test_renames_change_version(self):
+        etag = self.feed()['ETag']
+        self.service.name = 'Повторная консультация'
+        self.service.save()
+        response = self.feed(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['service_name'], 'Повторная консультация')
+
+        etag = response['ETag']
+        self.patient.full_name = 'Айбек Садыков-Уулу'
+        self.patient.save()
+        response = self.feed(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['patient_name'], 'Айбек Садыков-Уулу')
+        self.assertEqual(self.feed(if_none_match=response['ETag']).status_code, 304)
+
+    def test_if_modified_since_is_ignored(self):
+        CustomerRecord.objects.filter(doctor=self.doctor).first().delete()
+        self.assertEqual(self.feed(if_modified_since='Fri, 01 Jan 2100 00:00:00 GMT').status_code, 200)
+
+    def test_window_validation(self):
+        url = reverse('calendar_feed')
+        self.assertEqual(self.client.get(url, {'from': '2030-01-01', 'to': '2030-01-07'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**self.params, 'from': 'bad'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {**self.params, 'from': '2030-01-01', 'to': '2030-06-01'}).status_code,
+                         400)
+
+
+class VisitDateTests(ClinicDataMixin, TestCase):
+    def test_visit_date_in_clinic_timezone(self):
+        record = CustomerRecord.objects.create(price=100, visit_at=datetime(2024, 3, 1, 20, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(record.visit_date, date(2024, 3, 2))
+        CustomerRecord.objects.bulk_create([CustomerRecord(price=100, visit_at=record.visit_at)])
+        self.assertEqual(CustomerRecord.objects.filter(visit_date=date(2024, 3, 2)).count(), 2)
+
+    def test_edit_does_not_move_visit(self):
+        visit_day = timezone.localdate() - timedelta(days=10)
+        record = CustomerRecord.objects.create(patient=self.patient, doctor=self.doctor, price=700,
+                                               visit_at=timezone.now() - timedelta(days=10))
+        record.status = 'Отменено'
+        record.save()
+        record.refresh_from_db()
+        self.assertEqual(record.visit_date, visit_day)
+        self.assertEqual(timezone.localdate(record.created_date), timezone.localdate())
+
+        params = {'start_date': str(visit_day), 'end_date': str(visit_day)}
+        self.assertEqual(self.client.get('/ru/summary_report/', params).data['total_price'], 700)
+        records = self.client.get('/ru/customer_record/', {'created_date': str(visit_day)}).json()['results']
+        self.assertEqual([row['price'] for row in records], [700])
+        self.assertEqual(DailyRevenue.objects.get(day=visit_day, count__gt=0).gross, 700)
+
+        response = self.client.get('/ru/report_doctor/', {'created_date': str(visit_day), 'format': 'csv'})
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[2], 'visit_at')
+        self.assertEqual(lines[1].split(',')[2][:10], str(visit_day))
+
+    def test_rollup_filter_covers_list_filters(self):
+        self.assertLessEqual(set(CustomerRecordListFilter.base_filters), set(DailyRevenueFilter.base_filters))
+        rollup = DailyRevenueFilter({'department': self.department.pk}, queryset=DailyRevenue.objects.all()).qs
+        self.assertEqual(sum(rollup.values_list('gross', flat=True)), 3500)
+
+
+class PatientStatsTests(ClinicDataMixin, TestCase):
+    def assertStatsMatch(self):
+        expected = collect_patient_stats()
+        actual = {stats.patient_id: {field: getattr(stats, field) for field in STATS_FIELDS}
+                  for stats in PatientStats.objects.all()}
+        for patient_id, values in actual.items():
+            if not any(values.values()):
+                expected.setdefault(patient_id, values)
+        self.assertEqual(actual, expected)
+
+    def add_history(self, payment, **kwargs):
+        return HistoryRecord.objects.create(patient=payment.patient, reception=self.reception, doctor=self.doctor,
+                                            service=self.service, payment=payment, description='', **kwargs)
+
+    def test_counters_follow_changes(self):
+        stats = PatientStats.objects.get(patient=self.patient)
+        self.assertEqual((stats.record_count, stats.total_paid, stats.cash_sum, stats.card_sum), (3, 3500, 1500, 2000))
+
+        other = Patient.objects.create(full_name='Нурия Асанова', date_birth='1985-05-05', gender='female',
+                                       phone_number='+996700654321')
+        record = CustomerRecord.objects.create(patient=self.patient, price=300, payment_type=None,
+                                               status='Предзапись', records='в ожидании')
+        history = self.add_history(record)
+        self.add_history(record, record='был в приеме')
+        self.assertStatsMatch()
+
+        record.status = 'Отменено'
+        record.payment_type = 'card'
+        record.patient = other
+        record.save()
+        history.record = 'был в приеме'
+        history.save()
+        self.assertStatsMatch()
+
+        history.delete()
+        record.delete()
+        self.assertStatsMatch()
+        self.assertEqual(PatientStats.objects.get(patient=other).record_count, 0)
+
+    def test_rolled_back_with_record(self):
+        from django.db import transaction
+
+        record = CustomerRecord.objects.filter(patient=self.patient).first()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                record.delete()
+                raise ValueError
+        self.assertEqual(PatientStats.objects.get(patient=self.patient).record_count, 3)
+
+    def test_reconcile_command(self):
+        CustomerRecord.objects.filter(patient=self.patient).update(price=10)
+        PatientStats.objects.filter(patient=self.patient).update(history_count=5)
+        out = StringIO()
+        call_command('reconcile_patient_stats', '--dry-run', stdout=out)
+        self.assertIn(str(self.patient.pk), out.getvalue())
+        self.assertEqual(PatientStats.objects.get(patient=self.patient).total_paid, 3500)
+
+        call_command('reconcile_patient_stats', stdout=StringIO())
+        self.assertStatsMatch()
+        self.assertEqual(PatientStats.objects.get(patient=self.patient).total_paid, 30)
+        out = StringIO()
+        call_command('reconcile_patient_stats', stdout=out)
+        self.assertIn('совпадает', out.getvalue())
+
+    def test_patient_endpoints_read_counters(self):
+        record = CustomerRecord.objects.filter(patient=self.patient).first()
+        self.add_history(record, record='был в приеме')
+        PatientStats.objects.filter(patient=self.patient).update(total_paid=1, record_count=7, history_count=9)
+
+        response = self.client.get(f'/ru/payment/{self.patient.pk}/patient/')
+        self.assertEqual((response.data['total_paid'], response.data['cash_paid']), (1, 1500))
+        response = self.client.get(reverse('Patient_history', args=[self.patient.pk]))
+        self.assertEqual(response.data['total_records'], 7)
+        self.assertEqual(list(response.data['status_summary']), [{'status': 'Живая очередь', 'count': 3}])
+
+        data = AboutPatientHistorySerializer(CustomerRecord.objects.filter(pk=record.pk), many=True).data
+        self.assertEqual((data[0]['total_records'], data[0]['was_on_reception']), (9, 1))
+        self.assertEqual((record.get_total_records(), record.get_was_on_reception()), (9, 1))
+
+
+class ArchiveTests(ClinicDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        old = timezone.now() - timedelta(days=800)
+        cls.old_visited = CustomerRecord.objects.create(patient=cls.patient, doctor=cls.doctor, price=400,
+                                                        payment_type='card', visit_at=old)
+        cls.old_missed = CustomerRecord.objects.create(patient=cls.patient, doctor=cls.doctor, price=0,
+                                                       records='отменен', status='Отменено',
+                                                       visit_at=old + timedelta(days=1))
+        cls.old_pending = CustomerRecord.objects.create(patient=cls.patient, doctor=cls.doctor, price=100,
+                                                        records='в ожидании', visit_at=old)
+        HistoryRecord.objects.create(patient=cls.patient, reception=cls.reception, doctor=cls.doctor,
+                                     service=cls.service, payment=cls.old_visited, record='был в приеме',
+                                     description='')
+
+    def rollup_snapshot(self):
+        return sorted(DailyRevenue.objects.filter(count__gt=0).values_list(
+            'day', 'doctor_id', 'payment_type', 'records', 'count', 'gross', 'net'))
+
+    def stats_snapshot(self):
+        return list(PatientStats.objects.order_by('pk').values())
+
+    def test_archive_moves_closed_old_records(self):
+        rollups, stats = self.rollup_snapshot(), self.stats_snapshot()
+        out = StringIO()
+        call_command('archive_records', '--dry-run', stdout=out)
+        self.assertIn('2 записей', out.getvalue())
+        self.assertFalse(ArchivedCustomerRecord.objects.exists())
+
+        call_command('archive_records', '--batch-size=1', stdout=StringIO())
+        self.assertEqual(set(ArchivedCustomerRecord.objects.values_list('pk', flat=True)),
+                         {self.old_visited.pk, self.old_missed.pk})
+        self.assertEqual(ArchivedHistoryRecord.objects.get().payment_id, self.old_visited.pk)
+        self.assertFalse(HistoryRecord.objects.exists())
+        self.assertEqual(CustomerRecord.objects.count(), 4)
+        archived = ArchivedCustomerRecord.objects.get(pk=self.old_visited.pk)
+        self.assertEqual((archived.price, archived.visit_at, archived.created_date),
+                         (400, self.old_visited.visit_at, self.old_visited.created_date))
+
+        self.assertEqual(self.rollup_snapshot(), rollups)
+        self.assertEqual(self.stats_snapshot(), stats)
+        call_command('rebuild_daily_revenue', stdout=StringIO())
+        self.assertEqual(self.rollup_snapshot(), rollups)
+        self.assertEqual(reconcile_patient_stats(), [])
+
+    def test_archive_invalidates_cached_reports(self):
+        url = reverse('detailed_record')
+        self.assertEqual(self.client.get(url).data['total_count'], 6)
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_records(archive_cutoff(), batch_size=1)
+        self.assertEqual(self.client.get(url).data['total_count'], 4)
+
+    def test_history_counters_skip_archive(self):
+        record = CustomerRecord.objects.filter(patient=self.patient, records='в ожидании').first()
+        data = AboutPatientHistorySerializer([record], many=True).data
+        self.assertEqual((data[0]['total_records'], data[0]['was_on_reception']), (1, 1))
+        call_command('archive_records', stdout=StringIO())
+        data = AboutPatientHistorySerializer([record], many=True).data
+        self.assertEqual((data[0]['total_records'], data[0]['was_on_reception']), (0, 0))
+        self.assertEqual((record.get_total_records(), record.get_was_on_reception()), (0, 0))
+
+    def test_history_reads_archive_on_request(self):
+        call_command('archive_records', stdout=StringIO())
+        url = reverse('Patient_history', args=[self.patient.pk])
+        live = self.client.get(url).data
+        self.assertEqual(len(live['records']), 4)
+        self.assertEqual(live['total_records'], 4)
+        self.assertEqual(sum(row['count'] for row in live['status_summary']), 4)
+        full = self.client.get(url, {'archived': 'true'}).data
+        self.assertEqual(full['total_records'], 6)
+        self.assertEqual([row['id'] for row in full['records']][-3:],
+                         [self.old_missed.pk, self.old_pending.pk, self.old_visited.pk])
+        self.assertIsNone(full['next'])
+        self.assertNotIn('next', live)
+
+        url = reverse('patient-visited-records', args=[self.patient.pk])
+        self.assertEqual(self.client.get(url).data['total_records'], 3)
+        self.assertEqual(self.client.get(url, {'archived': '1'}).data['total_records'], 4)
+
+        response = self.client.get(f'/ru/payment/{self.patient.pk}/patient/')
+        self.assertEqual(len(response.data['records']), 4)
+        self.assertEqual((response.data['total_paid'], response.data['card_paid']), (3600, 2000))
+        response = self.client.get(f'/ru/payment/{self.patient.pk}/patient/', {'archived': 'true'})
+        self.assertEqual(len(response.data['records']), 6)
+        self.assertEqual((response.data['total_paid'], response.data['card_paid']), (4000, 2400))
+
+
+    def test_archived_history_is_paged(self):
+        call_command('archive_records', stdout=StringIO())
+        url = reverse('Patient_history', args=[self.patient.pk])
+        expected = [row['id'] for row in self.client.get(url, {'archived': 'true'}).data['records']]
+
+        ids, pages = [], []
+        response = self.client.get(url, {'archived': 'true', 'page_size': 2})
+        while True:
+            ids += [row['id'] for row in response.data['records']]
+            pages.append(response.data)
+            if not response.data['next']:
+                break
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(response.data['next'])
+            # из живой таблицы и архива читается только окно страницы
+            windows = [query['sql'] for query in queries.captured_queries if 'ORDER BY' in query['sql']]
+            self.assertEqual(len(windows), 2)
+            self.assertTrue(all(sql.endswith('LIMIT 3') for sql in windows))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([row['id'] for row in previous['records']], ids[2:4])
+
+        url = f'/ru/payment/{self.patient.pk}/patient/'
+        response = self.client.get(url, {'archived': 'true', 'page_size': 4})
+        self.assertEqual(len(response.data['records']), 4)
+        self.assertEqual(len(self.client.get(response.data['next']).data['records']), 2)
+
+
+class PatientSearchTests(ClinicDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for full_name, phone in [('Aibek Omurov', '+996555111222'), ('Айбек Садыкович Токтогулов', '+996700999888'),
+                                 ('Жылдыз Өмүрова', '+996777123456'), ('Élena Ivanova', '+996500000001')]:
+            Patient.objects.create(full_name=full_name, date_birth='1990-01-01', gender='female', phone_number=phone)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('patient_search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['full_name'] for row in response.data]
+
+    def test_columns_are_normalized(self):
+        patient = Patient.objects.get(full_name='Жылдыз Өмүрова')
+        self.assertEqual((patient.search_name, patient.phone_digits, patient.phone_local),
+                         ('zhildiz omurova', '996777123456', '777123456'))
+
+    def test_name_prefix_is_case_script_and_diacritic_insensitive(self):
+        self.assertEqual(self.search('айб'), ['Aibek Omurov', 'Айбек Садыков', 'Айбек Садыкович Токтогулов'])
+        self.assertEqual(set(self.search('AYBEK sad')), {'Айбек Садыков', 'Айбек Садыкович Токтогулов'})
+        self.assertEqual(self.search('jyldyz'), ['Жылдыз Өмүрова'])
+        self.assertEqual(self.search('елена'), ['Élena Ivanova'])
+        self.assertEqual(self.search('омур'), ['Aibek Omurov', 'Жылдыз Өмүрова'])
+        self.assertEqual(self.search('бек'), [])
+        self.assertEqual(self.search(''), [])
+        self.assertEqual(len(self.search('a', limit=2)), 2)
+
+    def test_phone_prefix_in_any_format(self):
+        for query in ['0700 12', '+996 700 123', '700123', '996700123456']:
+            self.assertEqual(self.search(query), ['Айбек Садыков'], query)
+        self.assertEqual(self.search('айбек 0700 999'), ['Айбек Садыкович Токтогулов'])
+        self.assertEqual(parse_query('Садыков2 +996 (700) 12-3'), (['sadikov2'], '996700123'))
+
+    def test_index_follows_changes(self):
+        patient = Patient.objects.get(full_name='Aibek Omurov')
+        patient.full_name = 'Nurlan Asanov'
+        patient.save()
+        self.assertEqual(self.search('nurl'), ['Nurlan Asanov'])
+        self.assertNotIn('Aibek Omurov', self.search('aib'))
+        patient.delete()
+        self.assertEqual(self.search('nurl'), [])
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            self.search('айбек')
+
+    def test_record_list_search(self):
+        response = self.client.get('/ru/customer_record/', {'search': '0700123'})
+        self.assertEqual([row['patient']['full_name'] for row in response.json()['results']], ['Айбек Садыков'] * 3)
+        response = self.client.get('/ru/customer_record/', {'search': 'Омуров'})
+        self.assertEqual(response.json()['results'], [])
+
+
+class PatientDedupeTests(ClinicDataMixin, TestCase):
+    def check_in(self, phone, date_birth='1990-01-01', full_name='Айбек Садыков'):
+        response = self.client.post(reverse('customer_record_create'), {
+            'patient': {'full_name': full_name, 'date_birth': date_birth, 'gender': 'male', 'phone_number': phone},
+            'doctor': self.doctor.pk, 'department': self.department.pk, 'service': self.service.pk,
+            'reception': self.reception.pk, 'status': 'Живая очередь', 'price': 1000,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return CustomerRecord.objects.latest('pk')
+
+    def test_returning_patient_is_reused(self):
+        record = self.check_in('+996 700 123 456')
+        self.assertEqual(record.patient_id, self.patient.pk)
+        self.assertEqual(self.check_in('+996700123456', full_name='Айбек').patient_id, self.patient.pk)
+        self.assertEqual(Patient.objects.count(), 1)
+        self.assertEqual(PatientStats.objects.get(patient=self.patient).record_count, 5)
+
+        other = self.check_in('+996700123456', date_birth='2015-06-01')
+        self.assertNotEqual(other.patient_id, self.patient.pk)
+        self.assertEqual(Patient.objects.count(), 2)
+
+    def test_lookup_uses_index(self):
+        plan = Patient.objects.filter(phone_digits='996700123456', date_birth='1990-01-01').explain()
+        self.assertIn('patient_phone_birth', plan)
+
+    def test_merge_command(self):
+        from doctor.models import Appointment
+
+        duplicates = [Patient.objects.create(full_name=name, date_birth='1990-01-01', gender='male',
+                                             phone_number=phone) for name, phone in
+                      [('Айбек С.', '0700123456'), ('Садыков Айбек', '+996 700 123 456')]]
+        unrelated = Patient.objects.create(full_name='Айбек Садыков', date_birth='1991-01-01', gender='male',
+                                           phone_number='+996700123456')
+        record = CustomerRecord.objects.create(patient=duplicates[0], doctor=self.doctor, price=700)
+        HistoryRecord.objects.create(patient=duplicates[1], reception=self.reception, doctor=self.doctor,
+                                     service=self.service, payment=record, description='')
+        Appointment.objects.create(patient=duplicates[1], doctor=self.doctor, department=self.department,
+                                   service=self.service, date=date(2024, 1, 1), start_time='10:00',
+                                   end_time='10:30')
+
+        out = StringIO()
+        call_command('merge_duplicate_patients', '--dry-run', stdout=out)
+        self.assertIn('лишних пациентов: 2', out.getvalue())
+        versions = [scope_version(scope) for scope in ('records', 'schedules')]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            call_command('merge_duplicate_patients', '--batch-size=1', stdout=StringIO())
+        self.assertTrue(callbacks)
+        self.assertTrue(all(scope_version(scope) != version
+                            for scope, version in zip(('records', 'schedules'), versions)))
+
+        self.assertEqual(set(Patient.objects.values_list('pk', flat=True)), {self.patient.pk, unrelated.pk})
+        self.assertEqual(CustomerRecord.objects.filter(patient=self.patient).count(), 4)
+        self.assertEqual(HistoryRecord.objects.get().patient_id, self.patient.pk)
+        self.assertEqual(Appointment.objects.get().patient_id, self.patient.pk)
+        stats = PatientStats.objects.get(patient=self.patient)
+        self.assertEqual((stats.record_count, stats.total_paid, stats.history_count), (4, 4200, 1))
+        self.assertEqual(reconcile_patient_stats(), [])
+
+
+class GenerateClinicDataTests(TestCase):
+    def generate(self, **options):
+        options = {'doctors': 2, 'receptions': 1, 'patients': 20, 'records': 200, 'schedule_days': 3,
+                   'start_date': '2024-01-01', 'end_date': '2024-01-31', 'seed': 1, **options}
+        call_command('generate_clinic_data', *[f'--{name.replace("_", "-")}={value}' for name, value in options.items()],
+                     stdout=StringIO())
+
+    def snapshot(self):
+        return list(CustomerRecord.objects.order_by('pk').values_list(
+            'doctor__email', 'patient__full_name', 'price', 'payment_type', 'records', 'discount', 'created_date'))
+
+    def test_volumes_and_dates(self):
+        self.generate()
+        self.assertEqual(Doctor.objects.count(), 2)
+        self.assertEqual(Patient.objects.count(), 20)
+        self.assertEqual(CustomerRecord.objects.count(), 200)
+        self.assertTrue(0 < HistoryRecord.objects.count() < 200)
+        self.assertEqual(DoctorSchedule.objects.count(), 2 * 3 * 8)
+        self.assertTrue(Appointment.objects.exists())
+        days = set(CustomerRecord.objects.values_list('visit_date', flat=True))
+        self.assertTrue(min(days) >= date(2024, 1, 1))
+        self.assertTrue(max(days) <= date(2024, 1, 31))
+        self.assertFalse(CustomerRecord.objects.exclude(created_date=F('visit_at')).exists())
+        self.assertFalse(HistoryRecord.objects.exclude(date=F('payment__visit_date')).exists())
+        self.assertTrue(CustomerRecord._meta.get_field('created_date').auto_now)
+        self.assertTrue(HistoryRecord._meta.get_field('date').auto_now_add)
+        self.assertEqual(sum(DailyRevenue.objects.values_list('count', flat=True)), 200)
+        self.assertEqual(sum(PatientStats.objects.values_list('record_count', flat=True)), 200)
+
+    def test_seed_is_reproducible(self):
+        self.generate()
+        first = self.snapshot()
+        with self.assertRaises(CommandError):
+            self.generate()
+        Department.objects.all().delete()
+        UserProfile.objects.all().delete()
+        Patient.objects.all().delete()
+        self.generate()
+        self.assertEqual(self.snapshot(), first)
+        self.generate(seed=2)
+        self.assertNotEqual(self.snapshot()[200:], first)
+
+
+class BenchmarkBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_clinic(doctors=3, receptions=1, patients=30, records=300, schedule_days=2,
+                    start_date=timezone.localdate() - timedelta(days=29))
+        create_benchmark_job()
+
+    def test_every_route_is_benchmarked(self):
+        covered = {view_name(resolve(url.split('?')[0]).func) for url in benchmark_urls().values()}
+        views = app_view_names('reception.urls', 'crm_app.urls', 'doctor.urls')
+        self.assertEqual(views - covered - SKIPPED_VIEWS, set())
 
-# Create your tests here.
+    def test_query_budgets(self):
+        # Число запросов не должно зависеть от объема данных — сверяем с baseline на маленькой клинике
+        client = benchmark_client()
+        routes = load_baseline()['routes']
+        errors = []
+        for name, url in benchmark_urls().items():
+            errors += budget_errors(name, measure(client, url), routes.get(name), compare_volume=False)
+        self.assertFalse(errors, '\n'.join(errors))
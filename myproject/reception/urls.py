@@ -23,6 +23,8 @@ urlpatterns = [
     path('payment/<int:patient_id>/patient/', PaymentListAPIView.as_view(), name='payment'),
 
     path('info_patient/', InfoPatientListAPIView.as_view(), name='info_patient'),
+    path('patient_search/', PatientSearchAPIView.as_view(), name='patient_search'),
+    path('calendar_feed/', CalendarFeedAPIView.as_view(), name='calendar_feed'),
 
     path('price_list/', PriceListAPIView.as_view(), name='price'),
     path('price_list/<int:pk>/', PriceDetailAPIView.as_view(), name='price_detail'),
@@ -30,6 +32,11 @@ urlpatterns = [
     path('detailed_record/', DetailedReportListAPIView.as_view(), name='detailed_record'),
     path('report_doctor/', DoctorReportListAPIView.as_view(), name='doctor_record'),
     path('summary_report/', SummaryReportAPIView.as_view(), name='doctor_record'),
+    path('revenue_timeseries/', RevenueTimeseriesAPIView.as_view(), name='revenue_timeseries'),
+    path('report_cache/stats/', ReportCacheStatsAPIView.as_view(), name='report_cache_stats'),
+    path('report_jobs/', ReportJobCreateAPIView.as_view(), name='report_job_create'),
+    path('report_jobs/<int:pk>/', ReportJobDetailAPIView.as_view(), name='report_job_detail'),
+    path('report_jobs/<int:pk>/result/', ReportJobResultAPIView.as_view(), name='report_job_result'),
 
     path('reception_register/', ReceptionRegisterView.as_view(), name='register_reception'),
     path('doctor_register/', DoctorRegisterView.as_view(), name='register_doctor'),
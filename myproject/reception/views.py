@@ -3,6 +3,19 @@ from .serializers import *
 from .models import *
 from django.db.models import Count, Q, Sum, F, FloatField, ExpressionWrapper
 from .filters import *
+from .eager import EagerLoadingMixin, eager_loading_plan
+from .projection import ValuesListMixin, values_projection
+from .pagination import RecordCursorPagination, PatientCursorPagination
+from .cache import cached_report, cache_stats
+from .jobs import submit_report_job
+from .exports import ReportExportMixin, detailed_report_rows, doctor_report_rows
+from .reports import (report_totals, summary_totals, doctor_income_total, report_period, period_filter,
+                      revenue_timeseries)
+from .patient_stats import patient_stats, status_summary
+from .archive import include_archived, merge_archived
+from .search import autocomplete_patients
+from .calendar import calendar_window, calendar_version
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter
 from rest_framework.views import APIView
@@ -81,12 +94,12 @@ class LogoutView(generics.GenericAPIView):
             return Response({"detail": "Ошибка обработки токена."}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CustomerRecordListAPIView(generics.ListAPIView):
+class CustomerRecordListAPIView(ValuesListMixin, EagerLoadingMixin, generics.ListAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = CustomerRecordListSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    pagination_class = RecordCursorPagination
+    filter_backends = [DjangoFilterBackend, PatientSearchFilter]
     filterset_class = CustomerRecordListFilter
-    search_fields = ['patient']
 
 
 class CustomerRecordCreateAPIView(generics.CreateAPIView):
@@ -94,17 +107,17 @@ class CustomerRecordCreateAPIView(generics.CreateAPIView):
     serializer_class = CustomerRecordCreateSerializer
 
 
-class CustomerRecordRetrieveAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CustomerRecordRetrieveAPIView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = CustomerRecordListSerializer
 
 
-class CustomerRecordRetrieveUpdateDestroyAPIView(generics.RetrieveUpdateDestroyAPIView):
+class CustomerRecordRetrieveUpdateDestroyAPIView(EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = CustomerRecordListSerializer
 
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorListSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter]
@@ -112,12 +125,13 @@ class DoctorViewSet(viewsets.ModelViewSet):
     search_fields = ['doctor']
 
 
-class AboutPatientRecordListAPIView(generics.ListAPIView):
+class AboutPatientRecordListAPIView(EagerLoadingMixin, generics.ListAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = AboutPatientRecordSerializer
+    pagination_class = RecordCursorPagination
 
 
-class AboutPatientRecordListUpdateAPIView(generics.RetrieveUpdateAPIView):
+class AboutPatientRecordListUpdateAPIView(EagerLoadingMixin, generics.RetrieveUpdateAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = AboutPatientRecordSerializer
 
@@ -127,59 +141,81 @@ class AboutPatientRecordListUpdateAPIView(generics.RetrieveUpdateAPIView):
 #     serializer_class = AboutPatientHistoryRecordSerializer
 
 
-class AboutPatientHistoryRecordListAPIView(generics.ListAPIView):
+class AboutPatientHistoryRecordListAPIView(EagerLoadingMixin, generics.ListAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = AboutPatientHistoryRecordSerializer
 
     def get_queryset(self):
         patient_id = self.kwargs['patient_id']
-        return CustomerRecord.objects.filter(patient_id=patient_id)
+        return super().get_queryset().filter(patient_id=patient_id)
+
+    def get_archived_queryset(self):
+        queryset = ArchivedCustomerRecord.objects.filter(patient_id=self.kwargs['patient_id'])
+        return eager_loading_plan(self.get_serializer_class(), ArchivedCustomerRecord).apply(queryset)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
+        archived = include_archived(request)
+        links = {}
+        if archived:
+            queryset, links = merge_archived(request, queryset, self.filter_queryset(self.get_archived_queryset()),
+                                             view=self)
         serialized_data = self.get_serializer(queryset, many=True).data
 
-        total_count = queryset.count()
-
-        status_summary = queryset.values('status').annotate(count=Count('id'))
+        # итоги — из счетчиков пациента, по тем же записям, что и список (с архивом или без)
+        stats = patient_stats(self.kwargs['patient_id'], archived=archived)
 
         return Response({
-            "total_records": total_count,
-            "status_summary": status_summary,
-            "records": serialized_data
+            "total_records": stats.record_count,
+            "status_summary": status_summary(stats),
+            "records": serialized_data,
+            **links,
         })
 
 
-class PatientRecordListAPIView(generics.ListAPIView):
+class PatientRecordListAPIView(EagerLoadingMixin, generics.ListAPIView):
+    queryset = CustomerRecord.objects.all()
     serializer_class = AboutPatientHistoryRecordSerializer
 
     def get_queryset(self):
         patient_id = self.kwargs['patient_id']
-        return CustomerRecord.objects.filter(patient_id=patient_id, records='был в приеме')
+        return super().get_queryset().filter(patient_id=patient_id, records='был в приеме')
+
+    def get_archived_queryset(self):
+        queryset = ArchivedCustomerRecord.objects.filter(patient_id=self.kwargs['patient_id'], records='был в приеме')
+        return eager_loading_plan(self.get_serializer_class(), ArchivedCustomerRecord).apply(queryset)
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
+        queryset = self.filter_queryset(self.get_queryset())
+        # статусы среди посещенных записей в PatientStats не хранятся — итог берем из той же группировки
+        summary = list(queryset.values('status').annotate(count=Count('id')).order_by('status'))
+
+        links = {}
+        if include_archived(request):
+            archived = self.filter_queryset(self.get_archived_queryset())
+            counts = {row['status']: row['count'] for row in summary}
+            for row in archived.values('status').annotate(count=Count('id')).order_by():
+                counts[row['status']] = counts.get(row['status'], 0) + row['count']
+            summary = [{'status': status, 'count': count} for status, count in sorted(counts.items())]
+            queryset, links = merge_archived(request, queryset, archived, view=self)
         serialized_data = self.get_serializer(queryset, many=True).data
 
-        total_count = queryset.count()
-
-        status_summary = queryset.values('status').annotate(count=Count('id'))
-
         return Response({
-            "total_records": total_count,
-            "status_summary": status_summary,
-            "records": serialized_data
+            "total_records": sum(row['count'] for row in summary),
+            "status_summary": summary,
+            "records": serialized_data,
+            **links,
         })
 
 
-class AboutPatientHistoryListAPIView(generics.ListAPIView):
+class AboutPatientHistoryListAPIView(EagerLoadingMixin, generics.ListAPIView):
     queryset = CustomerRecord.objects.all()
     serializer_class = AboutPatientHistorySerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        return CustomerRecord.objects.filter(patient=user)
+        return super().get_queryset().filter(patient=user)
 
 
 class PaymentListAPIView(APIView):
@@ -187,38 +223,59 @@ class PaymentListAPIView(APIView):
     serializer_class = PaymentSerializer
 
     def get(self, request, patient_id):
-        queryset = CustomerRecord.objects.filter(patient_id=patient_id)
+        queryset = CustomerRecord.objects.filter(patient_id=patient_id).select_related(
+            'department', 'doctor', 'service')
+        archived = include_archived(request)
+        links = {}
+        if archived:
+            queryset, links = merge_archived(request, queryset, ArchivedCustomerRecord.objects.filter(
+                patient_id=patient_id).select_related('department', 'doctor', 'service'), view=self)
 
-        total_paid = queryset.aggregate(total=Sum('price'))['total'] or 0
-        cash_paid = queryset.filter(payment_type='cash').aggregate(cash=Sum('price'))['cash'] or 0
-        card_paid = queryset.filter(payment_type='card').aggregate(card=Sum('price'))['card'] or 0
+        stats = patient_stats(patient_id, archived=archived)
 
         serialized_data = PaymentSerializer(queryset, many=True).data
 
         return Response({
-            "total_paid": total_paid,
-            "cash_paid": cash_paid,
-            "card_paid": card_paid,
-            "records": serialized_data
+            "total_paid": stats.total_paid,
+            "cash_paid": stats.cash_sum,
+            "card_paid": stats.card_sum,
+            "records": serialized_data,
+            **links,
         })
 
 
-class InfoPatientListAPIView(generics.ListAPIView):
+# Автодополнение пациента на стойке регистрации: ?q=часть имени или телефона
+class PatientSearchAPIView(APIView):
+    max_limit = 50
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            limit = 10
+        patients = autocomplete_patients(request.query_params.get('q', ''), limit=limit)
+        return Response(PatientSearchSerializer(patients, many=True).data)
+
+
+class InfoPatientListAPIView(EagerLoadingMixin, generics.ListAPIView):
     queryset = Patient.objects.all()
     serializer_class = InfoPatientSerializer
+    pagination_class = PatientCursorPagination
 
 
-class PriceListAPIView(generics.ListAPIView):
+class PriceListAPIView(EagerLoadingMixin, generics.ListAPIView):
     queryset = Service.objects.all()
     serializer_class = PriceListSerializer
 
 
-class PriceDetailAPIView(generics.RetrieveAPIView):
+class PriceDetailAPIView(EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = Service.objects.all()
     serializer_class = ServiceDetailSerializer
 
 
-class DetailedReportListAPIView(generics.ListAPIView):
+class DetailedReportListAPIView(ReportExportMixin, generics.ListAPIView):
+    export_rows = staticmethod(detailed_report_rows)
+    export_filename = 'detailed_report'
     queryset = CustomerRecord.objects.all()
     serializer_class = DetailedReportSerializer
     # filter_backends = [DjangoFilterBackend, SearchFilter]
@@ -229,72 +286,50 @@ class DetailedReportListAPIView(generics.ListAPIView):
         qs = CustomerRecord.objects.select_related('doctor', 'patient', 'service')
         return self.filter_queryset(qs)
 
+    @cached_report('records', 'doctors', 'services')
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         response = super().list(request, *args, **kwargs)
 
-        total_price = queryset.aggregate(Sum('price'))['price__sum'] or 0
-        total_discount = queryset.aggregate(Sum('discount'))['discount__sum'] or 0
-        total_count = queryset.count()
-
-        cash_sum = queryset.filter(payment_type='cash').aggregate(Sum('price'))['price__sum'] or 0
-        card_sum = queryset.filter(payment_type='card').aggregate(Sum('price'))['price__sum'] or 0
-
-        queryset_with_bonus = queryset.annotate(
-            doctor_income=ExpressionWrapper(
-                F('price') * F('doctor__bonus') / 100.0,
-                output_field=FloatField()
-            )
-        )
-
-        doctor_income_total = queryset_with_bonus.aggregate(
-            Sum('doctor_income')
-        )['doctor_income__sum'] or 0
+        totals = report_totals(queryset)
 
         response.data = {
-            'total_count': total_count,
-            'total_price': total_price,
-            'total_discount': total_discount,
-            'cash_sum': cash_sum,
-            'card_sum': card_sum,
-            'total_doctor_income': round(doctor_income_total, 2),
+            'total_count': totals['total_count'],
+            'total_price': totals['total_price'],
+            'total_discount': totals['total_discount'],
+            'cash_sum': totals['cash_sum'],
+            'card_sum': totals['card_sum'],
+            'total_doctor_income': totals['total_doctor_income'],
             'records': response.data
         }
 
         return response
 
 
-class DoctorReportListAPIView(generics.ListAPIView):
+class DoctorReportListAPIView(ReportExportMixin, generics.ListAPIView):
+    export_rows = staticmethod(doctor_report_rows)
+    export_filename = 'doctor_report'
     serializer_class = DoctorReportSerializers
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, PatientSearchFilter]
     filterset_class = CustomerRecordListFilter
-    search_fields = ['patient']
 
 
     def get_queryset(self):
         qs = CustomerRecord.objects.select_related('doctor', 'patient', 'service')
         return self.filter_queryset(qs)
 
+    @cached_report('records', 'doctors')
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
 
         response = super().list(request, *args, **kwargs)
 
         # Расчёт доли врача: (price * doctor.bonus / 100)
-        queryset_with_bonus = queryset.annotate(
-            doctor_income=ExpressionWrapper(
-                F('price') * F('doctor__bonus') / 100.0,
-                output_field=FloatField()
-            )
-        )
-
-        total_doctor_income = queryset_with_bonus.aggregate(
-            Sum('doctor_income')
-        )['doctor_income__sum'] or 0
+        total_doctor_income = doctor_income_total(queryset, request.query_params)
 
         # Ответ только с суммой врача и записями
         response.data = {
-            'total_doctor_income': round(total_doctor_income, 2),
+            'total_doctor_income': total_doctor_income,
             'records': response.data
         }
         return response
@@ -302,33 +337,96 @@ class DoctorReportListAPIView(generics.ListAPIView):
 
 class SummaryReportAPIView(APIView):
 
+    @cached_report('records')
     def get(self, request):
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
+        start_date, end_date = report_period(request.query_params)
+        records = DailyRevenue.objects.filter(period_filter(start_date, end_date, field='day'),
+                                              records='был в приеме')
 
-        records = CustomerRecord.objects.filter(records='был в приеме')
+        data = summary_totals(records)
 
-        if start_date and end_date:
-            records = records.filter(date__date__range=[start_date, end_date])
+        serializer = SummaryReportSerializer(data)
+        return Response(serializer.data)
 
-        total_cash = records.filter(payment_type='cash').aggregate(Sum('price'))['price__sum'] or 0
-        total_card = records.filter(payment_type='card').aggregate(Sum('price'))['price__sum'] or 0
-        total_price = records.aggregate(Sum('price'))['price__sum'] or 0
-        total_to_doctors = total_price  # или своя логика
 
-        data = {
-            "total_cash": total_cash,
-            "total_card": total_card,
-            "total_price": total_price,
-            "total_to_doctors": total_to_doctors
-        }
+class RevenueTimeseriesAPIView(APIView):
 
-        serializer = SummaryReportSerializer(data)
-        return Response(serializer.data)
+    @cached_report('records')
+    def get(self, request):
+        start_date, end_date = report_period(request.query_params)
+        filterset = RecordDimensionFilter(request.query_params,
+                                          queryset=CustomerRecord.objects.filter(records='был в приеме'))
+        if not filterset.is_valid():
+            raise serializers.ValidationError(filterset.errors)
+
+        data = revenue_timeseries(filterset.qs, request.query_params.get('interval', 'day'), start_date, end_date,
+                                  request.query_params.get('group_by'))
+        return Response(data)
+
+
+class ReportCacheStatsAPIView(APIView):
 
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class ReportJobCreateAPIView(generics.CreateAPIView):
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
 
-class CalendarViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        user = self.request.user if self.request.user.is_authenticated else None
+        submit_report_job(serializer.save(created_by=user))
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+
+class ReportJobDetailAPIView(generics.RetrieveAPIView):
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
+
+
+class ReportJobResultAPIView(generics.RetrieveAPIView):
+    queryset = ReportJob.objects.all()
+    serializer_class = ReportJobSerializer
+
+    def retrieve(self, request, *args, **kwargs):
+        job = self.get_object()
+        if job.status != 'done':
+            return Response(self.get_serializer(job).data, status=status.HTTP_409_CONFLICT)
+        return Response(job.result)
+
+
+class CalendarViewSet(ValuesListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = CustomerRecord.objects.all()
     serializer_class = CalendarSerializer
+    pagination_class = RecordCursorPagination
+
+
+# Записи врача или отделения за окно дат. Сначала только версия окна (один агрегат по индексу):
+# если у клиента та же версия — 304 без выборки и сериализации записей.
+class CalendarFeedAPIView(APIView):
+    def get(self, request):
+        records = calendar_window(request.query_params)
+        etag = calendar_version(records)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            response = not_modified
+        else:
+            records = records.order_by('visit_date', 'start_at', 'id')
+            # если сериализатор перестанет проецироваться в values(), отвечает обычная сериализация
+            projection = values_projection(CalendarFeedSerializer(), CustomerRecord)
+            if projection is None:
+                records = eager_loading_plan(CalendarFeedSerializer, CustomerRecord).apply(records)
+                response = Response(CalendarFeedSerializer(records, many=True).data)
+            else:
+                response = Response(projection.serialize(records))
+        response['ETag'] = etag
+        # клиент хранит ответ, но каждый раз сверяет версию
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 